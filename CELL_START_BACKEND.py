@@ -119,7 +119,7 @@ if not backend_ok:
 print("\n4️⃣ Starting Celery worker...")
 celery_process = subprocess.Popen(
     ['celery', '-A', 'app.tasks.celery_app', 'worker',
-     '--loglevel=info', '--concurrency=1', '-Q', 'training,generation'],
+     '--loglevel=info', '--concurrency=1', '-Q', 'training,generation,datasets'],
     stdout=subprocess.PIPE,
     stderr=subprocess.PIPE,
     text=True,
@@ -1,18 +1,33 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, Response, Header, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.models import get_db
 from app.models.dataset import Dataset
-from app.schemas.dataset import DatasetCreate, DatasetResponse
-from app.services.storage_service import storage_service
-from pathlib import Path
+from app.models.dataset_version import DatasetVersion
+from app.schemas.dataset import DatasetCreate, DatasetResponse, DatasetVersionResponse, CaptionRequest, VideoExtractRequest
+from app.services.storage_service import storage_service, content_key, BLOB_PREFIX
+from app.services.dataset_service import dataset_service
+from app.services.dataset_manifest import DatasetManifest
+from app.services.chunked_upload import chunked_upload_service
+from app.tasks.dataset_tasks import preprocess_dataset, caption_dataset, extract_videos, collect_blob_garbage
+from app.utils.phash import hash_image_bytes
+from app.utils.archive_stream import QueueReader, ARCHIVE_ERRORS
+from app.config import settings
+from pathlib import Path, PurePosixPath
+import asyncio
+import base64
+import time
 import uuid
 import shutil
+import hashlib
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+TUS_VERSION = "1.0.0"
+
 # Temporary storage for uploaded files (before S3)
 TEMP_UPLOAD_DIR = Path("/tmp/masuka/uploads")
 TEMP_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
@@ -45,6 +60,9 @@ async def create_dataset(
     db.commit()
     db.refresh(dataset)
 
+    # Start with an empty manifest so readers never need to list storage
+    DatasetManifest(storage_path).save()
+
     logger.info(f"Created dataset {dataset_id}: {request.name}")
 
     return DatasetResponse(
@@ -59,13 +77,55 @@ async def create_dataset(
         created_at=dataset.created_at
     )
 
+async def _stream_to_blob(file: UploadFile) -> dict:
+    """
+    Stream an upload into content-addressed storage one part at a time.
+
+    Parts of DATASET_UPLOAD_PART_MB are read from the request and forwarded
+    to a staging multipart upload as they arrive, hashing along the way, so
+    large videos are never held in memory or on local disk whole.
+
+    Returns:
+        Dict with the content key, sha256 and size
+    """
+    part_size = chunked_upload_service.part_size
+    staging_key = f"{chunked_upload_service.STAGING_PREFIX}/{uuid.uuid4().hex}"
+    upload_id = await run_in_threadpool(storage_service.create_multipart_upload, staging_key, file.content_type)
+    digest = hashlib.sha256()
+    parts = []
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(part_size)
+            if not chunk and parts:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+            part_number = len(parts) + 1
+            etag = await run_in_threadpool(storage_service.upload_part, staging_key, upload_id, part_number, chunk)
+            parts.append({'PartNumber': part_number, 'ETag': etag})
+            if len(chunk) < part_size:
+                break
+        await run_in_threadpool(storage_service.complete_multipart_upload, staging_key, upload_id, parts)
+    except Exception:
+        storage_service.abort_multipart_upload(staging_key, upload_id)
+        raise
+
+    # Move into content-addressed storage
+    sha256 = digest.hexdigest()
+    key = content_key(sha256)
+    if not storage_service.exists(key):
+        await run_in_threadpool(storage_service.copy_file, staging_key, key)
+    storage_service.delete_file(staging_key)
+    return {'key': key, 'sha256': sha256, 'size': size}
+
 @router.post("/{dataset_id}/upload", status_code=status.HTTP_200_OK)
 async def upload_dataset_files(
     dataset_id: str,
     files: List[UploadFile] = File(...),
     db: Session = Depends(get_db)
 ):
-    """Upload images to a dataset."""
+    """Upload images and videos to a dataset."""
     # Get dataset
     dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
     if not dataset:
@@ -76,10 +136,27 @@ async def upload_dataset_files(
     temp_dir.mkdir(parents=True, exist_ok=True)
 
     uploaded_files = []
+    images_meta = {}
+    duplicates = []
+    rejected = []
+
+    # Index existing images by perceptual hash to catch near-duplicates
+    duplicate_index = dataset_service.duplicate_index(DatasetManifest.load(dataset).entries)
 
     for file in files:
         # Validate file type
-        if not file.content_type.startswith('image/'):
+        if not file.content_type.startswith(('image/', 'video/')):
+            continue
+
+        if file.content_type.startswith('video/'):
+            # Frames/segments are derived in the background
+            images_meta[file.filename] = {
+                **await _stream_to_blob(file),
+                'content_type': file.content_type,
+                'media': 'video',
+                'has_caption': False
+            }
+            uploaded_files.append(file.filename)
             continue
 
         # Save to temp
@@ -87,27 +164,592 @@ async def upload_dataset_files(
         with open(file_path, 'wb') as buffer:
             shutil.copyfileobj(file.file, buffer)
 
-        # Upload to S3
-        storage_path = f"{dataset.storage_path}/{file.filename}"
-        success = storage_service.upload_file(
-            str(file_path),
-            storage_path,
-            content_type=file.content_type
-        )
+        # Content hash plus perceptual hashes for near-duplicate detection
+        data = file_path.read_bytes()
+        sha256 = hashlib.sha256(data).hexdigest()
 
-        if success:
-            uploaded_files.append(file.filename)
+        try:
+            hashes = hash_image_bytes(data)
+        except Exception as e:
+            logger.warning(f"Could not hash {file.filename}: {e}")
+            hashes = {}
 
-    # Update dataset
-    dataset.image_count = len(uploaded_files)
-    db.commit()
+        duplicate = dataset_service.find_duplicate(file.filename, hashes, duplicate_index)
+
+        if duplicate and settings.DATASET_REJECT_DUPLICATES:
+            logger.info(f"Rejected near-duplicate {file.filename} of {duplicate['duplicate_of']}")
+            rejected.append(duplicate)
+            file_path.unlink(missing_ok=True)
+            continue
+
+        # Upload to S3 as a content-addressed blob, once per distinct content
+        storage_path = dataset_service.store_blob(data, sha256, file.content_type)
+
+        uploaded_files.append(file.filename)
+        images_meta[file.filename] = {
+            'key': storage_path,
+            'sha256': sha256,
+            'size': len(data),
+            'content_type': file.content_type,
+            'has_caption': False,
+            **hashes
+        }
+        if duplicate:
+            images_meta[file.filename]['duplicate_of'] = duplicate['duplicate_of']
+            duplicates.append(duplicate)
+        if hashes:
+            duplicate_index.add(file.filename, int(hashes['phash'], 16))
+
+    # Record new images (re-uploads replace their entry and need preprocessing again)
+    if images_meta:
+        with dataset_service.edit_manifest(dataset, f"Uploaded {len(images_meta)} images") as manifest:
+            for filename, entry in images_meta.items():
+                manifest.add(filename, entry)
+        db.commit()
 
     logger.info(f"Uploaded {len(uploaded_files)} files to dataset {dataset_id}")
 
+    # Decode, normalize and bucket new images in the background
+    task_id = None
+    if any(entry.get('media') != 'video' for entry in images_meta.values()):
+        task = preprocess_dataset.delay(str(dataset.id))
+        task_id = task.id
+
+    video_names = [name for name, entry in images_meta.items() if entry.get('media') == 'video']
+    extract_task_id = None
+    if video_names:
+        extract_task_id = extract_videos.delay(str(dataset.id), None, video_names).id
+
     return {
         "dataset_id": str(dataset_id),
         "uploaded_count": len(uploaded_files),
-        "files": uploaded_files
+        "files": uploaded_files,
+        "duplicates": duplicates,
+        "rejected": rejected,
+        "preprocess_task_id": task_id,
+        "extract_task_id": extract_task_id
+    }
+
+@router.post("/{dataset_id}/upload/archive", status_code=status.HTTP_200_OK)
+async def upload_dataset_archive(
+    dataset_id: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Upload images, videos and optional .txt captions as one ZIP or tar request body.
+
+    Entries are extracted, validated and uploaded while the archive is still
+    arriving; nothing is written to local disk.
+    """
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    duplicate_index = dataset_service.duplicate_index(DatasetManifest.load(dataset).entries)
+    reader = QueueReader()
+    start = time.perf_counter()
+
+    async def produce():
+        try:
+            async for chunk in request.stream():
+                if not reader.try_feed(chunk) and not await run_in_threadpool(reader.feed, chunk):
+                    break
+        finally:
+            if not reader.try_feed(None):
+                await run_in_threadpool(reader.feed, None)
+
+    def consume():
+        try:
+            result = dataset_service.ingest_archive(reader, duplicate_index)
+            reader.drain()
+            return result
+        finally:
+            reader.abort()
+
+    try:
+        _, result = await asyncio.gather(produce(), run_in_threadpool(consume))
+    except ARCHIVE_ERRORS as e:
+        raise HTTPException(status_code=400, detail=f"Invalid archive: {e}")
+
+    images = result['images']
+    captions = result['captions']
+    if images or captions:
+        with dataset_service.edit_manifest(dataset, f"Uploaded archive with {len(images)} images") as manifest:
+            for filename, entry in images.items():
+                manifest.add(filename, entry)
+            for filename, entry in list(manifest.items()):
+                caption = captions.get(PurePosixPath(filename).stem)
+                if caption:
+                    manifest.update(filename, caption)
+        db.commit()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Ingested archive into dataset {dataset_id}: {len(images)} images, {reader.bytes_read} bytes in {elapsed:.2f}s")
+
+    task_id = None
+    if any(entry.get('media') != 'video' for entry in images.values()):
+        task = preprocess_dataset.delay(str(dataset.id))
+        task_id = task.id
+
+    video_names = [name for name, entry in images.items() if entry.get('media') == 'video']
+    extract_task_id = None
+    if video_names:
+        extract_task_id = extract_videos.delay(str(dataset.id), None, video_names).id
+
+    return {
+        "dataset_id": str(dataset_id),
+        "uploaded_count": len(images),
+        "files": list(images),
+        "captions": len(captions),
+        "duplicates": result['duplicates'],
+        "rejected": result['rejected'],
+        "skipped": result['skipped'],
+        "bytes": reader.bytes_read,
+        "seconds": round(elapsed, 3),
+        "mb_per_second": round(reader.bytes_read / elapsed / 1e6, 2) if elapsed > 0 else None,
+        "preprocess_task_id": task_id,
+        "extract_task_id": extract_task_id
+    }
+
+def _parse_upload_metadata(header: Optional[str]) -> dict:
+    """Decode a tus Upload-Metadata header ("key base64value,key base64value")."""
+    metadata = {}
+    for pair in (header or "").split(","):
+        parts = pair.strip().split(" ", 1)
+        if parts[0]:
+            metadata[parts[0]] = base64.b64decode(parts[1]).decode('utf-8') if len(parts) > 1 else ""
+    return metadata
+
+def _get_upload(dataset_id: str, upload_id: str) -> dict:
+    state = chunked_upload_service.get(upload_id)
+    if not state or state['dataset_id'] != str(dataset_id):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return state
+
+@router.post("/{dataset_id}/uploads", status_code=status.HTTP_201_CREATED)
+async def create_resumable_upload(
+    dataset_id: str,
+    response: Response,
+    upload_length: int = Header(...),
+    upload_metadata: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Start a resumable upload of one image or video.
+
+    Upload-Length is the total size in bytes; Upload-Metadata carries the
+    base64-encoded filename and filetype.
+    """
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    metadata = _parse_upload_metadata(upload_metadata)
+    filename = PurePosixPath(metadata.get('filename', '')).name
+    content_type = metadata.get('filetype', '')
+    if not filename:
+        raise HTTPException(status_code=400, detail="Upload-Metadata must include a filename")
+    if not content_type.startswith(('image/', 'video/')):
+        raise HTTPException(status_code=415, detail="Only images and videos can be uploaded")
+    if upload_length <= 0:
+        raise HTTPException(status_code=400, detail="Upload-Length must be positive")
+
+    state = await run_in_threadpool(chunked_upload_service.create, dataset.id, filename, content_type, upload_length)
+
+    response.headers['Location'] = f"/api/datasets/{dataset_id}/uploads/{state['id']}"
+    response.headers['Tus-Resumable'] = TUS_VERSION
+
+    return {
+        "upload_id": state['id'],
+        "offset": 0,
+        "length": upload_length,
+        "part_size": chunked_upload_service.part_size
+    }
+
+@router.head("/{dataset_id}/uploads/{upload_id}")
+async def get_resumable_upload_offset(
+    dataset_id: str,
+    upload_id: str
+):
+    """Report how many bytes of an upload have been received."""
+    state = _get_upload(dataset_id, upload_id)
+
+    return Response(status_code=status.HTTP_200_OK, headers={
+        'Upload-Offset': str(state['offset']),
+        'Upload-Length': str(state['length']),
+        'Tus-Resumable': TUS_VERSION,
+        'Cache-Control': 'no-store'
+    })
+
+@router.patch("/{dataset_id}/uploads/{upload_id}")
+async def append_resumable_upload(
+    dataset_id: str,
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    content_type: Optional[str] = Header(None)
+):
+    """
+    Append bytes at Upload-Offset.
+
+    Full parts are forwarded to S3 while the body is still arriving. If the
+    connection drops, everything received so far is kept, and HEAD reports
+    where to resume.
+    """
+    if content_type != 'application/offset+octet-stream':
+        raise HTTPException(status_code=415, detail="Content-Type must be application/offset+octet-stream")
+
+    state = _get_upload(dataset_id, upload_id)
+    lock = chunked_upload_service.lock(upload_id)
+    if not lock.acquire():
+        raise HTTPException(status_code=423, detail="Upload is busy")
+
+    try:
+        # Re-read under the lock
+        state = _get_upload(dataset_id, upload_id)
+        if upload_offset != state['offset']:
+            raise HTTPException(status_code=409, detail=f"Offset mismatch, expected {state['offset']}")
+
+        part_size = chunked_upload_service.part_size
+        buffer = bytearray(chunked_upload_service.tail(state))
+        part_failed = False
+        try:
+            async for chunk in request.stream():
+                if state['parts_bytes'] + len(buffer) + len(chunk) > state['length']:
+                    raise HTTPException(status_code=413, detail="Upload exceeds Upload-Length")
+                buffer.extend(chunk)
+                while len(buffer) >= part_size:
+                    part_failed = True
+                    await run_in_threadpool(chunked_upload_service.upload_part, state, bytes(buffer[:part_size]))
+                    part_failed = False
+                    # Only dropped once the part is recorded
+                    del buffer[:part_size]
+        finally:
+            # After a failed part the client resends from the last recorded part
+            chunked_upload_service.save_tail(state, b'' if part_failed else bytes(buffer))
+    finally:
+        lock.release()
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={
+        'Upload-Offset': str(state['offset']),
+        'Tus-Resumable': TUS_VERSION
+    })
+
+@router.post("/{dataset_id}/uploads/{upload_id}/finalize", status_code=status.HTTP_200_OK)
+async def finalize_resumable_upload(
+    dataset_id: str,
+    upload_id: str,
+    db: Session = Depends(get_db)
+):
+    """Assemble a fully received upload and add it to the dataset."""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    state = _get_upload(dataset_id, upload_id)
+    if state['offset'] != state['length']:
+        raise HTTPException(status_code=409, detail=f"Upload incomplete ({state['offset']}/{state['length']} bytes)")
+
+    lock = chunked_upload_service.lock(upload_id)
+    if not lock.acquire():
+        raise HTTPException(status_code=423, detail="Upload is busy")
+
+    try:
+        result = await run_in_threadpool(chunked_upload_service.complete, state)
+
+        # Move into content-addressed storage
+        key = content_key(result['sha256'])
+        if not storage_service.exists(key):
+            await run_in_threadpool(storage_service.copy_file, result['staging_key'], key)
+        storage_service.delete_file(result['staging_key'])
+
+        filename = state['filename']
+        entry = {
+            'key': key,
+            'sha256': result['sha256'],
+            'size': result['size'],
+            'content_type': state['content_type'],
+            'has_caption': False
+        }
+        duplicate = None
+        if state['content_type'].startswith('video/'):
+            entry['media'] = 'video'
+        else:
+            try:
+                entry.update(hash_image_bytes(storage_service.read_stream(key)))
+            except Exception as e:
+                logger.warning(f"Could not hash {filename}: {e}")
+
+            index = dataset_service.duplicate_index(DatasetManifest.load(dataset).entries)
+            duplicate = dataset_service.find_duplicate(filename, entry, index) if entry.get('phash') else None
+            if duplicate:
+                entry['duplicate_of'] = duplicate['duplicate_of']
+
+        with dataset_service.edit_manifest(dataset, f"Uploaded {filename}") as manifest:
+            manifest.add(filename, entry)
+        db.commit()
+
+        chunked_upload_service.delete(state)
+    finally:
+        lock.release()
+
+    logger.info(f"Finalized upload {upload_id} as {filename} in dataset {dataset_id}")
+
+    if entry.get('media') == 'video':
+        task = extract_videos.delay(str(dataset.id), None, [filename])
+    else:
+        task = preprocess_dataset.delay(str(dataset.id))
+
+    return {
+        "dataset_id": str(dataset_id),
+        "filename": filename,
+        "sha256": result['sha256'],
+        "size": result['size'],
+        "duplicate": duplicate,
+        "task_id": task.id
+    }
+
+@router.delete("/{dataset_id}/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_resumable_upload(
+    dataset_id: str,
+    upload_id: str
+):
+    """Abort an upload and discard the parts received so far."""
+    state = _get_upload(dataset_id, upload_id)
+    await run_in_threadpool(chunked_upload_service.delete, state, True)
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={'Tus-Resumable': TUS_VERSION})
+
+@router.post("/{dataset_id}/preprocess", status_code=status.HTTP_202_ACCEPTED)
+async def preprocess_dataset_images(
+    dataset_id: str,
+    db: Session = Depends(get_db)
+):
+    """Queue preprocessing for images that have not been processed yet."""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    task = preprocess_dataset.delay(str(dataset.id))
+
+    return {
+        "dataset_id": str(dataset_id),
+        "task_id": task.id
+    }
+
+@router.post("/{dataset_id}/captions", status_code=status.HTTP_202_ACCEPTED)
+async def caption_dataset_images(
+    dataset_id: str,
+    request: CaptionRequest,
+    db: Session = Depends(get_db)
+):
+    """Queue captioning; progress is reported under the dataset id."""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    task = caption_dataset.delay(str(dataset.id), request.trigger_word, request.overwrite)
+
+    return {
+        "dataset_id": str(dataset_id),
+        "task_id": task.id
+    }
+
+@router.post("/{dataset_id}/videos/extract", status_code=status.HTTP_202_ACCEPTED)
+async def extract_dataset_videos(
+    dataset_id: str,
+    request: VideoExtractRequest,
+    db: Session = Depends(get_db)
+):
+    """Queue frame or segment extraction; unchanged videos reuse cached derivations."""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    params = request.model_dump(exclude_none=True, exclude={'filenames'})
+    task = extract_videos.delay(str(dataset.id), params, request.filenames)
+
+    return {
+        "dataset_id": str(dataset_id),
+        "task_id": task.id
+    }
+
+@router.get("/{dataset_id}/duplicates")
+async def get_dataset_duplicates(
+    dataset_id: str,
+    db: Session = Depends(get_db)
+):
+    """List clusters of near-duplicate images in a dataset."""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    images = DatasetManifest.load(dataset).entries
+    clusters = dataset_service.duplicate_clusters(images)
+
+    return {
+        "dataset_id": str(dataset_id),
+        "max_distance": settings.DATASET_DUPLICATE_MAX_DISTANCE,
+        "hashed_images": sum(1 for info in images.values() if info.get('phash')),
+        "cluster_count": len(clusters),
+        "clusters": clusters
+    }
+
+@router.get("/{dataset_id}/files")
+async def list_dataset_files(
+    dataset_id: str,
+    db: Session = Depends(get_db)
+):
+    """List a dataset's images with their per-image metadata."""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    manifest = DatasetManifest.load(dataset)
+
+    return {
+        "dataset_id": str(dataset_id),
+        "count": len(manifest),
+        "files": [{'name': name, **entry} for name, entry in manifest.items()]
+    }
+
+@router.get("/{dataset_id}/stats")
+async def get_dataset_stats(
+    dataset_id: str,
+    db: Session = Depends(get_db)
+):
+    """Aggregate dataset stats, kept up to date from the manifest on every change."""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    stats = (dataset.dataset_metadata or {}).get('stats')
+    if stats is None:
+        # Dataset predates manifests
+        stats = DatasetManifest.load(dataset).stats()
+
+    return {
+        "dataset_id": str(dataset_id),
+        **stats
+    }
+
+@router.post("/{dataset_id}/verify")
+async def verify_dataset(
+    dataset_id: str,
+    db: Session = Depends(get_db)
+):
+    """Check that every file in the manifest exists in storage with the recorded size."""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    manifest = DatasetManifest.load(dataset)
+    missing = []
+    size_mismatch = []
+
+    for name, entry in manifest.items():
+        size = storage_service.get_file_size(entry['key'])
+        if size is None:
+            missing.append(name)
+        elif entry.get('size') is not None and size != entry['size']:
+            size_mismatch.append({'name': name, 'expected': entry['size'], 'actual': size})
+
+        if entry.get('processed_key') and storage_service.get_file_size(entry['processed_key']) is None:
+            missing.append(entry['processed_key'])
+
+    return {
+        "dataset_id": str(dataset_id),
+        "checked": len(manifest),
+        "ok": not missing and not size_mismatch,
+        "missing": missing,
+        "size_mismatch": size_mismatch
+    }
+
+@router.delete("/{dataset_id}/files/{filename}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_dataset_file(
+    dataset_id: str,
+    filename: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Remove one image from a dataset, creating a new version.
+
+    Its blobs stay in storage while earlier versions still reference them.
+    """
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    with dataset_service.edit_manifest(dataset, f"Removed {filename}") as manifest:
+        if filename not in manifest:
+            raise HTTPException(status_code=404, detail="File not found in dataset")
+
+        manifest.remove(filename)
+        # Frames or segments derived from a removed video go with it
+        for derived in [name for name, entry in manifest.items() if entry.get('derived_from') == filename]:
+            manifest.remove(derived)
+
+    db.commit()
+
+    # Drop the local upload copy
+    (dataset_service.local_dir(dataset.id) / filename).unlink(missing_ok=True)
+
+    logger.info(f"Deleted {filename} from dataset {dataset_id}")
+
+    return None
+
+@router.get("/{dataset_id}/versions", response_model=List[DatasetVersionResponse])
+async def list_dataset_versions(
+    dataset_id: str,
+    db: Session = Depends(get_db)
+):
+    """List a dataset's versions, newest first."""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    versions = db.query(DatasetVersion).filter(
+        DatasetVersion.dataset_id == dataset.id
+    ).order_by(DatasetVersion.version.desc()).all()
+
+    return [
+        DatasetVersionResponse(
+            id=str(v.id),
+            dataset_id=str(v.dataset_id),
+            version=v.version,
+            parent_id=str(v.parent_id) if v.parent_id else None,
+            message=v.message,
+            added_count=v.added_count,
+            updated_count=v.updated_count,
+            removed_count=v.removed_count,
+            image_count=v.image_count,
+            created_at=v.created_at
+        )
+        for v in versions
+    ]
+
+@router.get("/{dataset_id}/versions/{version}/files")
+async def list_dataset_version_files(
+    dataset_id: str,
+    version: int,
+    db: Session = Depends(get_db)
+):
+    """List the images of a past dataset version."""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    try:
+        manifest = dataset_service.manifest_at(db, dataset, version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {
+        "dataset_id": str(dataset_id),
+        "version": version,
+        "count": len(manifest),
+        "files": [{'name': name, **entry} for name, entry in manifest.items()]
     }
 
 @router.get("/", response_model=List[DatasetResponse])
@@ -126,7 +768,7 @@ async def list_datasets(
             video_count=d.video_count,
             is_processed=d.is_processed,
             captions_generated=d.captions_generated,
-            metadata=d.metadata,
+            metadata=d.dataset_metadata,
             created_at=d.created_at
         )
         for d in datasets
@@ -164,15 +806,28 @@ async def delete_dataset(
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    # Delete from S3
-    files = storage_service.list_files(dataset.storage_path)
-    for file in files:
-        storage_service.delete_file(file)
+    # Delete the dataset's own files; shared blobs are left to garbage collection
+    manifest = DatasetManifest.load(dataset)
+    for name, _ in manifest.items():
+        for key in manifest.object_keys(name):
+            if not key.startswith(BLOB_PREFIX):
+                storage_service.delete_file(key)
+    storage_service.delete_file(manifest.key)
+
+    versions = db.query(DatasetVersion).filter(DatasetVersion.dataset_id == dataset.id).all()
+    for version in versions:
+        storage_service.delete_file(version.delta_path)
 
-    # Delete from database
+    # Delete from database (children before parents)
+    for version in sorted(versions, key=lambda v: -v.version):
+        db.delete(version)
+        db.flush()
     db.delete(dataset)
     db.commit()
 
+    # Blobs only this dataset referenced are now unreachable
+    collect_blob_garbage.delay()
+
     logger.info(f"Deleted dataset {dataset_id}")
 
     return None
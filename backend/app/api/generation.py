@@ -1,23 +1,304 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from app.models import get_db
 from app.models.asset import GeneratedAsset
-from app.schemas.generation import GenerationRequest, GenerationResponse, GenerationJobResponse
-from app.tasks.generation_tasks import generate_image
+from app.models.model import Model
+from app.schemas.generation import (
+    GenerationRequest, GenerationResponse, GenerationJobResponse,
+    GenerationRefineRequest, GenerationSweepRequest, GenerationSweepResponse,
+    BulkGenerationSpec, BulkGenerationResponse, BulkGenerationStatus
+)
+from app.tasks.generation_tasks import (
+    run_generation_queue, generate_sweep, run_bulk_generation, reclaim_stranded_jobs
+)
 from app.services.storage_service import storage_service
+from app.services.generation_cache import generation_cache
+from app.services.generation_scheduler import generation_scheduler
+from app.services.worker_registry import worker_registry
+from app.services.bulk_generation import bulk_generation
+from app.services.admission import admission_controller
+from app.utils.progress import progress_manager
+from app.utils.bulk_planning import plan_bulk, plan_summary
+from app.utils.cost_model import split_counts
+from app.config import settings
+from datetime import datetime
+import csv
+import io
+import json
+import math
+import random
 import uuid
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def _dispatch(job_id: str, config: dict, lora_storage_path: Optional[str]):
+    """
+    Queue a job on the worker best placed to run it.
+
+    Workers that already hold the LoRA are preferred, then the least loaded;
+    without advertised workers the job goes to the shared queue.
+
+    Returns:
+        Celery task of the job's queue token
+    """
+    # The worker loads the LoRA file the job was routed and cached against
+    config = {**config, 'lora_key': lora_storage_path}
+    worker, reason = worker_registry.route(lora_storage_path)
+    if worker is None:
+        generation_scheduler.enqueue(job_id, config, lora_key=lora_storage_path)
+        return run_generation_queue.delay()
+
+    # Jobs stranded on workers that went away run on whoever is left
+    reclaim_stranded_jobs()
+
+    generation_scheduler.enqueue(job_id, config, lane=worker['id'], lora_key=lora_storage_path)
+    logger.info(f"Routed generation job {job_id} to {worker['id']} ({reason})")
+    return run_generation_queue.apply_async(queue=worker['queue'])
+
+def _job_status(asset: GeneratedAsset, error: Optional[str], output_paths: List[str]) -> str:
+    if (asset.parameters or {}).get('status') == 'cancelled':
+        return 'cancelled'
+    if error:
+        return 'failed'
+    if output_paths:
+        return 'completed'
+    return 'processing'
+
+# Image variants a job's URLs can point at; 'thumb' and 'display' fall back
+# to the original for jobs generated before variants existed
+OUTPUT_VARIANTS = ('thumb', 'display', 'original')
+
+def _check_variant(variant: str):
+    if variant not in OUTPUT_VARIANTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"variant must be one of: {', '.join(OUTPUT_VARIANTS)}"
+        )
+
+def _output_urls(parameters: dict, variant: str) -> List[str]:
+    """Presigned URLs of a job's images, in the requested variant."""
+    derivatives = parameters.get('derivatives') or []
+    urls = []
+    for i, path in enumerate(parameters.get('output_paths', [])):
+        if variant != 'original' and i < len(derivatives):
+            path = derivatives[i].get(variant, path)
+        url = storage_service.get_presigned_url(path, expiration=3600)
+        if url:
+            urls.append(url)
+    return urls
+
+def _parse_bulk_file(data: bytes, filename: str) -> Tuple[List[BulkGenerationSpec], List[str]]:
+    """
+    Parse a JSONL (one object per line) or CSV (header row) file of generation specs.
+
+    Returns:
+        (specs, errors); errors name the offending line
+    """
+    text = data.decode('utf-8-sig')
+    if filename.lower().endswith('.csv'):
+        # Empty cells mean "use the default"
+        rows = [
+            (line, {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()})
+            for line, row in enumerate(csv.DictReader(io.StringIO(text)), start=2)
+        ]
+    else:
+        rows = []
+        for line, raw in enumerate(text.splitlines(), start=1):
+            if not raw.strip():
+                continue
+            try:
+                rows.append((line, json.loads(raw)))
+            except json.JSONDecodeError as e:
+                rows.append((line, e))
+
+    specs = []
+    errors = []
+    for line, row in rows:
+        if isinstance(row, Exception):
+            errors.append(f"line {line}: invalid JSON ({row})")
+            continue
+        try:
+            specs.append(BulkGenerationSpec.model_validate(row))
+        except ValidationError as e:
+            details = '; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append(f"line {line}: {details}")
+    return specs, errors
+
+def _draft_size(width: int, height: int) -> tuple:
+    """Draft resolution: GENERATION_DRAFT_SCALE of the request, short side kept at 512 or more."""
+    scale = min(1.0, max(settings.GENERATION_DRAFT_SCALE, 512 / min(width, height)))
+    # Flux needs multiples of 16
+    return round(width * scale / 16) * 16, round(height * scale / 16) * 16
+
+def _lora_storage_path(db: Session, model_id: Optional[str]) -> Optional[str]:
+    if not model_id:
+        return None
+    model = db.query(Model).filter(Model.id == model_id).first()
+    return model.generation_path if model else None
+
+def _admit(generation_config: dict, lora_storage_path: Optional[str]) -> dict:
+    """
+    Predict when a job would run; turn it away while the queue is too long.
+
+    Raises:
+        HTTPException 429 (with Retry-After: when the predicted wait should
+        be back under the limit) if GENERATION_MAX_QUEUE_SECONDS is exceeded
+    """
+    estimate = admission_controller.estimate(generation_config, lora_storage_path)
+    excess = estimate['wait_seconds'] - settings.GENERATION_MAX_QUEUE_SECONDS
+    if excess > 0:
+        admission_controller.count('shed')
+        logger.warning(f"Shedding generation request: {estimate['wait_seconds']:.0f}s of work queued")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Generation queue is full (about {estimate['wait_seconds']:.0f}s of work ahead), retry later",
+            headers={'Retry-After': str(max(1, math.ceil(excess)))}
+        )
+    return estimate
+
+def _split_asset(asset: GeneratedAsset, index: int, num_images: int, seed: Optional[int]) -> GeneratedAsset:
+    """One part of a job split to fit the time limit; part 0 keeps the original asset."""
+    part = asset if index == 0 else GeneratedAsset(
+        id=uuid.uuid4(),
+        model_id=asset.model_id,
+        asset_type=asset.asset_type,
+        storage_path='',
+        prompt=asset.prompt,
+        negative_prompt=asset.negative_prompt
+    )
+    part.parameters = {
+        **asset.parameters,
+        'num_images': num_images,
+        'seed': seed,
+        'split_from': str(asset.id),
+        'split_index': index
+    }
+    return part
+
+def _submit(db: Session, asset: GeneratedAsset, generation_config: dict) -> GenerationResponse:
+    """
+    Serve a new job from the cache, or admit and queue it.
+
+    A job predicted to run past GENERATION_MAX_JOB_SECONDS (kept under the
+    per-job GENERATION_JOB_TIME_LIMIT_SECONDS) is split into
+    jobs of fewer images (with consecutive seeds), or rejected if a single
+    image would already take too long.
+    """
+    # Seeded requests that repeat an earlier one reuse its images
+    lora_storage_path = _lora_storage_path(db, generation_config.get('model_id'))
+    cache_key = generation_cache.cache_key(generation_config, lora_storage_path)
+    cached = generation_cache.lookup(cache_key)
+
+    if cached:
+        db.add(asset)
+        generation_cache.complete(asset, cache_key, cached)
+        db.commit()
+
+        logger.info(f"Generation job {asset.id} served from cache (source {cached['job_id']})")
+
+        return GenerationResponse(
+            job_id=str(asset.id),
+            status='completed',
+            task_id=None
+        )
+
+    estimate = _admit(generation_config, lora_storage_path)
+    limit = settings.generation_max_job_seconds
+    parts = [generation_config['num_images']]
+    if estimate['predicted_seconds'] > limit:
+        per_job = admission_controller.max_images(generation_config, estimate['lora_tier'], limit)
+        if per_job < 1:
+            admission_controller.count('rejected')
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Job would take about {estimate['predicted_seconds']:.0f}s, over the {limit:.0f}s limit; "
+                    f"reduce the resolution or number of steps"
+                )
+            )
+        parts = split_counts(generation_config['num_images'], per_job)
+        admission_controller.count('split')
+        logger.info(f"Splitting generation job {asset.id} ({estimate['predicted_seconds']:.0f}s) into {parts}")
+    admission_controller.count('admitted')
+
+    parts_assets = []
+    jobs = []
+    offset = 0
+    for index, num_images in enumerate(parts):
+        if len(parts) == 1:
+            job_asset, config, job_cache_key = asset, generation_config, cache_key
+        else:
+            seed = generation_config.get('seed')
+            seed = seed + offset if seed is not None else None
+            job_asset = _split_asset(asset, index, num_images, seed)
+            config = {**generation_config, 'num_images': num_images, 'seed': seed}
+            # Parts get cache keys of their own, so a repeated request can reuse them
+            job_cache_key = generation_cache.cache_key(config, lora_storage_path)
+            offset += num_images
+        db.add(job_asset)
+        parts_assets.append(job_asset)
+
+        # The unsplit job's key was looked up above
+        job_cached = generation_cache.lookup(job_cache_key) if len(parts) > 1 else None
+        if job_cached:
+            generation_cache.complete(job_asset, job_cache_key, job_cached)
+            continue
+
+        generation_cache.record('misses' if job_cache_key else 'uncacheable')
+        if job_cache_key:
+            config['cache_key'] = job_cache_key
+            job_asset.parameters = {**job_asset.parameters, 'cache_key': job_cache_key}
+        jobs.append((job_asset, config))
+    db.commit()
+
+    # Queue the jobs; workers take them in LoRA-affinity order, so parts
+    # after the first usually run in the same queue token, LoRA loaded
+    task_ids = []
+    for job_asset, config in jobs:
+        task = _dispatch(str(job_asset.id), config, lora_storage_path)
+        task_ids.append(task.id)
+        logger.info(f"Started image generation job {job_asset.id}, task {task.id}")
+    predicted = admission_controller.predict_parts(
+        [config for _, config in jobs], estimate['lora_tier'], lora_storage_path,
+        settings.GENERATION_AFFINITY_MAX_JOBS, settings.GENERATION_AFFINITY_MAX_SECONDS
+    )
+
+    return GenerationResponse(
+        job_id=str(asset.id),
+        status='pending' if jobs else 'completed',
+        task_id=task_ids[0] if task_ids else None,
+        predicted_seconds=round(predicted, 1),
+        queue_position=estimate['queue_position'],
+        eta_seconds=round(estimate['wait_seconds'] + predicted, 1),
+        job_ids=[str(part.id) for part in parts_assets] if len(parts) > 1 else None
+    )
+
 @router.post("/image", response_model=GenerationResponse, status_code=status.HTTP_201_CREATED)
 async def create_image_generation(
     request: GenerationRequest,
     db: Session = Depends(get_db)
 ):
-    """Start image generation job."""
+    """
+    Start image generation job.
+
+    With draft=true, renders a quick low-resolution, low-step version
+    instead; refine it with POST /{job_id}/refine.
+    """
+    width, height = request.width, request.height
+    num_inference_steps = request.num_inference_steps
+    seed = request.seed
+    draft_target = None
+    if request.draft:
+        # The refine call needs the draft's seed to keep its composition
+        seed = seed if seed is not None else random.randint(0, 2**32 - 1)
+        draft_target = {'width': width, 'height': height, 'num_inference_steps': num_inference_steps}
+        width, height = _draft_size(width, height)
+        num_inference_steps = min(num_inference_steps, settings.GENERATION_DRAFT_STEPS)
+
     # Create asset record
     job_id = uuid.uuid4()
 
@@ -30,20 +311,17 @@ async def create_image_generation(
         negative_prompt=request.negative_prompt,
         parameters={
             'num_images': request.num_images,
-            'num_inference_steps': request.num_inference_steps,
+            'num_inference_steps': num_inference_steps,
             'guidance_scale': request.guidance_scale,
-            'width': request.width,
-            'height': request.height,
-            'seed': request.seed,
+            'width': width,
+            'height': height,
+            'seed': seed,
             'lora_weight': request.lora_weight,
-            'config': request.config
+            'config': request.config,
+            **({'draft_target': draft_target} if draft_target else {})
         }
     )
 
-    db.add(asset)
-    db.commit()
-    db.refresh(asset)
-
     # Prepare generation config
     generation_config = {
         'prompt': request.prompt,
@@ -51,54 +329,381 @@ async def create_image_generation(
         'model_id': request.model_id,
         'lora_weight': request.lora_weight,
         'num_images': request.num_images,
+        'num_inference_steps': num_inference_steps,
+        'guidance_scale': request.guidance_scale,
+        'width': width,
+        'height': height,
+        'seed': seed,
+        'preview_interval': request.preview_interval,
+    }
+
+    return _submit(db, asset, generation_config)
+
+@router.post("/sweep", response_model=GenerationSweepResponse, status_code=status.HTTP_201_CREATED)
+async def create_generation_sweep(
+    request: GenerationSweepRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Generate a grid of images over seeds and LoRA weights in one job.
+
+    Each cell is its own generation job (and asset), so cells can be viewed,
+    cached and deleted like single generations. The worker loads the LoRA
+    once and only changes its scale between rows.
+    """
+    if request.lora_weights and not request.model_id:
+        raise HTTPException(status_code=400, detail="lora_weights requires a model_id")
+
+    seeds = list(dict.fromkeys(request.seeds))
+    weights = list(dict.fromkeys(request.lora_weights or [request.lora_weight if request.model_id else None]))
+    if len(seeds) * len(weights) > settings.GENERATION_SWEEP_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Sweep of {len(seeds) * len(weights)} images exceeds the limit of {settings.GENERATION_SWEEP_MAX_IMAGES}"
+        )
+
+    lora_storage_path = None
+    if request.model_id:
+        model = db.query(Model).filter(Model.id == request.model_id).first()
+        if not model:
+            raise HTTPException(status_code=404, detail="Model not found")
+        lora_storage_path = model.generation_path
+
+    sweep_id = uuid.uuid4()
+    base_config = {
+        'prompt': request.prompt,
+        'negative_prompt': request.negative_prompt,
+        'model_id': request.model_id,
+        'num_images': 1,
         'num_inference_steps': request.num_inference_steps,
         'guidance_scale': request.guidance_scale,
         'width': request.width,
         'height': request.height,
-        'seed': request.seed,
     }
 
-    # Queue generation task
-    task = generate_image.delay(str(job_id), generation_config)
+    # Look every cell up first: nothing is counted or referenced until the
+    # sweep is admitted
+    cells = []
+    for row, weight in enumerate(weights):
+        for column, seed in enumerate(seeds):
+            # Cells render with the LoRA unfused, so they share cache keys
+            # with bulk items rather than with single generations
+            cell_config = {**base_config, 'seed': seed, 'lora_weight': weight if weight is not None else request.lora_weight}
+            cache_key = generation_cache.cache_key(cell_config, lora_storage_path, fused=False)
+            cells.append((row, column, seed, weight, cell_config, cache_key, generation_cache.lookup(cache_key)))
 
-    logger.info(f"Started image generation job {job_id}, task {task.id}")
+    misses = sum(1 for *_, cached in cells if not cached)
+    estimate = None
+    parts = [misses] if misses else []
+    if misses:
+        # Cells run back to back in one task, like a job of that many images
+        estimate = _admit({**base_config, 'num_images': misses}, lora_storage_path)
+        # Sweep tasks always start in a fresh process: the model is loaded and
+        # the LoRA read from the worker's disk at best
+        model_load = admission_controller.model()['model_load_seconds']
+        sweep_tier = 'disk' if estimate['lora_tier'] == 'resident' else estimate['lora_tier']
+        sweep_seconds = admission_controller.predict({**base_config, 'num_images': misses}, sweep_tier) + model_load
+        limit = settings.GENERATION_MAX_SWEEP_SECONDS
+        if sweep_seconds > limit:
+            per_task = admission_controller.max_images(base_config, sweep_tier, limit - model_load)
+            if per_task < 1:
+                admission_controller.count('rejected')
+                raise HTTPException(
+                    status_code=400,
+                    detail=(
+                        f"Sweep would take about {sweep_seconds:.0f}s and a single image "
+                        f"would not fit the {limit:.0f}s limit; reduce the resolution or number of steps"
+                    )
+                )
+            parts = split_counts(misses, per_task)
+            admission_controller.count('split')
+            logger.info(f"Splitting generation sweep {sweep_id} ({sweep_seconds:.0f}s) into {parts}")
+        admission_controller.count('admitted')
 
-    return GenerationResponse(
-        job_id=str(job_id),
-        status='pending',
-        task_id=task.id
+    grid = [[] for _ in weights]
+    pending = []
+    for row, column, seed, weight, cell_config, cache_key, cached in cells:
+        job_id = uuid.uuid4()
+        asset = GeneratedAsset(
+            id=job_id,
+            model_id=request.model_id if request.model_id else None,
+            asset_type='image',
+            storage_path='',
+            prompt=request.prompt,
+            negative_prompt=request.negative_prompt,
+            parameters={
+                'num_images': 1,
+                'num_inference_steps': request.num_inference_steps,
+                'guidance_scale': request.guidance_scale,
+                'width': request.width,
+                'height': request.height,
+                'seed': seed,
+                'lora_weight': cell_config['lora_weight'],
+                'config': request.config,
+                'cache_key': cache_key,
+                'sweep_id': str(sweep_id),
+                'sweep_cell': {'row': row, 'column': column}
+            }
+        )
+        db.add(asset)
+
+        if cached:
+            generation_cache.complete(asset, cache_key, cached)
+        else:
+            generation_cache.record('misses')
+            pending.append({'job_id': str(job_id), 'seed': seed, 'lora_weight': weight, 'cache_key': cache_key})
+
+        grid[row].append(str(job_id))
+    db.commit()
+
+    # One task per part, on the same worker: parts after the first find the
+    # LoRA on its disk (each task runs in a new process)
+    task_ids = []
+    predicted = 0.0
+    if pending:
+        worker, reason = worker_registry.route(lora_storage_path)
+        options = {'queue': worker['queue']} if worker else {}
+        offset = 0
+        for index, count in enumerate(parts):
+            part_config = {
+                **base_config,
+                'lora_key': lora_storage_path,
+                'cells': pending[offset:offset + count],
+                'part': index,
+                'parts': len(parts)
+            }
+            task_ids.append(generate_sweep.apply_async((str(sweep_id), part_config), **options).id)
+            offset += count
+        predicted = model_load + admission_controller.predict_parts(
+            [{**base_config, 'num_images': count} for count in parts], sweep_tier, lora_storage_path, jobs_per_process=1
+        )
+
+    logger.info(
+        f"Started generation sweep {sweep_id}: {len(weights)}x{len(seeds)}, {len(pending)} to generate"
+        f" in {len(task_ids)} tasks"
+    )
+
+    return GenerationSweepResponse(
+        sweep_id=str(sweep_id),
+        status='pending' if pending else 'completed',
+        task_id=task_ids[0] if task_ids else None,
+        task_ids=task_ids if len(task_ids) > 1 else None,
+        seeds=seeds,
+        lora_weights=weights,
+        grid=grid,
+        eta_seconds=round(estimate['wait_seconds'] + predicted, 1) if estimate else None
+    )
+
+@router.post("/bulk", response_model=BulkGenerationResponse, status_code=status.HTTP_201_CREATED)
+async def create_bulk_generation(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Generate every image listed in a JSONL or CSV file as one bulk run.
+
+    Each line is a BulkGenerationSpec. Every image becomes its own
+    generation job (viewable, cached and deletable like single jobs),
+    all inserted in one commit. The worker plans the run for throughput:
+    images sharing a LoRA, resolution, steps and guidance are denoised in
+    batches of several prompts at once, and each LoRA is loaded once.
+    """
+    specs, errors = _parse_bulk_file(await file.read(), file.filename or '')
+    if errors:
+        raise HTTPException(status_code=400, detail=errors[:50])
+    if not specs:
+        raise HTTPException(status_code=400, detail="No generation specs in file")
+
+    total = sum(spec.count for spec in specs)
+    if total > settings.GENERATION_BULK_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Bulk run of {total} images exceeds the limit of {settings.GENERATION_BULK_MAX_IMAGES}"
+        )
+
+    model_ids = {spec.model_id for spec in specs if spec.model_id}
+    models = {str(model.id): model for model in db.query(Model).filter(Model.id.in_(model_ids)).all()} if model_ids else {}
+    missing = model_ids - set(models)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Models not found: {', '.join(sorted(missing))}")
+
+    bulk_id = uuid.uuid4()
+    assets = []
+    items = []
+    for spec in specs:
+        # Unseeded specs get a recorded seed, so every image can be reproduced
+        seed = spec.seed if spec.seed is not None else random.randint(0, 2**32 - 1 - spec.count)
+        lora_storage_path = models[spec.model_id].generation_path if spec.model_id else None
+
+        for offset in range(spec.count):
+            job_id = uuid.uuid4()
+            # Images share cache keys with equivalent single generations
+            config = {
+                'prompt': spec.prompt,
+                'negative_prompt': spec.negative_prompt,
+                'model_id': spec.model_id,
+                'lora_weight': spec.lora_weight,
+                'num_images': 1,
+                'num_inference_steps': spec.num_inference_steps,
+                'guidance_scale': spec.guidance_scale,
+                'width': spec.width,
+                'height': spec.height,
+                'seed': seed + offset,
+            }
+            cache_key = generation_cache.cache_key(config, lora_storage_path, fused=False)
+
+            asset = GeneratedAsset(
+                id=job_id,
+                model_id=spec.model_id,
+                asset_type='image',
+                storage_path='',
+                prompt=spec.prompt,
+                negative_prompt=spec.negative_prompt,
+                parameters={
+                    **{k: v for k, v in config.items() if k not in ('prompt', 'negative_prompt', 'model_id')},
+                    'cache_key': cache_key,
+                    'bulk_id': str(bulk_id)
+                }
+            )
+            assets.append(asset)
+
+            cached = generation_cache.lookup(cache_key)
+            if cached:
+                generation_cache.complete(asset, cache_key, cached)
+                continue
+
+            generation_cache.record('misses')
+            items.append({
+                'job_id': str(job_id),
+                'prompt': spec.prompt,
+                'seed': seed + offset,
+                'cache_key': cache_key,
+                'lora_key': lora_storage_path,
+                'model_id': spec.model_id,
+                # The weight does not matter without a LoRA, so it must not split base-model batches
+                'lora_weight': spec.lora_weight if spec.model_id else None,
+                'width': spec.width,
+                'height': spec.height,
+                'num_inference_steps': spec.num_inference_steps,
+                'guidance_scale': spec.guidance_scale,
+            })
+
+    # One batched insert for the whole run
+    db.add_all(assets)
+    db.commit()
+
+    plan = plan_bulk(items, settings.GENERATION_BULK_BATCH_MEGAPIXELS, settings.GENERATION_BULK_MAX_BATCH)
+    cached_count = len(assets) - len(items)
+    bulk_generation.create(str(bulk_id), plan, cached=cached_count)
+
+    task_id = None
+    if plan:
+        worker, _ = worker_registry.route(plan[0]['batches'][0][0]['lora_key'])
+        task = run_bulk_generation.apply_async((str(bulk_id),), **({'queue': worker['queue']} if worker else {}))
+        task_id = task.id
+
+    summary = plan_summary(plan)
+    logger.info(f"Started bulk generation {bulk_id}: {len(assets)} images, {cached_count} cached, plan {summary}")
+
+    return BulkGenerationResponse(
+        bulk_id=str(bulk_id),
+        status='queued' if plan else 'completed',
+        task_id=task_id,
+        job_ids=[str(asset.id) for asset in assets],
+        plan=summary,
+        cached=cached_count
     )
 
+@router.get("/bulk/{bulk_id}", response_model=BulkGenerationStatus)
+async def get_bulk_generation(bulk_id: str):
+    """Progress and throughput (images per minute of generation time) of a bulk run."""
+    state = bulk_generation.get(bulk_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Bulk generation not found")
+    return BulkGenerationStatus(**state)
+
+@router.post("/bulk/{bulk_id}/pause", response_model=BulkGenerationStatus)
+async def pause_bulk_generation(bulk_id: str):
+    """Pause a bulk run; a running one stops after its current batch."""
+    state = bulk_generation.get(bulk_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Bulk generation not found")
+
+    if state['status'] == 'queued':
+        # Its queued task exits as soon as it starts
+        bulk_generation.set_status(bulk_id, 'paused')
+    elif state['status'] == 'running':
+        bulk_generation.set_status(bulk_id, 'pausing')
+    elif state['status'] not in ('pausing', 'paused'):
+        raise HTTPException(status_code=409, detail=f"Bulk generation already {state['status']}")
+
+    logger.info(f"Paused bulk generation {bulk_id}")
+    return BulkGenerationStatus(**bulk_generation.get(bulk_id))
+
+@router.post("/bulk/{bulk_id}/resume", response_model=BulkGenerationStatus)
+async def resume_bulk_generation(bulk_id: str):
+    """Resume a paused (or failed) bulk run from the first unfinished image."""
+    state = bulk_generation.get(bulk_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Bulk generation not found")
+
+    if state['status'] == 'pausing':
+        # Still running: just withdraw the pause
+        bulk_generation.set_status(bulk_id, 'running')
+    elif state['status'] in ('paused', 'failed'):
+        bulk_generation.set_status(bulk_id, 'queued')
+        plan = bulk_generation.plan(bulk_id)
+        worker, _ = worker_registry.route(plan[0]['batches'][0][0]['lora_key'] if plan else None)
+        run_bulk_generation.apply_async((bulk_id,), **({'queue': worker['queue']} if worker else {}))
+    elif state['status'] != 'running':
+        raise HTTPException(status_code=409, detail=f"Bulk generation already {state['status']}")
+
+    logger.info(f"Resumed bulk generation {bulk_id}")
+    return BulkGenerationStatus(**bulk_generation.get(bulk_id))
+
+@router.get("/cache/stats")
+async def get_generation_cache_stats():
+    """Hit rate of the deterministic generation cache."""
+    return generation_cache.stats()
+
+@router.get("/scheduler/stats")
+async def get_generation_scheduler_stats():
+    """Queue depth and LoRA swaps avoided by affinity scheduling."""
+    return generation_scheduler.stats()
+
+@router.get("/workers")
+async def get_generation_workers():
+    """Live generation workers, the LoRAs they hold and their routing hit rates."""
+    return worker_registry.stats()
+
+@router.get("/admission/stats")
+async def get_generation_admission_stats():
+    """Admission outcomes and the fitted runtime model behind ETAs."""
+    return admission_controller.stats()
+
 @router.get("/{job_id}", response_model=GenerationJobResponse)
 async def get_generation_job(
     job_id: str,
+    variant: str = 'original',
     db: Session = Depends(get_db)
 ):
-    """Get generation job status."""
+    """
+    Get generation job status.
+
+    output_paths are presigned URLs of the full-size PNGs, or of the
+    'display' / 'thumb' variants if requested.
+    """
+    _check_variant(variant)
     asset = db.query(GeneratedAsset).filter(GeneratedAsset.id == job_id).first()
     if not asset:
         raise HTTPException(status_code=404, detail="Generation job not found")
 
-    # Get output paths
-    output_paths = asset.parameters.get('output_paths', []) if asset.parameters else []
-
-    # Generate presigned URLs for images
-    if output_paths:
-        presigned_urls = []
-        for path in output_paths:
-            url = storage_service.get_presigned_url(path, expiration=3600)
-            if url:
-                presigned_urls.append(url)
-        output_paths = presigned_urls
+    # Presigned URLs for images
+    output_paths = _output_urls(asset.parameters or {}, variant)
 
     # Determine status
     error = asset.parameters.get('error') if asset.parameters else None
-    if error:
-        status_value = 'failed'
-    elif output_paths:
-        status_value = 'completed'
-    else:
-        status_value = 'processing'
+    status_value = _job_status(asset, error, output_paths)
 
     return GenerationJobResponse(
         id=str(asset.id),
@@ -106,42 +711,143 @@ async def get_generation_job(
         prompt=asset.prompt or '',
         parameters=asset.parameters or {},
         output_paths=output_paths,
+        variant=variant,
         error_message=error,
         created_at=asset.created_at,
         completed_at=asset.completed_at
     )
 
+@router.post("/{job_id}/cancel")
+async def cancel_generation_job(
+    job_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Cancel a generation job.
+
+    A queued job is dropped right away; a running one stops at its next
+    denoising step and frees the GPU for the next job. Cancelling a sweep
+    cell stops the rest of its sweep.
+    """
+    asset = db.query(GeneratedAsset).filter(GeneratedAsset.id == job_id).first()
+    if not asset:
+        raise HTTPException(status_code=404, detail="Generation job not found")
+
+    parameters = asset.parameters or {}
+    if parameters.get('status') in ('completed', 'failed', 'cancelled'):
+        raise HTTPException(status_code=409, detail=f"Job already {parameters['status']}")
+
+    if generation_scheduler.remove(job_id):
+        asset.parameters = {**parameters, 'status': 'cancelled', 'cancel_reason': 'Cancelled before start'}
+        asset.completed_at = datetime.utcnow()
+        db.commit()
+        progress_manager.set_progress(job_id, {'status': 'cancelled', 'message': 'Cancelled before start'})
+        logger.info(f"Cancelled queued generation job {job_id}")
+        return {'job_id': job_id, 'status': 'cancelled'}
+
+    # Running (or about to run): the worker checks this flag on every step
+    progress_manager.request_cancel(parameters.get('sweep_id') or job_id)
+    logger.info(f"Requested cancellation of generation job {job_id}")
+    return {'job_id': job_id, 'status': 'cancelling'}
+
+@router.post("/{job_id}/refine", response_model=GenerationResponse, status_code=status.HTTP_201_CREATED)
+async def refine_generation_job(
+    job_id: str,
+    request: GenerationRefineRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Render one image of a draft at full quality, as a new job.
+
+    The draft is upscaled to the target size and re-denoised (img2img) for
+    `strength` of the steps with the draft's prompt, seed and LoRA, so its
+    composition is kept. The job is routed like any other, so it usually
+    lands on the worker that still holds the LoRA and prompt embeddings.
+    """
+    source = db.query(GeneratedAsset).filter(GeneratedAsset.id == job_id).first()
+    if not source:
+        raise HTTPException(status_code=404, detail="Generation job not found")
+
+    parameters = source.parameters or {}
+    target = parameters.get('draft_target')
+    if not target:
+        raise HTTPException(status_code=400, detail="Job is not a draft")
+    output_paths = parameters.get('output_paths') or []
+    if parameters.get('status') != 'completed' or not output_paths:
+        raise HTTPException(status_code=409, detail="Draft has not finished")
+    if request.image_index >= len(output_paths):
+        raise HTTPException(status_code=400, detail=f"Draft has {len(output_paths)} images")
+
+    width = request.width or target['width']
+    height = request.height or target['height']
+    num_inference_steps = request.num_inference_steps or target['num_inference_steps']
+    model_id = str(source.model_id) if source.model_id else None
+
+    refined_id = uuid.uuid4()
+    asset = GeneratedAsset(
+        id=refined_id,
+        model_id=source.model_id,
+        asset_type='image',
+        storage_path='',  # Will be updated after generation
+        prompt=source.prompt,
+        negative_prompt=source.negative_prompt,
+        parameters={
+            'num_images': 1,
+            'num_inference_steps': num_inference_steps,
+            'guidance_scale': parameters.get('guidance_scale', 3.5),
+            'width': width,
+            'height': height,
+            'seed': parameters.get('seed'),
+            'lora_weight': parameters.get('lora_weight'),
+            'config': parameters.get('config'),
+            'refined_from': {'job_id': job_id, 'image_index': request.image_index},
+            'strength': request.strength
+        }
+    )
+
+    generation_config = {
+        'prompt': source.prompt,
+        'negative_prompt': source.negative_prompt,
+        'model_id': model_id,
+        'lora_weight': parameters.get('lora_weight'),
+        'num_images': 1,
+        'num_inference_steps': num_inference_steps,
+        'guidance_scale': parameters.get('guidance_scale', 3.5),
+        'width': width,
+        'height': height,
+        'seed': parameters.get('seed'),
+        'preview_interval': request.preview_interval,
+        'init_image': output_paths[request.image_index],
+        'strength': request.strength,
+    }
+
+    return _submit(db, asset, generation_config)
+
 @router.get("/", response_model=List[GenerationJobResponse])
 async def list_generation_jobs(
     limit: int = 20,
+    variant: str = 'thumb',
     db: Session = Depends(get_db)
 ):
-    """List recent generation jobs."""
+    """
+    List recent generation jobs.
+
+    output_paths point at the small WebP thumbnails unless another variant
+    ('display' or 'original') is requested.
+    """
+    _check_variant(variant)
     assets = db.query(GeneratedAsset).filter(
         GeneratedAsset.asset_type == 'image'
     ).order_by(GeneratedAsset.created_at.desc()).limit(limit).all()
 
     results = []
     for asset in assets:
-        output_paths = asset.parameters.get('output_paths', []) if asset.parameters else []
-
-        # Generate presigned URLs
-        if output_paths:
-            presigned_urls = []
-            for path in output_paths:
-                url = storage_service.get_presigned_url(path, expiration=3600)
-                if url:
-                    presigned_urls.append(url)
-            output_paths = presigned_urls
+        # Presigned URLs for images
+        output_paths = _output_urls(asset.parameters or {}, variant)
 
         # Determine status
         error = asset.parameters.get('error') if asset.parameters else None
-        if error:
-            status_value = 'failed'
-        elif output_paths:
-            status_value = 'completed'
-        else:
-            status_value = 'processing'
+        status_value = _job_status(asset, error, output_paths)
 
         results.append(GenerationJobResponse(
             id=str(asset.id),
@@ -149,6 +855,7 @@ async def list_generation_jobs(
             prompt=asset.prompt or '',
             parameters=asset.parameters or {},
             output_paths=output_paths,
+            variant=variant,
             error_message=error,
             created_at=asset.created_at,
             completed_at=asset.completed_at
@@ -166,10 +873,18 @@ async def delete_generation_job(
     if not asset:
         raise HTTPException(status_code=404, detail="Generation job not found")
 
-    # Delete images from storage
-    output_paths = asset.parameters.get('output_paths', []) if asset.parameters else []
-    for path in output_paths:
-        storage_service.delete_file(path)
+    # A job that has not started yet is simply dropped from the queue
+    generation_scheduler.remove(job_id)
+
+    # Delete images from storage, unless other (cached) jobs still show them
+    parameters = asset.parameters or {}
+    shared = parameters.get('cache_key') and generation_cache.release(parameters['cache_key'], job_id) > 0
+    if not shared:
+        for path in parameters.get('output_paths', []):
+            storage_service.delete_file(path)
+        for variants in parameters.get('derivatives') or []:
+            for path in variants.values():
+                storage_service.delete_file(path)
 
     # Delete from database
     db.delete(asset)
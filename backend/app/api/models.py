@@ -5,6 +5,7 @@ from app.models import get_db
 from app.models.model import Model
 from app.schemas.model import ModelResponse
 from app.services.storage_service import storage_service
+from app.tasks.training_tasks import compress_lora
 import logging
 
 router = APIRouter()
@@ -73,6 +74,25 @@ async def get_model(
         download_url=download_url
     )
 
+@router.post("/{model_id}/compact", status_code=status.HTTP_202_ACCEPTED)
+async def compact_model(
+    model_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    (Re)build the compact variant of a LoRA: rank-reduced, and stored as
+    LORA_COMPACT_DTYPE. Trained models get one automatically; the result,
+    with its size and load-time savings, appears in model_metadata['compact'].
+    """
+    model = db.query(Model).filter(Model.id == model_id).first()
+    if not model:
+        raise HTTPException(status_code=404, detail="Model not found")
+
+    task = compress_lora.delay(str(model.id))
+    logger.info(f"Queued compaction of model {model_id}, task {task.id}")
+
+    return {'model_id': model_id, 'status': 'queued', 'task_id': task.id}
+
 @router.delete("/{model_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_model(
     model_id: str,
@@ -85,6 +105,9 @@ async def delete_model(
 
     # Delete from storage
     storage_service.delete_file(model.storage_path)
+    compact = (model.model_metadata or {}).get('compact') or {}
+    if compact.get('storage_path'):
+        storage_service.delete_file(compact['storage_path'])
 
     # Delete from database
     db.delete(model)
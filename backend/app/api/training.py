@@ -3,14 +3,62 @@ from sqlalchemy.orm import Session
 from typing import List
 from app.models import get_db
 from app.models.training import TrainingSession
-from app.schemas.training import TrainingRequest, TrainingResponse, TrainingStatusResponse
+from app.schemas.training import TrainingRequest, TrainingResponse, TrainingStatusResponse, TrainingPlanResponse
 from app.tasks.training_tasks import train_flux_lora, cancel_training
+from app.trainers.autotune import plan_training
+from app.config import settings
+from app.services.dataset_manifest import DatasetManifest
+from app.services.dataset_service import dataset_service
 from pathlib import Path
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def _dataset_image_sizes(manifest: DatasetManifest) -> list:
+    """(width, height) of each image, as recorded at ingest."""
+    return [
+        (info['width'], info['height'])
+        for _, info in manifest.images()
+        if info.get('width') and info.get('height')
+    ]
+
+def _request_manifest(request: TrainingRequest, dataset, db: Session) -> DatasetManifest:
+    """Manifest of the dataset version a request trains on."""
+    if request.dataset_version is None:
+        return DatasetManifest.load(dataset)
+    try:
+        return dataset_service.manifest_at(db, dataset, request.dataset_version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def _plan_for_request(request: TrainingRequest, dataset, manifest: DatasetManifest) -> dict:
+    """Build an auto-tuned training plan for a dataset."""
+    image_sizes = _dataset_image_sizes(manifest)
+    image_count = manifest.stats()['image_count'] or dataset.image_count
+
+    try:
+        return plan_training(
+            image_count=image_count,
+            resolution=request.resolution or settings.DEFAULT_RESOLUTION,
+            image_sizes=image_sizes
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/flux/plan", response_model=TrainingPlanResponse)
+async def plan_flux_training(
+    request: TrainingRequest,
+    db: Session = Depends(get_db)
+):
+    """Dry run: show the auto-tuned training plan and estimated wall time."""
+    from app.models.dataset import Dataset
+    dataset = db.query(Dataset).filter(Dataset.id == request.dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    return TrainingPlanResponse(**_plan_for_request(request, dataset, _request_manifest(request, dataset, db)))
+
 @router.post("/flux", response_model=TrainingResponse, status_code=status.HTTP_201_CREATED)
 async def start_flux_training(
     request: TrainingRequest,
@@ -19,10 +67,39 @@ async def start_flux_training(
     """Start Flux LoRA training."""
     # Validate dataset exists
     from app.models.dataset import Dataset
+    from app.models.dataset_version import DatasetVersion
     dataset = db.query(Dataset).filter(Dataset.id == request.dataset_id).first()
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
+    # Pin the exact dataset version this session trains on
+    if request.dataset_version is None:
+        version = dataset_service.head_version(db, dataset)
+    else:
+        version = db.query(DatasetVersion).filter(
+            DatasetVersion.dataset_id == dataset.id,
+            DatasetVersion.version == request.dataset_version
+        ).first()
+        if not version:
+            raise HTTPException(status_code=404, detail=f"Dataset has no version {request.dataset_version}")
+    dataset_version = {
+        'dataset_version': version.version if version else None,
+        'dataset_version_id': str(version.id) if version else None,
+    }
+
+    # Auto-tune hyperparameters from the dataset
+    tuned = {}
+    if request.auto_tune:
+        plan = _plan_for_request(request, dataset, _request_manifest(request, dataset, db))
+        tuned = {
+            'steps': plan['steps'],
+            'batch_size': plan['batch_size'],
+            'gradient_accumulation_steps': plan['gradient_accumulation_steps'],
+            'num_workers': plan['num_workers'],
+            'save_every_n_steps': plan['save_every_n_steps'],
+        }
+    steps = tuned.get('steps', request.steps)
+
     # Create training session
     session = TrainingSession(
         name=request.name,
@@ -30,15 +107,18 @@ async def start_flux_training(
         status='pending',
         config={
             'dataset_id': request.dataset_id,
+            **dataset_version,
             'learning_rate': request.learning_rate,
-            'steps': request.steps,
+            'steps': steps,
             'network_dim': request.network_dim,
             'network_alpha': request.network_alpha,
             'resolution': request.resolution,
             'trigger_word': request.trigger_word,
+            'auto_tune': request.auto_tune,
+            **tuned,
             **request.config
         },
-        total_steps=request.steps
+        total_steps=steps
     )
 
     db.add(session)
@@ -49,19 +129,18 @@ async def start_flux_training(
     output_dir = Path(f"/tmp/masuka/training/{session.id}")
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # TODO: Download dataset from S3 to local path
-    # For now, assume dataset is in temp directory
-    dataset_path = f"/tmp/masuka/uploads/{request.dataset_id}"
-
+    # The worker syncs the dataset from storage into its own training directory
     training_config = {
-        'dataset_path': dataset_path,
+        'dataset_id': str(dataset.id),
+        'dataset_version': dataset_version['dataset_version'],
         'output_path': str(output_dir),
         'learning_rate': request.learning_rate,
-        'steps': request.steps,
+        'steps': steps,
         'network_dim': request.network_dim,
         'network_alpha': request.network_alpha,
         'resolution': request.resolution,
         'trigger_word': request.trigger_word or '',
+        **tuned,
     }
 
     # Queue training task
@@ -0,0 +1,15 @@
+from typing import Dict, Any
+from .base_captioner import BaseCaptioner
+from .stub_captioner import StubCaptioner
+
+def create_captioner(name: str, config: Dict[str, Any]) -> BaseCaptioner:
+    """Instantiate a captioner by name ('blip' or 'stub')."""
+    if name == 'stub':
+        return StubCaptioner(config)
+    if name == 'blip':
+        # Imported lazily so the API process never loads torch/transformers for this
+        from .blip_captioner import BlipCaptioner
+        return BlipCaptioner(config)
+    raise ValueError(f"Unknown captioner: {name}")
+
+__all__ = ['BaseCaptioner', 'StubCaptioner', 'create_captioner']
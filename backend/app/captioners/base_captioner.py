@@ -0,0 +1,44 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any
+from PIL import Image
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BaseCaptioner(ABC):
+    """Abstract base class for all captioners."""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.model = None
+        self.device = config.get('device', 'cuda')
+        self.batch_size = config.get('batch_size', 8)
+
+    @property
+    @abstractmethod
+    def cache_id(self) -> str:
+        """Identity of the captioner and its weights, used to key cached captions."""
+        pass
+
+    @abstractmethod
+    def load_model(self):
+        """Load the captioning model."""
+        pass
+
+    @abstractmethod
+    def caption_batch(self, images: List[Image.Image]) -> List[str]:
+        """
+        Caption a batch of images in one forward pass.
+
+        Args:
+            images: RGB images
+
+        Returns:
+            One caption per image, in order
+        """
+        pass
+
+    @abstractmethod
+    def unload_model(self):
+        """Unload model to free memory."""
+        pass
@@ -0,0 +1,68 @@
+import torch
+from transformers import BlipProcessor, BlipForConditionalGeneration
+from typing import List, Dict, Any
+from PIL import Image
+import logging
+from app.captioners.base_captioner import BaseCaptioner
+
+logger = logging.getLogger(__name__)
+
+class BlipCaptioner(BaseCaptioner):
+    """BLIP image captioner, batched on the GPU (or CPU)."""
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.model_id = config.get('model_id', 'Salesforce/blip-image-captioning-large')
+        self.max_new_tokens = config.get('max_new_tokens', 60)
+        self.processor = None
+        if self.device == 'cuda' and not torch.cuda.is_available():
+            self.device = 'cpu'
+        self.dtype = torch.float16 if self.device == 'cuda' else torch.float32
+
+    @property
+    def cache_id(self) -> str:
+        return f"blip:{self.model_id}:{self.max_new_tokens}"
+
+    def load_model(self):
+        """Load the BLIP model and processor."""
+        if self.model is not None:
+            logger.info("Captioner already loaded")
+            return
+
+        logger.info(f"Loading captioner {self.model_id}...")
+
+        try:
+            self.processor = BlipProcessor.from_pretrained(self.model_id)
+            self.model = BlipForConditionalGeneration.from_pretrained(
+                self.model_id,
+                torch_dtype=self.dtype
+            ).to(self.device)
+            self.model.eval()
+
+            logger.info(f"Captioner loaded on {self.device}")
+
+        except Exception as e:
+            logger.error(f"Failed to load captioner: {e}")
+            raise
+
+    def caption_batch(self, images: List[Image.Image]) -> List[str]:
+        if self.model is None:
+            raise ValueError("Captioner not loaded. Call load_model() first.")
+
+        inputs = self.processor(images=images, return_tensors='pt').to(self.device, self.dtype)
+        with torch.inference_mode():
+            output = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+
+        return [caption.strip() for caption in self.processor.batch_decode(output, skip_special_tokens=True)]
+
+    def unload_model(self):
+        """Unload model to free memory."""
+        if self.model is not None:
+            del self.model
+            self.model = None
+            self.processor = None
+
+            if self.device == 'cuda':
+                torch.cuda.empty_cache()
+
+            logger.info("Captioner unloaded")
@@ -0,0 +1,28 @@
+from typing import List, Dict, Any
+from PIL import Image
+from app.captioners.base_captioner import BaseCaptioner
+
+class StubCaptioner(BaseCaptioner):
+    """Deterministic captioner without a model, for tests and dry runs."""
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.template = config.get('template', 'a photo, {orientation}, {width}x{height}')
+
+    @property
+    def cache_id(self) -> str:
+        return f"stub:{self.template}"
+
+    def load_model(self):
+        pass
+
+    def caption_batch(self, images: List[Image.Image]) -> List[str]:
+        captions = []
+        for image in images:
+            width, height = image.size
+            orientation = 'square' if width == height else ('landscape' if width > height else 'portrait')
+            captions.append(self.template.format(width=width, height=height, orientation=orientation))
+        return captions
+
+    def unload_model(self):
+        pass
@@ -31,6 +31,66 @@ class Settings(BaseSettings):
     MODELS_PATH: str = "/content/models"
     TEMP_PATH: str = "/tmp/masuka"
 
+    # Dataset ingest (comma-separated resolutions to pre-bucket at ingest)
+    DATASET_BUCKET_RESOLUTIONS: str = "1024"
+    DATASET_MAX_IMAGE_SIDE: int = 2048  # Downscale larger originals
+    DATASET_PROCESSED_FORMAT: str = "png"  # 'png', 'jpeg' or 'webp'
+    DATASET_PROCESSED_QUALITY: int = 95  # For lossy formats
+    DATASET_PREPROCESS_WORKERS: int = 0  # 0 = one per CPU core
+    DATASET_DUPLICATE_MAX_DISTANCE: int = 8  # pHash bits (of 64) for near-duplicates
+    DATASET_REJECT_DUPLICATES: bool = False  # Reject near-duplicates instead of flagging them
+    DATASET_SYNC_WORKERS: int = 8  # Parallel downloads when syncing a dataset for training
+    DATASET_BLOB_CACHE_MAX_GB: float = 50.0  # Local content-addressed cache; least recently used blobs are pruned beyond this
+    DATASET_UPLOAD_WORKERS: int = 8  # Concurrent storage uploads during archive ingest
+    DATASET_ARCHIVE_MAX_ENTRY_MB: int = 200  # Largest single file accepted from an archive
+    DATASET_UPLOAD_PART_MB: int = 8  # Resumable uploads: S3 part size (min 5)
+    DATASET_UPLOAD_EXPIRY_HOURS: int = 24  # Resumable uploads: idle time before state is dropped
+    DATASET_VIDEO_MODE: str = "frames"  # 'frames' (stills for image LoRAs) or 'segments' (clips)
+    DATASET_VIDEO_FPS: float = 1.0  # Frames (or segment frame rate) extracted per second
+    DATASET_VIDEO_MAX_SIDE: int = 1024
+    DATASET_VIDEO_SEGMENT_SECONDS: float = 4.0
+    DATASET_CAPTIONER: str = "blip"  # 'blip' or 'stub'
+    DATASET_CAPTION_MODEL: str = "Salesforce/blip-image-captioning-large"
+    DATASET_CAPTION_BATCH_SIZE: int = 8
+    DATASET_CAPTION_IMAGE_SIDE: int = 768  # Images are downscaled before captioning
+
+    # Generation
+    GENERATION_SWEEP_MAX_IMAGES: int = 32  # Largest seed x LoRA-weight grid per sweep
+    GENERATION_SWEEP_BATCH_SIZE: int = 4  # Images denoised together in a sweep
+    GENERATION_FAIRNESS_WINDOW_SECONDS: float = 300.0  # Only jobs this much newer may overtake a job
+    GENERATION_AFFINITY_MAX_JOBS: int = 16  # Jobs one worker task runs back to back
+    GENERATION_AFFINITY_MAX_SECONDS: float = 1800.0  # Stop taking new jobs after this long
+    GENERATION_JOB_TIME_LIMIT_SECONDS: float = 600.0  # A job still running after this long is stopped and failed
+    GENERATION_WORKER_TTL_SECONDS: int = 60  # Workers missing heartbeats this long stop receiving jobs
+    GENERATION_ROUTING_MAX_IMBALANCE: int = 4  # Extra queued jobs tolerated to reach a worker holding the LoRA
+    GENERATION_SCHEDULER_SCAN: int = 256  # Oldest pending jobs considered per pick
+    # Parsed LoRAs kept in (pinned) host memory per worker process, 0 to disable.
+    # Workers restart after every task (worker_max_tasks_per_child=1), so this
+    # only serves the jobs one task runs back to back (GENERATION_AFFINITY_MAX_JOBS)
+    GENERATION_LORA_RAM_BUDGET_MB: int = 512
+    GENERATION_PROMPT_CACHE_SIZE: int = 64  # Prompt embeddings kept in memory (~4MB each)
+    # Disk tier (empty to disable); workers restart after every task, so this
+    # is what carries embeddings from one job to the next
+    GENERATION_PROMPT_CACHE_DIR: str = "/tmp/masuka/prompt_cache"
+    GENERATION_UPLOAD_WORKERS: int = 4  # Threads encoding and uploading images while the GPU keeps going
+    GENERATION_THUMBNAIL_SIZE: int = 256  # Long side of the WebP thumbnail stored with each image
+    GENERATION_DISPLAY_SIZE: int = 1024  # Long side of the display variant
+    GENERATION_DISPLAY_FORMAT: str = "avif"  # 'avif', 'webp' or 'jpeg' (AVIF falls back to WebP if Pillow lacks it)
+    GENERATION_DERIVATIVE_QUALITY: int = 70
+    GENERATION_DRAFT_SCALE: float = 0.5  # Draft resolution relative to the requested size (short side kept >= 512)
+    GENERATION_DRAFT_STEPS: int = 10  # Denoising steps of a draft
+    GENERATION_BULK_MAX_IMAGES: int = 1000  # Largest bulk generation file
+    GENERATION_BULK_BATCH_MEGAPIXELS: float = 4.0  # Pixels denoised per pipeline call (4 images at 1024x1024)
+    GENERATION_BULK_MAX_BATCH: int = 8
+    GENERATION_BULK_SLICE_SECONDS: float = 900.0  # A bulk task re-queues itself after this long, letting other jobs in
+    GENERATION_MAX_JOB_SECONDS: float = 540.0  # Jobs predicted to run longer are split or rejected (capped at 90% of GENERATION_JOB_TIME_LIMIT_SECONDS)
+    GENERATION_MAX_SWEEP_SECONDS: float = 3300.0  # Sweeps predicted to run longer are split over several tasks (generate_sweep is killed at 3600s)
+    GENERATION_MAX_QUEUE_SECONDS: float = 1800.0  # Predicted wait above which submissions get 429 + Retry-After
+    GENERATION_COST_MODEL_SAMPLES: int = 500  # Recent jobs the runtime model is fitted on
+    GENERATION_COST_MODEL_REFIT_SECONDS: int = 300
+    GENERATION_SECONDS_PER_STEP_MEGAPIXEL: float = 0.5  # Runtime model prior, until jobs have been measured
+    GENERATION_MODEL_LOAD_SECONDS: float = 60.0  # Base model load prior (paid by an idle worker's first job)
+
     # CORS (will be split from comma-separated string in .env)
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:8000,http://127.0.0.1:3000,http://127.0.0.1:8000"
 
@@ -41,6 +101,16 @@ class Settings(BaseSettings):
     DEFAULT_FLUX_ALPHA: int = 16
     DEFAULT_RESOLUTION: int = 1024
 
+    # Training auto-tuning
+    TRAINING_VRAM_GB: float = 40.0  # GPU memory budget (Colab A100 40GB)
+    TRAINING_SECONDS_PER_MEGAPIXEL: float = 1.2  # Measured fwd+bwd time per 1MP sample
+
+    # LoRA compaction (rank reduction after training; generation loads the compact file)
+    LORA_COMPACT_ENABLED: bool = True
+    LORA_COMPACT_MAX_ERROR: float = 0.01  # Relative Frobenius error allowed per layer's update
+    LORA_COMPACT_DTYPE: str = "fp16"  # Stored factors: 'bf16', 'fp16' or 'int8'
+    LORA_COMPACT_MIN_SAVING: float = 0.1  # Smaller savings keep generation on the original file
+
     # Celery
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
@@ -56,6 +126,16 @@ class Settings(BaseSettings):
         """Convert CORS_ORIGINS string to list."""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
 
+    @property
+    def generation_max_job_seconds(self) -> float:
+        """Predicted runtime a job is split at, kept under the per-job limit it actually runs with."""
+        return min(self.GENERATION_MAX_JOB_SECONDS, 0.9 * self.GENERATION_JOB_TIME_LIMIT_SECONDS)
+
+    @property
+    def dataset_bucket_resolutions_list(self) -> List[int]:
+        """Convert DATASET_BUCKET_RESOLUTIONS string to list of ints."""
+        return [int(r.strip()) for r in self.DATASET_BUCKET_RESOLUTIONS.split(",") if r.strip()]
+
     class Config:
         env_file = ".env"
         case_sensitive = True
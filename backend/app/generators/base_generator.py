@@ -4,6 +4,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+class GenerationCancelled(Exception):
+    """Raised from a step callback to stop a generation between denoising steps."""
+
 class BaseGenerator(ABC):
     """Abstract base class for all generators."""
 
@@ -1,20 +1,46 @@
 import torch
-from diffusers import FluxPipeline
-from typing import List, Dict, Any, Optional
+from diffusers import FluxPipeline, FluxImg2ImgPipeline
+from typing import List, Dict, Any, Optional, Callable
 from pathlib import Path
 import logging
 from PIL import Image
-from app.generators.base_generator import BaseGenerator
+import time
+from app.config import settings
+from app.generators.base_generator import BaseGenerator, GenerationCancelled
+from app.generators.prompt_cache import PromptEmbeddingCache
+from app.generators.latent_preview import preview_jpeg
 
 logger = logging.getLogger(__name__)
 
+# Adapter name for LoRAs loaded unfused (scale adjustable per call)
+LORA_ADAPTER = "masuka"
+# LoRA keys that patch the text encoders (diffusers and kohya naming)
+TEXT_ENCODER_PREFIXES = ('text_encoder', 'lora_te')
+
 class FluxGenerator(BaseGenerator):
     """Flux image generator with LoRA support."""
 
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.pipeline = None
+        self.img2img_pipeline = None  # Shares the modules of self.pipeline
         self.lora_loaded = False
+        self.lora_fused = False
+        self.lora_path = None
+        self.lora_identity = None  # (path, weight) when the LoRA also patches the text encoders
+        # Base weights of the layers fused LoRAs have touched, as loaded; unfusing
+        # subtracts the update in bf16, so they are restored from here instead.
+        # Taken the first time a layer is patched and kept until the model is
+        # unloaded, so later swaps copy nothing back to the host
+        self.base_weights: Dict[str, torch.Tensor] = {}
+
+        # Text-encoder outputs are reused across jobs with the same prompt
+        self.max_sequence_length = config.get('max_sequence_length', 512)
+        self.prompt_cache = PromptEmbeddingCache(
+            max_entries=config.get('prompt_cache_size', settings.GENERATION_PROMPT_CACHE_SIZE),
+            disk_dir=config.get('prompt_cache_dir', settings.GENERATION_PROMPT_CACHE_DIR) or None
+        )
+        self.last_metrics: Dict[str, Any] = {}
 
         # Generation defaults
         self.default_steps = config.get('num_inference_steps', 30)
@@ -50,13 +76,22 @@ class FluxGenerator(BaseGenerator):
             logger.error(f"Failed to load Flux model: {e}")
             raise
 
-    def load_lora(self, lora_path: str, weight: float = 0.8):
+    def load_lora(
+        self,
+        lora_path: str,
+        weight: float = 0.8,
+        fuse: bool = True,
+        state_dict: Optional[Dict[str, torch.Tensor]] = None
+    ):
         """
         Load a LoRA adapter.
 
         Args:
             lora_path: Path to LoRA safetensors file
             weight: LoRA weight (0.0 to 1.0)
+            fuse: Fuse into the base weights (fastest per step); unfused
+                adapters can change weight with set_lora_weight()
+            state_dict: Already parsed weights of lora_path (skips reading the file)
         """
         if self.pipeline is None:
             raise ValueError("Base model not loaded. Call load_model() first.")
@@ -64,31 +99,255 @@ class FluxGenerator(BaseGenerator):
         logger.info(f"Loading LoRA from {lora_path} with weight {weight}")
 
         try:
-            # Load LoRA weights
-            self.pipeline.load_lora_weights(lora_path)
-
-            # Set LoRA scale
-            self.pipeline.fuse_lora(lora_scale=weight)
+            source = state_dict if state_dict is not None else lora_path
+            if fuse:
+                # Load LoRA weights
+                self.pipeline.load_lora_weights(source)
+                self._snapshot_base_weights()
+
+                # Set LoRA scale
+                self.pipeline.fuse_lora(lora_scale=weight)
+            else:
+                self.pipeline.load_lora_weights(source, adapter_name=LORA_ADAPTER)
+                self.pipeline.set_adapters([LORA_ADAPTER], adapter_weights=[weight])
 
             self.lora_loaded = True
+            self.lora_fused = fuse
+            self.lora_path = lora_path
+            patches_text_encoder = (
+                any(key.startswith(TEXT_ENCODER_PREFIXES) for key in state_dict)
+                if state_dict is not None else self._lora_patches_text_encoder(lora_path)
+            )
+            self.lora_identity = (lora_path, weight) if patches_text_encoder else None
             logger.info("LoRA loaded successfully")
 
         except Exception as e:
             logger.error(f"Failed to load LoRA: {e}")
             raise
 
+    def set_lora_weight(self, weight: float):
+        """Change the scale of an unfused LoRA without reloading it."""
+        if not self.lora_loaded or self.lora_fused:
+            raise ValueError("LoRA weight can only change on an unfused adapter")
+
+        self.pipeline.set_adapters([LORA_ADAPTER], adapter_weights=[weight])
+        if self.lora_identity:
+            self.lora_identity = (self.lora_path, weight)
+
+    def refuse_lora(self, weight: float):
+        """Re-fuse the loaded LoRA at a new weight (its layers stay on the GPU)."""
+        if not self.lora_loaded or not self.lora_fused:
+            raise ValueError("No fused LoRA loaded")
+
+        self._unfuse_lora()
+        self.pipeline.fuse_lora(lora_scale=weight)
+        if self.lora_identity:
+            self.lora_identity = (self.lora_path, weight)
+
+    def _lora_layers(self):
+        """(name, layer) of every LoRA-wrapped layer in the transformer and text encoders."""
+        from peft.tuners.tuners_utils import BaseTunerLayer
+
+        for component in ('transformer', 'text_encoder', 'text_encoder_2'):
+            module = getattr(self.pipeline, component, None)
+            if module is None:
+                continue
+            for name, layer in module.named_modules():
+                if isinstance(layer, BaseTunerLayer):
+                    yield f"{component}.{name}", layer
+
+    def _snapshot_base_weights(self):
+        """Keep host copies of base weights the loaded LoRA patches that are not kept yet (before fusing)."""
+        for name, layer in self._lora_layers():
+            if name not in self.base_weights:
+                self.base_weights[name] = layer.get_base_layer().weight.detach().to('cpu', copy=True)
+
+    def _unfuse_lora(self):
+        """
+        Unfuse the LoRA and put back the exact base weights.
+
+        unfuse_lora() subtracts the scaled update from bf16 weights that were
+        rounded when it was added, so every fuse/unfuse cycle would leave the
+        base model a little further from the checkpoint.
+        """
+        self.pipeline.unfuse_lora()
+        with torch.no_grad():
+            for name, layer in self._lora_layers():
+                original = self.base_weights.get(name)
+                if original is not None:
+                    weight = layer.get_base_layer().weight
+                    weight.copy_(original.to(weight.device, non_blocking=True))
+
     def unload_lora(self):
         """Unload current LoRA and clear CUDA cache."""
         if self.lora_loaded and self.pipeline is not None:
             logger.info("Unloading LoRA")
-            self.pipeline.unfuse_lora()
+            if self.lora_fused:
+                self._unfuse_lora()
+            # Drop the LoRA layers too, so the next adapter starts clean
+            self.pipeline.unload_lora_weights()
             self.lora_loaded = False
+            self.lora_fused = False
+            self.lora_path = None
+            self.lora_identity = None
 
             # Clear CUDA cache to prevent memory leaks
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
                 logger.info("CUDA cache cleared after LoRA unload")
 
+    @staticmethod
+    def _lora_patches_text_encoder(lora_path: str) -> bool:
+        """Whether a LoRA file has text-encoder weights (only reads the safetensors header)."""
+        try:
+            from safetensors import safe_open
+            with safe_open(lora_path, framework='pt') as f:
+                return any(key.startswith(TEXT_ENCODER_PREFIXES) for key in f.keys())
+        except Exception:
+            # Unknown format: assume it does, so cached embeddings are never reused wrongly
+            return True
+
+    def _encoder_identity(self) -> str:
+        """Everything besides the prompt that determines the text-encoder outputs."""
+        identity = f"FLUX.1-dev:{self.pipeline.text_encoder.dtype}:{self.max_sequence_length}"
+        if self.lora_identity:
+            identity += f":lora={self.lora_identity[0]}@{self.lora_identity[1]}"
+        return identity
+
+    def encode_prompt(self, prompt: str) -> Dict[str, torch.Tensor]:
+        """
+        CLIP and T5 embeddings for a prompt, from the cache when possible.
+
+        Records the cache tier and encode time in self.last_metrics.
+        """
+        start = time.time()
+        key = PromptEmbeddingCache.key(prompt, self._encoder_identity())
+        embeddings, tier = self.prompt_cache.get(key)
+
+        if embeddings is None:
+            with torch.inference_mode():
+                prompt_embeds, pooled_prompt_embeds, _ = self.pipeline.encode_prompt(
+                    prompt=prompt,
+                    prompt_2=None,
+                    device=self.pipeline._execution_device,
+                    num_images_per_prompt=1,
+                    max_sequence_length=self.max_sequence_length
+                )
+            embeddings = {'prompt_embeds': prompt_embeds, 'pooled_prompt_embeds': pooled_prompt_embeds}
+            self.prompt_cache.put(key, embeddings)
+
+        # Accumulated, since a sweep encodes once per LoRA weight
+        metrics = self.last_metrics
+        metrics['prompt_cache'] = tier
+        metrics['prompt_cache_hits'] = metrics.get('prompt_cache_hits', 0) + int(tier != 'miss')
+        metrics['prompt_cache_misses'] = metrics.get('prompt_cache_misses', 0) + int(tier == 'miss')
+        metrics['prompt_encode_time'] = metrics.get('prompt_encode_time', 0.0) + time.time() - start
+        return embeddings
+
+    def _denoise(
+        self,
+        embeddings: Dict[str, torch.Tensor],
+        num_images: int,
+        generator,
+        steps: int,
+        guidance: float,
+        width: int,
+        height: int,
+        on_step: Optional[Callable[[int, int], None]] = None,
+        on_preview: Optional[Callable[[int, bytes], None]] = None,
+        preview_interval: int = 0,
+        on_image: Optional[Callable[[int, Image.Image], None]] = None,
+        init_image: Optional[Image.Image] = None,
+        strength: float = 0.6
+    ) -> List[Image.Image]:
+        """
+        Run the pipeline on precomputed embeddings.
+
+        on_step is called with (step, total_steps) after every denoising
+        step; raising GenerationCancelled from it stops the run there.
+        on_preview gets (step, JPEG bytes) every preview_interval steps,
+        decoded approximately from the latents (no VAE pass). on_image gets
+        (index, image) as each image of the batch is decoded. With an
+        init_image, runs img2img from it (resized to width x height),
+        re-noised to strength, so only that share of the steps is run.
+        """
+        pipeline = self.pipeline
+        img2img_args = {}
+        if init_image is not None:
+            pipeline = self._img2img()
+            img2img_args = {
+                'image': init_image.convert('RGB').resize((width, height), Image.LANCZOS),
+                'strength': strength
+            }
+
+        callback = None
+        if on_step or (on_preview and preview_interval):
+            def callback(pipe, step, timestep, callback_kwargs):
+                step += 1
+                # img2img skips the first steps
+                total_steps = getattr(pipe, 'num_timesteps', None) or steps
+                if on_preview and preview_interval and step % preview_interval == 0 and step < total_steps:
+                    preview_start = time.time()
+                    jpeg = preview_jpeg(callback_kwargs['latents'], height, width)
+                    self.last_metrics['preview_time'] = self.last_metrics.get('preview_time', 0.0) + time.time() - preview_start
+                    on_preview(step, jpeg)
+                if on_step:
+                    on_step(step, total_steps)
+                return callback_kwargs
+
+        # The pipeline does not repeat precomputed embeddings, so expand
+        # them to the batch here (latents and seeding are unchanged)
+        device = self.pipeline._execution_device
+        prompt_embeds = embeddings['prompt_embeds'].to(device).repeat_interleave(num_images, dim=0)
+        pooled_prompt_embeds = embeddings['pooled_prompt_embeds'].to(device).repeat_interleave(num_images, dim=0)
+
+        with torch.inference_mode():
+            latents = pipeline(
+                **img2img_args,
+                prompt_embeds=prompt_embeds,
+                pooled_prompt_embeds=pooled_prompt_embeds,
+                num_inference_steps=steps,
+                guidance_scale=guidance,
+                width=width,
+                height=height,
+                num_images_per_prompt=1,
+                generator=generator,
+                callback_on_step_end=callback,
+                output_type='latent'
+            ).images
+            return self._decode(latents, width, height, on_image)
+
+    def _img2img(self):
+        """Img2img pipeline over the loaded modules (and LoRA), created on first use."""
+        if self.img2img_pipeline is None:
+            self.img2img_pipeline = FluxImg2ImgPipeline(**self.pipeline.components)
+        return self.img2img_pipeline
+
+    def _decode(
+        self,
+        latents: torch.Tensor,
+        width: int,
+        height: int,
+        on_image: Optional[Callable[[int, Image.Image], None]] = None
+    ) -> List[Image.Image]:
+        """
+        VAE-decode packed latents one image at a time (as the pipeline
+        would, batched), so each image can be encoded and uploaded while the
+        rest of the batch is still decoding.
+        """
+        vae = self.pipeline.vae
+        latents = self.pipeline._unpack_latents(latents, height, width, self.pipeline.vae_scale_factor)
+        latents = latents / vae.config.scaling_factor + vae.config.shift_factor
+
+        images = []
+        for i in range(latents.shape[0]):
+            decoded = vae.decode(latents[i:i + 1].to(vae.dtype), return_dict=False)[0]
+            image = self.pipeline.image_processor.postprocess(decoded, output_type='pil')[0]
+            images.append(image)
+            if on_image:
+                on_image(i, image)
+        return images
+
     def generate(
         self,
         prompt: str,
@@ -100,6 +359,12 @@ class FluxGenerator(BaseGenerator):
         height: Optional[int] = None,
         seed: Optional[int] = None,
         output_dir: Optional[str] = None,
+        on_step: Optional[Callable[[int, int], None]] = None,
+        on_preview: Optional[Callable[[int, bytes], None]] = None,
+        preview_interval: int = 0,
+        on_image: Optional[Callable[[int, Image.Image], None]] = None,
+        init_image: Optional[Image.Image] = None,
+        strength: float = 0.6,
         **kwargs
     ) -> List[str]:
         """
@@ -115,10 +380,19 @@ class FluxGenerator(BaseGenerator):
             height: Image height (default: 1024)
             seed: Random seed for reproducibility
             output_dir: Directory to save images
+            on_step: Called with (step, total_steps) after each denoising step;
+                may raise GenerationCancelled to stop
+            on_preview: Called with (step, JPEG bytes) every preview_interval steps
+            preview_interval: Steps between latent previews (0 disables)
+            on_image: Called with (index, image) as soon as each image is
+                decoded; the images are then not saved to output_dir
+            init_image: Image to refine (e.g. an upscaled draft) with img2img;
+                without FluxImg2ImgPipeline the seed is re-rendered instead
+            strength: How far init_image is re-noised (1.0 ignores it)
             **kwargs: Additional parameters
 
         Returns:
-            List of paths to generated images
+            List of paths to generated images (empty when on_image is given)
         """
         if self.pipeline is None:
             raise ValueError("Model not loaded. Call load_model() first.")
@@ -138,29 +412,31 @@ class FluxGenerator(BaseGenerator):
             generator = torch.Generator(device=self.device).manual_seed(seed)
 
         try:
+            self.last_metrics = {}
+            embeddings = self.encode_prompt(prompt)
+
+            if init_image is not None:
+                self.last_metrics['refine_mode'] = 'img2img'
+
             # Generate images
-            with torch.inference_mode():
-                images = self.pipeline(
-                    prompt=prompt,
-                    num_inference_steps=steps,
-                    guidance_scale=guidance,
-                    width=w,
-                    height=h,
-                    num_images_per_prompt=num_images,
-                    generator=generator
-                ).images
-
-            # Save images
+            images = self._denoise(
+                embeddings, num_images, generator, steps, guidance, w, h,
+                on_step=on_step, on_preview=on_preview, preview_interval=preview_interval,
+                on_image=on_image, init_image=init_image, strength=strength
+            )
+
+            # Save images (unless on_image already took them)
             output_paths = []
-            output_directory = Path(output_dir) if output_dir else Path("/tmp/masuka/generated")
-            output_directory.mkdir(parents=True, exist_ok=True)
+            if not on_image:
+                output_directory = Path(output_dir) if output_dir else Path("/tmp/masuka/generated")
+                output_directory.mkdir(parents=True, exist_ok=True)
 
-            for i, image in enumerate(images):
-                filename = f"image_{i+1}.png"
-                filepath = output_directory / filename
-                image.save(filepath)
-                output_paths.append(str(filepath))
-                logger.info(f"Saved image to {filepath}")
+                for i, image in enumerate(images):
+                    filename = f"image_{i+1}.png"
+                    filepath = output_directory / filename
+                    image.save(filepath)
+                    output_paths.append(str(filepath))
+                    logger.info(f"Saved image to {filepath}")
 
             # Clear CUDA cache after generation to prevent memory leaks
             if torch.cuda.is_available():
@@ -169,6 +445,12 @@ class FluxGenerator(BaseGenerator):
 
             return output_paths
 
+        except GenerationCancelled:
+            logger.info("Generation cancelled")
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            raise
+
         except Exception as e:
             logger.error(f"Generation failed: {e}")
             # Clear CUDA cache even on error
@@ -176,13 +458,151 @@ class FluxGenerator(BaseGenerator):
                 torch.cuda.empty_cache()
             raise
 
+    def generate_sweep(
+        self,
+        prompt: str,
+        seeds: List[int],
+        lora_weights: Optional[List[float]] = None,
+        num_inference_steps: Optional[int] = None,
+        guidance_scale: Optional[float] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        output_dir: Optional[str] = None,
+        batch_size: int = 4,
+        on_image: Optional[Callable[[Optional[float], int, Image.Image, float], None]] = None,
+        on_step: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[tuple, str]:
+        """
+        Generate one image per (LoRA weight, seed) pair.
+
+        The LoRA must be loaded unfused; its scale is switched between rows
+        instead of reloading. The prompt is encoded once (once per weight if
+        the LoRA patches the text encoders) and seeds are denoised in batches,
+        each image with its own generator so it matches a single seeded run.
+
+        Args:
+            prompt: Text prompt
+            seeds: Seeds (grid columns)
+            lora_weights: LoRA weights (grid rows); None for the loaded state
+            output_dir: Directory to save images
+            batch_size: Images per denoising batch
+            on_image: Called with (weight, seed, image, seconds) as each image
+                is decoded; the images are then not saved to output_dir
+            on_step: Called with (step, total_steps) within each batch; may
+                raise GenerationCancelled to stop
+
+        Returns:
+            Dict mapping (weight, seed) to image path (empty when on_image is given)
+        """
+        if self.pipeline is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+
+        steps = num_inference_steps or self.default_steps
+        guidance = guidance_scale or self.default_guidance
+        w = width or self.default_width
+        h = height or self.default_height
+
+        output_directory = Path(output_dir) if output_dir else Path("/tmp/masuka/generated")
+        if not on_image:
+            output_directory.mkdir(parents=True, exist_ok=True)
+
+        logger.info(f"Sweeping {len(lora_weights or [None])} weights x {len(seeds)} seeds: {prompt[:50]}...")
+        self.last_metrics = {}
+        results = {}
+
+        try:
+            for weight in lora_weights or [None]:
+                if weight is not None:
+                    self.set_lora_weight(weight)
+                embeddings = self.encode_prompt(prompt)
+
+                for start in range(0, len(seeds), batch_size):
+                    batch = seeds[start:start + batch_size]
+                    generators = [torch.Generator(device=self.device).manual_seed(seed) for seed in batch]
+
+                    batch_start = time.time()
+
+                    def hand_over(index: int, image: Image.Image):
+                        seed = batch[index]
+                        if on_image:
+                            # Denoising is shared by the batch, so report an even share
+                            on_image(weight, seed, image, (time.time() - batch_start) / len(batch))
+                            return
+                        filepath = output_directory / f"w{weight}_s{seed}.png"
+                        image.save(filepath)
+                        results[(weight, seed)] = str(filepath)
+
+                    self._denoise(embeddings, len(batch), generators, steps, guidance, w, h, on_step, on_image=hand_over)
+
+            return results
+
+        finally:
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def generate_batch(
+        self,
+        prompts: List[str],
+        seeds: List[int],
+        num_inference_steps: Optional[int] = None,
+        guidance_scale: Optional[float] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        on_image: Optional[Callable[[int, Image.Image], None]] = None,
+        on_step: Optional[Callable[[int, int], None]] = None
+    ) -> List[Image.Image]:
+        """
+        Denoise one image per (prompt, seed) pair in a single pipeline call.
+
+        Prompts may differ: each distinct prompt is encoded once (through the
+        prompt cache) and the embeddings are stacked, so a batch fills the GPU
+        even when every image has its own prompt. Each image gets its own
+        generator, so it matches a single seeded run.
+
+        Args:
+            prompts: Prompt of each image
+            seeds: Seed of each image
+            on_image: Called with (index, image) as each image is decoded
+            on_step: Called with (step, total_steps); may raise GenerationCancelled
+
+        Returns:
+            Images, in input order
+        """
+        if self.pipeline is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+
+        steps = num_inference_steps or self.default_steps
+        guidance = guidance_scale or self.default_guidance
+        w = width or self.default_width
+        h = height or self.default_height
+
+        self.last_metrics = {}
+        try:
+            encoded = {prompt: self.encode_prompt(prompt) for prompt in dict.fromkeys(prompts)}
+            embeddings = {
+                name: torch.cat([encoded[prompt][name] for prompt in prompts])
+                for name in ('prompt_embeds', 'pooled_prompt_embeds')
+            }
+            generators = [torch.Generator(device=self.device).manual_seed(seed) for seed in seeds]
+            return self._denoise(embeddings, 1, generators, steps, guidance, w, h, on_step, on_image=on_image)
+
+        finally:
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
     def unload_model(self):
         """Unload model to free memory."""
         if self.pipeline is not None:
             logger.info("Unloading Flux model")
             del self.pipeline
             self.pipeline = None
+            self.img2img_pipeline = None
             self.lora_loaded = False
+            self.lora_fused = False
+            self.lora_path = None
+            self.lora_identity = None
+            self.base_weights = {}
+            self.prompt_cache.clear()
 
             # Clear CUDA cache
             if torch.cuda.is_available():
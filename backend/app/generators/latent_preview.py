@@ -0,0 +1,70 @@
+import io
+import torch
+from PIL import Image
+
+# Linear map from Flux's 16 latent channels to RGB (as used for ComfyUI's
+# Flux previews); a rough but free stand-in for the VAE decoder
+FLUX_LATENT_RGB_FACTORS = [
+    [-0.0346, 0.0244, 0.0681],
+    [0.0034, 0.0210, 0.0687],
+    [0.0275, -0.0668, -0.0433],
+    [-0.0174, 0.0160, 0.0617],
+    [0.0859, 0.0721, 0.0329],
+    [0.0004, 0.0383, 0.0115],
+    [0.0405, 0.0861, 0.0915],
+    [-0.0236, -0.0185, -0.0259],
+    [-0.0245, 0.0250, 0.1180],
+    [0.1008, 0.0755, -0.0421],
+    [-0.0515, 0.0201, 0.0011],
+    [0.0428, -0.0012, -0.0036],
+    [0.0817, 0.0765, 0.0749],
+    [-0.1264, -0.0522, -0.1103],
+    [-0.0280, -0.0881, -0.0499],
+    [-0.1262, -0.0982, -0.0778],
+]
+FLUX_LATENT_RGB_BIAS = [-0.0329, -0.0718, -0.0851]
+
+def latents_to_rgb(latents: torch.Tensor, height: int, width: int) -> torch.Tensor:
+    """
+    Approximate RGB from packed Flux latents, at 1/8 of the image size.
+
+    Args:
+        latents: Packed latents from the pipeline, (batch, (h/16)*(w/16), 64)
+        height: Image height in pixels
+        width: Image width in pixels
+
+    Returns:
+        uint8 tensor (batch, height/8, width/8, 3), on the latents' device
+    """
+    batch, _, packed = latents.shape
+    rows, cols = height // 16, width // 16
+    channels = packed // 4
+
+    # Undo the 2x2 patch packing: (b, rows, cols, c, 2, 2) -> (b, rows*2, cols*2, c)
+    latents = latents.view(batch, rows, cols, channels, 2, 2)
+    latents = latents.permute(0, 1, 4, 2, 5, 3).reshape(batch, rows * 2, cols * 2, channels)
+
+    factors = torch.tensor(FLUX_LATENT_RGB_FACTORS, dtype=latents.dtype, device=latents.device)
+    bias = torch.tensor(FLUX_LATENT_RGB_BIAS, dtype=latents.dtype, device=latents.device)
+    rgb = latents @ factors + bias
+    return ((rgb + 1) / 2).clamp(0, 1).mul(255).to(torch.uint8)
+
+def preview_jpeg(latents: torch.Tensor, height: int, width: int, max_side: int = 256, quality: int = 70) -> bytes:
+    """Small JPEG of a batch's latents, images side by side."""
+    with torch.no_grad():
+        rgb = latents_to_rgb(latents.float(), height, width).cpu().numpy()
+
+    tiles = [Image.fromarray(image) for image in rgb]
+    tile_width, tile_height = tiles[0].size
+    strip = Image.new('RGB', (tile_width * len(tiles), tile_height))
+    for i, tile in enumerate(tiles):
+        strip.paste(tile, (i * tile_width, 0))
+
+    # Each tile's long side becomes max_side
+    scale = max_side / max(tile_width, tile_height)
+    if scale != 1:
+        strip = strip.resize((int(strip.width * scale), int(strip.height * scale)), Image.BILINEAR)
+
+    buffer = io.BytesIO()
+    strip.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
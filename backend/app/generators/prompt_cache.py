@@ -0,0 +1,90 @@
+import torch
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+class PromptEmbeddingCache:
+    """
+    LRU cache of text-encoder outputs, in memory with an optional disk tier.
+
+    Tensors are kept on the CPU; moving a few MB to the GPU is far cheaper
+    than running T5-XXL again.
+    """
+
+    def __init__(self, max_entries: int = 64, disk_dir: Optional[str] = None, max_disk_entries: int = 1024):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self.entries: "OrderedDict[str, Dict[str, torch.Tensor]]" = OrderedDict()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    @staticmethod
+    def key(prompt: str, encoder_identity: str) -> str:
+        return hashlib.sha256(f"{encoder_identity}\0{prompt}".encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.pt"
+
+    def get(self, key: str) -> Tuple[Optional[Dict[str, torch.Tensor]], str]:
+        """
+        Look up embeddings.
+
+        Returns:
+            (embeddings or None, tier: 'memory', 'disk' or 'miss')
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.counters['memory_hits'] += 1
+            return self.entries[key], 'memory'
+
+        if self.disk_dir and self._disk_path(key).exists():
+            try:
+                value = torch.load(self._disk_path(key), map_location='cpu', weights_only=True)
+                self._disk_path(key).touch()  # Recency for disk pruning
+                self._remember(key, value)
+                self.counters['disk_hits'] += 1
+                return value, 'disk'
+            except Exception as e:
+                logger.warning(f"Discarding unreadable prompt cache entry {key}: {e}")
+                self._disk_path(key).unlink(missing_ok=True)
+
+        self.counters['misses'] += 1
+        return None, 'miss'
+
+    def put(self, key: str, value: Dict[str, torch.Tensor]):
+        value = {name: tensor.detach().to('cpu') for name, tensor in value.items()}
+        self._remember(key, value)
+
+        if self.disk_dir:
+            # Write then rename so concurrent readers never see a partial file
+            path = self._disk_path(key)
+            temp = path.with_suffix(f".{os.getpid()}.tmp")
+            torch.save(value, temp)
+            os.replace(temp, path)
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Remove the least recently used files beyond max_disk_entries."""
+        files = list(self.disk_dir.glob('*.pt'))
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda f: f.stat().st_mtime)
+        for stale in files[:len(files) - self.max_disk_entries]:
+            stale.unlink(missing_ok=True)
+
+    def _remember(self, key: str, value: Dict[str, torch.Tensor]):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop the memory tier (e.g. after the text encoders changed)."""
+        self.entries.clear()
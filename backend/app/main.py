@@ -8,6 +8,7 @@ from app.models.training import TrainingSession
 from app.models.model import Model
 from app.models.asset import GeneratedAsset
 from app.models.dataset import Dataset
+from app.models.dataset_version import DatasetVersion
 
 # Create all tables
 Base.metadata.create_all(bind=engine)
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import uuid
+from app.models import Base, UUID
+
+class DatasetVersion(Base):
+    __tablename__ = "dataset_versions"
+    # A second writer of the same number fails instead of overwriting its delta
+    __table_args__ = (UniqueConstraint('dataset_id', 'version'),)
+
+    id = Column(UUID, primary_key=True, default=uuid.uuid4)
+    dataset_id = Column(UUID, ForeignKey("datasets.id"), nullable=False, index=True)
+    version = Column(Integer, nullable=False)  # 1, 2, 3... per dataset
+    parent_id = Column(UUID, ForeignKey("dataset_versions.id"), nullable=True)
+
+    # Immutable delta manifest: only the entries changed since the parent version
+    delta_path = Column(Text, nullable=False)
+    message = Column(String(255), nullable=True)
+
+    # Change summary
+    added_count = Column(Integer, default=0)
+    updated_count = Column(Integer, default=0)
+    removed_count = Column(Integer, default=0)
+    image_count = Column(Integer, default=0)
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    dataset = relationship("Dataset", backref="versions")
+
+    def __repr__(self):
+        return f"<DatasetVersion {self.dataset_id} v{self.version}>"
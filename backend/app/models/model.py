@@ -28,5 +28,11 @@ class Model(Base):
     # Relationships
     training_session = relationship("TrainingSession", backref="models")
 
+    @property
+    def generation_path(self) -> str:
+        """Storage path generation loads: the compact variant when one was made."""
+        compact = (self.model_metadata or {}).get('compact') or {}
+        return compact.get('storage_path') or self.storage_path
+
     def __repr__(self):
         return f"<Model {self.name} v{self.version}>"
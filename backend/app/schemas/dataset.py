@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 class DatasetCreate(BaseModel):
@@ -7,6 +7,17 @@ class DatasetCreate(BaseModel):
     trigger_word: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = {}
 
+class CaptionRequest(BaseModel):
+    trigger_word: Optional[str] = None  # Defaults to the dataset's trigger word
+    overwrite: bool = False  # Re-caption images that already have a caption
+
+class VideoExtractRequest(BaseModel):
+    mode: Optional[str] = Field(None, pattern="^(frames|segments)$")
+    fps: Optional[float] = Field(None, gt=0, le=60)
+    max_side: Optional[int] = Field(None, ge=64, le=4096)
+    segment_seconds: Optional[float] = Field(None, gt=0, le=60)
+    filenames: Optional[List[str]] = None  # Default: all videos
+
 class DatasetResponse(BaseModel):
     id: str
     name: str
@@ -20,3 +31,18 @@ class DatasetResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class DatasetVersionResponse(BaseModel):
+    id: str
+    dataset_id: str
+    version: int
+    parent_id: Optional[str]
+    message: Optional[str]
+    added_count: int
+    updated_count: int
+    removed_count: int
+    image_count: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
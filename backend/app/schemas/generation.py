@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Annotated
 from datetime import datetime
 
 class GenerationRequest(BaseModel):
@@ -16,20 +16,105 @@ class GenerationRequest(BaseModel):
     height: int = Field(default=1024, ge=512, le=2048)
     seed: Optional[int] = None
 
+    # Live previews on the progress stream every N steps (None disables)
+    preview_interval: Optional[int] = Field(default=None, ge=1, le=50)
+
+    # Render a fast low-resolution, low-step draft (with a fixed seed) that
+    # can be refined at the requested size and steps via /{job_id}/refine
+    draft: bool = False
+
+    # Additional config
+    config: Optional[Dict[str, Any]] = {}
+
+class GenerationRefineRequest(BaseModel):
+    image_index: int = Field(default=0, ge=0, le=3)  # Which image of the draft
+    # Share of the steps re-run on the upscaled draft (img2img); higher adds more detail but drifts further
+    strength: float = Field(default=0.6, gt=0.0, le=1.0)
+
+    # Default to the size and steps the draft was requested with
+    num_inference_steps: Optional[int] = Field(default=None, ge=10, le=100)
+    width: Optional[int] = Field(default=None, ge=512, le=2048)
+    height: Optional[int] = Field(default=None, ge=512, le=2048)
+    preview_interval: Optional[int] = Field(default=None, ge=1, le=50)
+
+class GenerationSweepRequest(BaseModel):
+    prompt: str = Field(..., min_length=1, max_length=500, description="Text prompt for generation (max 500 chars)")
+    negative_prompt: Optional[str] = Field(None, max_length=500, description="Negative prompt (max 500 chars)")
+    model_id: Optional[str] = None  # LoRA model ID (required to sweep weights)
+
+    # Grid: one image per (LoRA weight, seed)
+    seeds: List[int] = Field(..., min_length=1, max_length=16)
+    lora_weights: Optional[List[Annotated[float, Field(ge=0.0, le=1.0)]]] = Field(None, min_length=1, max_length=8)
+    lora_weight: float = Field(default=0.8, ge=0.0, le=1.0)  # Used when lora_weights is not given
+
+    # Generation parameters
+    num_inference_steps: int = Field(default=30, ge=10, le=100)
+    guidance_scale: float = Field(default=3.5, ge=1.0, le=20.0)
+    width: int = Field(default=1024, ge=512, le=2048)
+    height: int = Field(default=1024, ge=512, le=2048)
+
     # Additional config
     config: Optional[Dict[str, Any]] = {}
 
+class BulkGenerationSpec(BaseModel):
+    """One line of a bulk generation file (JSONL object or CSV row)."""
+    prompt: str = Field(..., min_length=1, max_length=500)
+    negative_prompt: Optional[str] = Field(None, max_length=500)
+    model_id: Optional[str] = None
+    lora_weight: float = Field(default=0.8, ge=0.0, le=1.0)
+    num_inference_steps: int = Field(default=30, ge=10, le=100)
+    guidance_scale: float = Field(default=3.5, ge=1.0, le=20.0)
+    width: int = Field(default=1024, ge=512, le=2048)
+    height: int = Field(default=1024, ge=512, le=2048)
+    seed: Optional[int] = None  # Picked (and recorded) if missing
+    count: int = Field(default=1, ge=1, le=16)  # Images, one job each, with seeds seed, seed+1, ...
+
+class BulkGenerationResponse(BaseModel):
+    bulk_id: str
+    status: str
+    task_id: Optional[str] = None
+    job_ids: List[str]  # One per image, in file order
+    plan: Dict[str, Any]  # images, groups, batches, lora_loads
+    cached: int  # Served from the generation cache
+
+class BulkGenerationStatus(BaseModel):
+    bulk_id: str
+    status: str  # 'queued', 'running', 'pausing', 'paused', 'completed'
+    total: int
+    completed: int
+    failed: int
+    plan: Dict[str, Any]
+    active_seconds: float  # Time spent generating (excludes queueing and pauses)
+    images_per_minute: Optional[float] = None
+
+class GenerationSweepResponse(BaseModel):
+    sweep_id: str
+    status: str
+    task_id: Optional[str] = None
+    task_ids: Optional[List[str]] = None  # All tasks, when the sweep was split to fit the time limit
+    seeds: List[int]
+    lora_weights: List[Optional[float]]
+    grid: List[List[str]]  # Job IDs: one row per LoRA weight, one column per seed
+    eta_seconds: Optional[float] = None  # Until the whole grid should be ready
+
 class GenerationResponse(BaseModel):
     job_id: str
     status: str
     task_id: Optional[str] = None
 
+    # Admission estimates (None when served from the cache)
+    predicted_seconds: Optional[float] = None  # Runtime once started
+    queue_position: Optional[int] = None  # Jobs ahead of it on its worker
+    eta_seconds: Optional[float] = None  # Until its (last) images should be ready
+    job_ids: Optional[List[str]] = None  # All jobs, when the request was split to fit the time limit
+
 class GenerationJobResponse(BaseModel):
     id: str
     status: str
     prompt: str
     parameters: Dict[str, Any]
     output_paths: Optional[List[str]] = None
+    variant: str = 'original'  # Which image variant output_paths point at
     error_message: Optional[str] = None
     created_at: datetime
     completed_at: Optional[datetime] = None
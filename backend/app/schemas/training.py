@@ -1,11 +1,12 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 class TrainingRequest(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
     model_type: str = Field(..., pattern="^(flux_image|hunyuan_video|wan_video)$")
     dataset_id: str
+    dataset_version: Optional[int] = None  # Defaults to the latest version
 
     # Training parameters
     learning_rate: Optional[float] = 1e-4
@@ -15,6 +16,9 @@ class TrainingRequest(BaseModel):
     resolution: Optional[int] = 1024
     trigger_word: Optional[str] = None
 
+    # Pick batch size, accumulation, workers, steps and save cadence from the dataset
+    auto_tune: bool = False
+
     # Additional config
     config: Optional[Dict[str, Any]] = {}
 
@@ -23,6 +27,21 @@ class TrainingResponse(BaseModel):
     status: str
     task_id: Optional[str] = None
 
+class TrainingPlanResponse(BaseModel):
+    image_count: int
+    resolution: int
+    aspect_buckets: Dict[str, int]
+    batch_size: int
+    gradient_accumulation_steps: int
+    effective_batch_size: int
+    num_workers: int
+    steps: int
+    save_every_n_steps: int
+    vram_budget_gb: float
+    estimated_vram_gb: float
+    estimated_seconds: Dict[str, int]
+    notes: List[str] = []
+
 class TrainingStatusResponse(BaseModel):
     session_id: str
     name: str
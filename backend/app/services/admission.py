@@ -0,0 +1,208 @@
+from typing import Optional, Dict, Any, List
+import json
+import logging
+import redis
+from app.config import settings
+from app.services.generation_scheduler import generation_scheduler
+from app.services.worker_registry import worker_registry
+from app.utils.cost_model import (
+    ROUTE_TIERS, prior_model, fit_cost_model, predict_seconds, max_images_within, queue_seconds
+)
+from app.utils.scheduling import route_job
+
+logger = logging.getLogger(__name__)
+
+class AdmissionController:
+    """
+    Runtime and wait predictions for generation jobs, from measured jobs.
+
+    Completed jobs record their resolution, steps, images and timings; a cost
+    model fitted on the most recent ones (refitted every few minutes, shared
+    through Redis) predicts how long a new job will run and how long the jobs
+    queued ahead of it on its worker will take. The API uses this to return
+    an ETA, to split or reject jobs that would overrun the task time limit,
+    and to turn requests away while the queue is too long.
+    """
+
+    SAMPLES_KEY = "genadmit:samples"
+    MODEL_KEY = "genadmit:model"
+    STATS_KEY = "genadmit:stats"
+
+    def __init__(self):
+        self.redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    def record(self, parameters: Dict[str, Any], timing_metrics: Dict[str, Any]):
+        """
+        Add a finished job to the samples the model is fitted on.
+
+        Args:
+            parameters: The job's asset parameters (size, steps, images, strength)
+            timing_metrics: Its measured timings
+        """
+        steps = parameters.get('num_inference_steps', 30)
+        if timing_metrics.get('refine_mode') == 'img2img':
+            # img2img only runs the last `strength` of the schedule
+            steps *= parameters.get('strength', 1.0)
+
+        lora_seconds = timing_metrics.get('lora_load_time', 0.0)
+        model_load_seconds = timing_metrics.get('model_load_time', 0.0)
+        sample = {
+            'width': parameters.get('width', 1024),
+            'height': parameters.get('height', 1024),
+            'steps': steps,
+            'images': parameters.get('num_images', 1),
+            # GPU time of the job: the upload tail overlaps the next job
+            'seconds': timing_metrics['total_time'] - timing_metrics.get('upload_time', 0.0) - lora_seconds - model_load_seconds,
+            'lora_tier': timing_metrics.get('lora_tier'),
+            'lora_seconds': lora_seconds,
+            'model_load_seconds': model_load_seconds,
+        }
+
+        pipe = self.redis_client.pipeline()
+        pipe.lpush(self.SAMPLES_KEY, json.dumps(sample))
+        pipe.ltrim(self.SAMPLES_KEY, 0, settings.GENERATION_COST_MODEL_SAMPLES - 1)
+        pipe.execute()
+
+    def model(self) -> Dict[str, Any]:
+        """The current cost model, refitted once it is GENERATION_COST_MODEL_REFIT_SECONDS old."""
+        cached = self.redis_client.get(self.MODEL_KEY)
+        if cached:
+            return json.loads(cached)
+
+        samples = [json.loads(s) for s in self.redis_client.lrange(self.SAMPLES_KEY, 0, -1)]
+        prior = prior_model(settings.GENERATION_SECONDS_PER_STEP_MEGAPIXEL, settings.GENERATION_MODEL_LOAD_SECONDS)
+        model = fit_cost_model(samples, prior)
+        self.redis_client.set(self.MODEL_KEY, json.dumps(model), ex=settings.GENERATION_COST_MODEL_REFIT_SECONDS)
+
+        logger.info(
+            f"Fitted generation cost model on {model['samples']} jobs: "
+            f"coefficients {[round(c, 4) for c in model['coefficients']]}, error {model['mean_abs_error']}"
+        )
+        return model
+
+    def predict(self, config: Dict[str, Any], lora_tier: Optional[str] = None, model: Optional[Dict[str, Any]] = None) -> float:
+        """Predicted runtime of a job (generation config) once it starts."""
+        return predict_seconds(
+            model or self.model(),
+            config.get('width', 1024),
+            config.get('height', 1024),
+            config.get('num_inference_steps', 30),
+            config.get('num_images', 1),
+            lora_tier
+        )
+
+    def predict_parts(
+        self,
+        configs: List[Dict[str, Any]],
+        lora_tier: Optional[str],
+        lora_key: Optional[str],
+        jobs_per_process: int,
+        seconds_per_process: float = float('inf')
+    ) -> float:
+        """
+        Predicted runtime of the parts of a split job or sweep, run in order.
+
+        Workers restart after every task (worker_max_tasks_per_child=1), so
+        only parts run by the same task find the model and LoRA loaded; a
+        part that starts a new process pays the model load and reads the
+        LoRA from the worker's disk again.
+
+        Args:
+            configs: Generation config of each part
+            lora_tier: LoRA tier of the first part (from estimate())
+            lora_key: LoRA storage path, None for base model jobs
+            jobs_per_process: Parts one task runs (1 for sweep tasks)
+            seconds_per_process: Time after which a task takes no more parts
+        """
+        model = self.model()
+        total = 0.0
+        process_jobs, process_seconds = 0, 0.0
+        for index, config in enumerate(configs):
+            if index == 0:
+                seconds = self.predict(config, lora_tier, model)
+            elif process_jobs < jobs_per_process and process_seconds < seconds_per_process:
+                seconds = self.predict(config, 'resident' if lora_key else None, model)
+            else:
+                seconds = self.predict(config, 'disk' if lora_key else None, model) + model['model_load_seconds']
+                process_jobs, process_seconds = 0, 0.0
+            process_jobs += 1
+            process_seconds += seconds
+            total += seconds
+        return total
+
+    def max_images(self, config: Dict[str, Any], lora_tier: Optional[str], limit: float) -> int:
+        """Most images of this config one job can render within limit seconds."""
+        return max_images_within(
+            self.model(),
+            config.get('width', 1024),
+            config.get('height', 1024),
+            config.get('num_inference_steps', 30),
+            lora_tier,
+            limit
+        )
+
+    def estimate(self, config: Dict[str, Any], lora_key: Optional[str]) -> Dict[str, Any]:
+        """
+        Predict when a job submitted now would start and how long it would run.
+
+        The job is routed the way the API will route it (without counting the
+        decision); the wait is the predicted runtime of the jobs already in
+        that worker's lane, plus a model load if the worker is idle. The time
+        left on a running job is not known and not counted.
+
+        Args:
+            config: Generation config of the job
+            lora_key: LoRA storage path, None for base model jobs
+
+        Returns:
+            {predicted_seconds, wait_seconds, queue_position (jobs ahead,
+            including a running one), lora_tier, worker (id or None)}
+        """
+        model = self.model()
+        workers = worker_registry.workers()
+        if workers:
+            worker, reason = route_job(workers, lora_key, settings.GENERATION_ROUTING_MAX_IMBALANCE)
+            lane = worker['id']
+            loaded_lora = worker['loaded_lora']
+            cached_loras = set(worker['cached_loras'])
+            tier = ROUTE_TIERS[reason]
+        else:
+            # Shared lane; assume a single worker will pick it up
+            worker, lane, loaded_lora, cached_loras = None, None, None, set()
+            tier = 'download' if lora_key else None
+
+        pending = generation_scheduler.pending_jobs(lane)
+        pending_count = generation_scheduler.pending_count(lane)
+        wait = queue_seconds(model, pending, loaded_lora, cached_loras)
+        if pending and pending_count > len(pending):
+            # Only the head of the queue is loaded; assume the rest look alike
+            wait *= pending_count / len(pending)
+
+        active = bool(worker) and worker['load'] > pending_count
+        if not active:
+            wait += model['model_load_seconds']
+
+        return {
+            'predicted_seconds': self.predict(config, tier, model),
+            'wait_seconds': wait,
+            'queue_position': pending_count + (1 if active else 0),
+            'lora_tier': tier,
+            'worker': worker['id'] if worker else None,
+        }
+
+    def count(self, outcome: str, amount: int = 1):
+        """Count an admission outcome ('admitted', 'split', 'rejected', 'shed')."""
+        self.redis_client.hincrby(self.STATS_KEY, outcome, amount)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {k: int(v) for k, v in self.redis_client.hgetall(self.STATS_KEY).items()}
+        model = self.model()
+        return {
+            **{outcome: counts.get(outcome, 0) for outcome in ('admitted', 'split', 'rejected', 'shed')},
+            'model': model,
+            'max_job_seconds': settings.generation_max_job_seconds,
+            'max_queue_seconds': settings.GENERATION_MAX_QUEUE_SECONDS,
+        }
+
+# Global instance
+admission_controller = AdmissionController()
@@ -0,0 +1,143 @@
+from typing import Optional, Dict, Any, List
+import json
+import logging
+import threading
+import time
+import uuid
+import redis
+from app.config import settings
+from app.utils.bulk_planning import plan_summary
+
+logger = logging.getLogger(__name__)
+
+class BulkGenerationStore:
+    """
+    Bulk generation runs: their plan and progress, in Redis.
+
+    The plan (groups of batches, see plan_bulk) is fixed at submission.
+    Each image is its own generation job; the worker skips jobs that are
+    already completed, so a paused or time-sliced run resumes from the plan.
+    Status moves queued -> running -> completed, or to pausing -> paused
+    (checked between batches) and back to queued on resume; a run that
+    errors out is 'failed' and can be resumed too.
+    """
+
+    # Renew or drop the run lock only while this task's token still holds it
+    RENEW_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('expire', KEYS[1], ARGV[2]) end return 0"
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self):
+        self.redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.claims: Dict[str, Any] = {}  # bulk_id -> (token, heartbeat stop event) of runs held here
+
+    def _key(self, bulk_id: str) -> str:
+        return f"genbulk:{bulk_id}"
+
+    def _plan_key(self, bulk_id: str) -> str:
+        return f"genbulk:{bulk_id}:plan"
+
+    def create(self, bulk_id: str, plan: List[Dict[str, Any]], cached: int = 0):
+        """Record a new run; cached counts jobs already served from the generation cache."""
+        summary = plan_summary(plan)
+        pipe = self.redis_client.pipeline()
+        pipe.set(self._plan_key(bulk_id), json.dumps(plan))
+        pipe.hset(self._key(bulk_id), mapping={
+            'status': 'queued' if plan else 'completed',
+            'total': summary['images'] + cached,
+            'completed': cached,
+            'cached': cached,
+            'failed': 0,
+            'active_seconds': 0.0,
+            'summary': json.dumps(summary),
+            'created_at': time.time(),
+        })
+        pipe.execute()
+
+    def plan(self, bulk_id: str) -> List[Dict[str, Any]]:
+        data = self.redis_client.get(self._plan_key(bulk_id))
+        return json.loads(data) if data else []
+
+    def get(self, bulk_id: str) -> Optional[Dict[str, Any]]:
+        """Status, counts and throughput of a run, or None if unknown."""
+        state = self.redis_client.hgetall(self._key(bulk_id))
+        if not state:
+            return None
+
+        completed = int(state['completed'])
+        active_seconds = float(state['active_seconds'])
+        generated = completed - int(state.get('cached', 0))
+        return {
+            'bulk_id': bulk_id,
+            'status': state['status'],
+            'total': int(state['total']),
+            'completed': completed,
+            'failed': int(state['failed']),
+            'plan': json.loads(state['summary']),
+            'active_seconds': round(active_seconds, 2),
+            'images_per_minute': round(generated / active_seconds * 60, 2) if active_seconds > 0 else None,
+        }
+
+    def status(self, bulk_id: str) -> Optional[str]:
+        return self.redis_client.hget(self._key(bulk_id), 'status')
+
+    def set_status(self, bulk_id: str, status: str):
+        self.redis_client.hset(self._key(bulk_id), 'status', status)
+
+    def record(self, bulk_id: str, completed: int = 0, failed: int = 0, cached: int = 0):
+        """Count finished jobs (cached ones are left out of images/minute)."""
+        pipe = self.redis_client.pipeline()
+        pipe.hincrby(self._key(bulk_id), 'completed', completed + cached)
+        pipe.hincrby(self._key(bulk_id), 'cached', cached)
+        pipe.hincrby(self._key(bulk_id), 'failed', failed)
+        pipe.execute()
+
+    def add_active_time(self, bulk_id: str, seconds: float):
+        self.redis_client.hincrbyfloat(self._key(bulk_id), 'active_seconds', seconds)
+
+    def claim(self, bulk_id: str) -> bool:
+        """
+        Take the run for one worker task; False if another task holds it.
+
+        The lock lives for GENERATION_WORKER_TTL_SECONDS and a daemon thread
+        renews it while the task runs (until release), so a worker that
+        crashes or is killed only blocks the run for one TTL.
+        """
+        key = f"{self._key(bulk_id)}:lock"
+        ttl = settings.GENERATION_WORKER_TTL_SECONDS
+        token = uuid.uuid4().hex
+        if not self.redis_client.set(key, token, nx=True, ex=ttl):
+            return False
+
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(ttl / 3):
+                try:
+                    if not self.redis_client.eval(self.RENEW_SCRIPT, 1, key, token, ttl):
+                        logger.warning(f"Bulk generation {bulk_id}: lost the run lock")
+                        return
+                except Exception as e:
+                    logger.warning(f"Bulk generation {bulk_id}: lock renewal failed: {e}")
+
+        threading.Thread(target=beat, name='bulk-generation-lock', daemon=True).start()
+        self.claims[bulk_id] = (token, stop)
+        return True
+
+    def release(self, bulk_id: str):
+        """Stop renewing a run claimed by this process and drop its lock."""
+        token, stop = self.claims.pop(bulk_id, (None, None))
+        if token is None:
+            return
+        stop.set()
+        self.redis_client.eval(self.RELEASE_SCRIPT, 1, f"{self._key(bulk_id)}:lock", token)
+
+    def finish(self, bulk_id: str, expire_seconds: int = 7 * 86400):
+        """Mark a run completed; its record is kept for a week."""
+        pipe = self.redis_client.pipeline()
+        pipe.hset(self._key(bulk_id), 'status', 'completed')
+        pipe.expire(self._key(bulk_id), expire_seconds)
+        pipe.expire(self._plan_key(bulk_id), expire_seconds)
+        pipe.execute()
+
+# Global instance
+bulk_generation = BulkGenerationStore()
@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Callable
+import io
+import logging
+import re
+import redis
+from PIL import Image, ImageOps
+from app.config import settings
+from app.captioners import BaseCaptioner
+from app.services.storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+class CaptionService:
+    """Caption images in batches, caching results by image content hash."""
+
+    def __init__(self):
+        self.redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    def _cache_key(self, captioner_id: str, image_id: str) -> str:
+        return f"caption:{captioner_id}:{image_id}"
+
+    def cached(self, captioner_id: str, image_ids: List[str]) -> Dict[str, str]:
+        """Captions already produced by this captioner, keyed by image id."""
+        if not image_ids:
+            return {}
+        values = self.redis_client.mget([self._cache_key(captioner_id, i) for i in image_ids])
+        return {image_id: value for image_id, value in zip(image_ids, values) if value is not None}
+
+    def store(self, captioner_id: str, captions: Dict[str, str]):
+        pipe = self.redis_client.pipeline()
+        for image_id, caption in captions.items():
+            pipe.set(self._cache_key(captioner_id, image_id), caption)
+        pipe.execute()
+
+    @staticmethod
+    def inject_trigger_word(caption: str, trigger_word: Optional[str]) -> str:
+        """Prefix the trigger word unless the caption already mentions it."""
+        if not trigger_word:
+            return caption
+        if re.search(rf"\b{re.escape(trigger_word)}\b", caption, re.IGNORECASE):
+            return caption
+        return f"{trigger_word}, {caption}"
+
+    def _load_image(self, key: str) -> Image.Image:
+        """Fetch and decode an image at captioning size."""
+        data = storage_service.read_stream(key)
+        if data is None:
+            raise ValueError(f"Could not read {key}")
+
+        side = settings.DATASET_CAPTION_IMAGE_SIDE
+        image = Image.open(io.BytesIO(data))
+        if image.format == 'JPEG' and max(image.size) > side * 2:
+            image.draft('RGB', (side, side))
+        image.load()
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image.thumbnail((side, side), Image.LANCZOS)
+        return image
+
+    def caption(
+        self,
+        captioner: BaseCaptioner,
+        images: Dict[str, str],
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Dict[str, str]]:
+        """
+        Caption images, skipping any the cache already knows.
+
+        The next batch is fetched and decoded while the model runs on the
+        current one, so the captioner is not left waiting on storage.
+
+        Args:
+            captioner: Captioner to use (loaded on demand)
+            images: {image_id: storage_key}; image_id is the content hash
+            progress_callback: Called with (done, total) after each batch
+
+        Returns:
+            Dict with 'captions' ({image_id: caption}) and 'cached' ({image_id: caption})
+        """
+        cached = self.cached(captioner.cache_id, list(images))
+        pending = [(image_id, key) for image_id, key in images.items() if image_id not in cached]
+        captions = {}
+
+        if pending:
+            captioner.load_model()
+            batch_size = captioner.batch_size
+            batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+            with ThreadPoolExecutor(max_workers=min(batch_size, settings.DATASET_SYNC_WORKERS)) as pool:
+                def fetch(batch):
+                    return [pool.submit(self._load_image, key) for _, key in batch]
+
+                next_futures = fetch(batches[0])
+                for i, batch in enumerate(batches):
+                    futures = next_futures
+                    next_futures = fetch(batches[i + 1]) if i + 1 < len(batches) else None
+
+                    results = captioner.caption_batch([f.result() for f in futures])
+                    batch_captions = {image_id: caption for (image_id, _), caption in zip(batch, results)}
+                    self.store(captioner.cache_id, batch_captions)
+                    captions.update(batch_captions)
+
+                    if progress_callback:
+                        progress_callback(len(captions), len(pending))
+
+        logger.info(f"Captioned {len(captions)} images ({len(cached)} cached) with {captioner.cache_id}")
+        return {'captions': captions, 'cached': cached}
+
+# Global instance
+caption_service = CaptionService()
@@ -0,0 +1,117 @@
+from typing import Optional, Dict, Any
+import hashlib
+import json
+import logging
+import uuid
+import redis
+from app.config import settings
+from app.services.storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+class ChunkedUploadService:
+    """
+    Resumable uploads (tus-style) assembled directly into S3 multipart uploads.
+
+    State lives in Redis. Bytes are forwarded as fixed-size parts as soon as
+    a full part has arrived; only the sub-part tail is kept (in Redis) between
+    requests, so the API host never holds more than one part per upload.
+    """
+
+    STAGING_PREFIX = "uploads"
+
+    def __init__(self):
+        self.redis_client = redis.from_url(settings.REDIS_URL)
+        self.part_size = settings.DATASET_UPLOAD_PART_MB * 1024 * 1024
+        self.expiry = settings.DATASET_UPLOAD_EXPIRY_HOURS * 3600
+
+    def _key(self, upload_id: str) -> str:
+        return f"upload:{upload_id}"
+
+    def _tail_key(self, upload_id: str) -> str:
+        return f"upload:{upload_id}:tail"
+
+    def lock(self, upload_id: str):
+        """Lock held while an upload is being appended to or finalized."""
+        return self.redis_client.lock(f"upload:{upload_id}:lock", timeout=3600, blocking_timeout=0)
+
+    def create(self, dataset_id: str, filename: str, content_type: str, length: int) -> Dict[str, Any]:
+        """Start an upload of `length` bytes."""
+        upload_id = uuid.uuid4().hex
+        staging_key = f"{self.STAGING_PREFIX}/{upload_id}"
+        state = {
+            'id': upload_id,
+            'dataset_id': str(dataset_id),
+            'filename': filename,
+            'content_type': content_type,
+            'length': length,
+            'offset': 0,
+            'staging_key': staging_key,
+            's3_upload_id': storage_service.create_multipart_upload(staging_key, content_type),
+            'parts': [],
+            'parts_bytes': 0,
+        }
+        self._save(state)
+        logger.info(f"Created upload {upload_id} for {filename} ({length} bytes)")
+        return state
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        data = self.redis_client.get(self._key(upload_id))
+        return json.loads(data) if data else None
+
+    def _save(self, state: Dict[str, Any]):
+        self.redis_client.set(self._key(state['id']), json.dumps(state), ex=self.expiry)
+
+    def tail(self, state: Dict[str, Any]) -> bytes:
+        """Bytes received after the last full part."""
+        return self.redis_client.get(self._tail_key(state['id'])) or b''
+
+    def upload_part(self, state: Dict[str, Any], data: bytes):
+        """Forward one part to S3 and record it."""
+        part_number = len(state['parts']) + 1
+        etag = storage_service.upload_part(state['staging_key'], state['s3_upload_id'], part_number, data)
+        state['parts'].append({'PartNumber': part_number, 'ETag': etag})
+        state['parts_bytes'] += len(data)
+        self._save(state)
+
+    def save_tail(self, state: Dict[str, Any], tail: bytes):
+        """Persist the sub-part tail and advance the offset to everything received."""
+        self.redis_client.set(self._tail_key(state['id']), tail, ex=self.expiry)
+        state['offset'] = state['parts_bytes'] + len(tail)
+        self._save(state)
+
+    def complete(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Assemble the parts and hash the result.
+
+        Returns:
+            Dict with the staging key, sha256 and size of the uploaded object
+        """
+        if state.get('assembled'):
+            # A previous finalize got this far before failing
+            return state['assembled']
+
+        tail = self.tail(state)
+        if tail or not state['parts']:
+            # The last part may be smaller than the minimum part size
+            self.upload_part(state, tail)
+        storage_service.complete_multipart_upload(state['staging_key'], state['s3_upload_id'], state['parts'])
+
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in storage_service.iter_chunks(state['staging_key']):
+            digest.update(chunk)
+            size += len(chunk)
+
+        state['assembled'] = {'staging_key': state['staging_key'], 'sha256': digest.hexdigest(), 'size': size}
+        self._save(state)
+        return state['assembled']
+
+    def delete(self, state: Dict[str, Any], abort: bool = False):
+        """Drop upload state (and the incomplete multipart upload when aborting)."""
+        if abort and not state.get('assembled'):
+            storage_service.abort_multipart_upload(state['staging_key'], state['s3_upload_id'])
+        self.redis_client.delete(self._key(state['id']), self._tail_key(state['id']))
+
+# Global instance
+chunked_upload_service = ChunkedUploadService()
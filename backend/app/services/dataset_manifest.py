@@ -0,0 +1,151 @@
+import io
+import json
+import logging
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+from app.services.storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+class DatasetManifest:
+    """Per-image records of a dataset, stored as JSONL next to its files."""
+
+    FILENAME = "manifest.jsonl"
+
+    def __init__(self, storage_path: str, entries: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.storage_path = storage_path
+        self.entries: Dict[str, Dict[str, Any]] = entries or {}
+
+    @property
+    def key(self) -> str:
+        """Storage key of the manifest file."""
+        return f"{self.storage_path}/{self.FILENAME}"
+
+    @classmethod
+    def from_jsonl(cls, storage_path: str, data: bytes) -> 'DatasetManifest':
+        entries = {}
+        for line in data.decode('utf-8').splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry.pop('name')] = entry
+        return cls(storage_path, entries)
+
+    def to_jsonl(self) -> bytes:
+        lines = [json.dumps({'name': name, **entry}, sort_keys=True) for name, entry in self.entries.items()]
+        return ("\n".join(lines) + "\n").encode('utf-8') if lines else b""
+
+    @classmethod
+    def load(cls, dataset) -> 'DatasetManifest':
+        """
+        Load a dataset's manifest from storage.
+
+        Datasets created before manifests existed are seeded from dataset_metadata.
+        """
+        data = storage_service.read_stream(f"{dataset.storage_path}/{cls.FILENAME}")
+        if data is not None:
+            return cls.from_jsonl(dataset.storage_path, data)
+
+        legacy_images = (dataset.dataset_metadata or {}).get('images', {})
+        if legacy_images:
+            logger.info(f"Seeding manifest of dataset {dataset.id} from metadata ({len(legacy_images)} images)")
+        return cls(dataset.storage_path, {name: dict(info) for name, info in legacy_images.items()})
+
+    def save(self):
+        """Write the manifest back to storage."""
+        success = storage_service.upload_fileobj(
+            io.BytesIO(self.to_jsonl()),
+            self.key,
+            content_type='application/x-ndjson'
+        )
+        if not success:
+            raise Exception(f"Failed to save manifest {self.key}")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(name)
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        return iter(self.entries.items())
+
+    def images(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Image records only."""
+        return ((name, entry) for name, entry in self.entries.items() if entry.get('media') != 'video')
+
+    def videos(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Video records only."""
+        return ((name, entry) for name, entry in self.entries.items() if entry.get('media') == 'video')
+
+    def add(self, name: str, entry: Dict[str, Any]):
+        """Add or replace an image record."""
+        self.entries[name] = entry
+
+    def update(self, name: str, fields: Dict[str, Any]):
+        """Merge fields into an existing image record."""
+        self.entries[name] = {**self.entries.get(name, {}), **fields}
+
+    def remove(self, name: str) -> Optional[Dict[str, Any]]:
+        """Drop an image record, returning it."""
+        return self.entries.pop(name, None)
+
+    def diff(self, base: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """
+        Entries changed relative to an earlier state.
+
+        Returns:
+            ({name: entry} added or modified, [names] removed)
+        """
+        puts = {name: entry for name, entry in self.entries.items() if base.get(name) != entry}
+        deletes = [name for name in base if name not in self.entries]
+        return puts, deletes
+
+    def apply_delta(self, data: bytes):
+        """Replay a delta written by delta_to_jsonl on top of this manifest."""
+        for line in data.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record['op'] == 'put':
+                self.entries[record['name']] = record['entry']
+            else:
+                self.entries.pop(record['name'], None)
+
+    @staticmethod
+    def delta_to_jsonl(puts: Dict[str, Dict[str, Any]], deletes: List[str]) -> bytes:
+        lines = [json.dumps({'op': 'put', 'name': name, 'entry': entry}, sort_keys=True) for name, entry in puts.items()]
+        lines.extend(json.dumps({'op': 'delete', 'name': name}) for name in deletes)
+        return ("\n".join(lines) + "\n").encode('utf-8') if lines else b""
+
+    def object_keys(self, name: str) -> List[str]:
+        """All storage objects that belong to an image (original and derived copies)."""
+        entry = self.entries.get(name, {})
+        keys = [entry.get('key'), entry.get('processed_key'), entry.get('caption_key')]
+        keys.extend(entry.get('bucket_keys', {}).values())
+        return [key for key in keys if key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Aggregate stats, computed from the records alone."""
+        images = [entry for _, entry in self.images()]
+        buckets: Dict[str, Dict[str, int]] = {}
+        for entry in images:
+            for resolution, bucket in entry.get('buckets', {}).items():
+                counts = buckets.setdefault(resolution, {})
+                counts[bucket] = counts.get(bucket, 0) + 1
+
+        sized = [e for e in images if e.get('width') and e.get('height')]
+
+        return {
+            'image_count': len(images),
+            'video_count': len(self.entries) - len(images),
+            'total_bytes': sum(e.get('size', 0) for e in self.entries.values()),
+            'processed_count': sum(1 for e in images if e.get('processed_key')),
+            'captioned_count': sum(1 for e in images if e.get('has_caption')),
+            'hashed_count': sum(1 for e in images if e.get('phash')),
+            'duplicate_count': sum(1 for e in images if e.get('duplicate_of')),
+            'min_side': min((min(e['width'], e['height']) for e in sized), default=None),
+            'max_side': max((max(e['width'], e['height']) for e in sized), default=None),
+            'buckets': buckets,
+        }
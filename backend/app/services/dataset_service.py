@@ -0,0 +1,410 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path, PurePosixPath
+from typing import List, Dict, Any, Iterator, Optional
+import copy
+import hashlib
+import io
+import logging
+import threading
+import redis
+from sqlalchemy.orm import object_session
+from app.config import settings
+from app.models.dataset_version import DatasetVersion
+from app.services.storage_service import storage_service, content_key, BLOB_PREFIX
+from app.services.dataset_manifest import DatasetManifest
+from app.utils.preprocessing import processed_extension
+from app.utils.hash_index import HammingIndex
+from app.utils.phash import hash_image_bytes
+from app.utils.archive_stream import iter_archive
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CONTENT_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.bmp': 'image/bmp',
+    '.tif': 'image/tiff',
+    '.tiff': 'image/tiff',
+}
+
+VIDEO_CONTENT_TYPES = {
+    '.mp4': 'video/mp4',
+    '.mov': 'video/quicktime',
+    '.webm': 'video/webm',
+    '.mkv': 'video/x-matroska',
+}
+
+class DatasetService:
+    """Dataset ingest: manifest edits, preprocessing jobs and duplicate lookups."""
+
+    def __init__(self):
+        self.upload_dir = Path(settings.TEMP_PATH) / "uploads"
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.redis_client = redis.from_url(settings.REDIS_URL)
+
+    def local_dir(self, dataset_id: str) -> Path:
+        """Local working directory of a dataset."""
+        return self.upload_dir / str(dataset_id)
+
+    @contextmanager
+    def edit_manifest(self, dataset, message: Optional[str] = None) -> Iterator[DatasetManifest]:
+        """
+        Load, modify and save a dataset's manifest under a lock.
+
+        Every change becomes a new immutable version whose delta holds only the
+        changed entries; unchanged edits create nothing. The dataset's
+        image_count and stats are refreshed from the manifest, and the
+        session is committed before the lock is released, so the next editor
+        sees this version as the head.
+        """
+        lock = self.redis_client.lock(f"dataset:{dataset.id}:manifest", timeout=300, blocking_timeout=120)
+        with lock:
+            manifest = DatasetManifest.load(dataset)
+            before = copy.deepcopy(manifest.entries)
+            yield manifest
+
+            db = object_session(dataset)
+            head = self.head_version(db, dataset)
+            # The first version of a dataset (including pre-versioning ones) holds everything
+            puts, deletes = manifest.diff(before if head else {})
+            if not puts and not deletes:
+                return
+
+            version = self._write_version(db, dataset, head, puts, deletes, before, len(manifest), message)
+            manifest.save()
+            self.sync_stats(dataset, manifest, version)
+            db.commit()
+
+    def head_version(self, db, dataset) -> Optional[DatasetVersion]:
+        """Latest version of a dataset, or None if it has never been edited."""
+        return db.query(DatasetVersion).filter(
+            DatasetVersion.dataset_id == dataset.id
+        ).order_by(DatasetVersion.version.desc()).first()
+
+    def _write_version(
+        self,
+        db,
+        dataset,
+        head: Optional[DatasetVersion],
+        puts: Dict[str, Dict[str, Any]],
+        deletes: List[str],
+        before: Dict[str, Dict[str, Any]],
+        image_count: int,
+        message: Optional[str]
+    ) -> DatasetVersion:
+        """Store a delta manifest and record it as the next version."""
+        number = (head.version if head else 0) + 1
+        delta_path = f"{dataset.storage_path}/versions/{number:06d}.jsonl"
+        success = storage_service.upload_fileobj(
+            io.BytesIO(DatasetManifest.delta_to_jsonl(puts, deletes)),
+            delta_path,
+            content_type='application/x-ndjson'
+        )
+        if not success:
+            raise Exception(f"Failed to save dataset version {delta_path}")
+
+        version = DatasetVersion(
+            dataset_id=dataset.id,
+            version=number,
+            parent_id=head.id if head else None,
+            delta_path=delta_path,
+            message=message,
+            added_count=sum(1 for name in puts if name not in before),
+            updated_count=sum(1 for name in puts if name in before),
+            removed_count=len(deletes),
+            image_count=image_count
+        )
+        db.add(version)
+        db.flush()
+
+        logger.info(f"Dataset {dataset.id} v{number}: +{version.added_count} ~{version.updated_count} -{version.removed_count}")
+        return version
+
+    def manifest_at(self, db, dataset, version: int) -> DatasetManifest:
+        """
+        Rebuild the manifest of a past version by replaying deltas.
+
+        Raises:
+            ValueError: If the version does not exist
+        """
+        versions = db.query(DatasetVersion).filter(
+            DatasetVersion.dataset_id == dataset.id,
+            DatasetVersion.version <= version
+        ).order_by(DatasetVersion.version).all()
+        if not versions or versions[-1].version != version:
+            raise ValueError(f"Dataset {dataset.id} has no version {version}")
+
+        manifest = DatasetManifest(dataset.storage_path)
+        for v in versions:
+            data = storage_service.read_stream(v.delta_path)
+            if data is None:
+                raise Exception(f"Could not read dataset version {v.delta_path}")
+            manifest.apply_delta(data)
+        return manifest
+
+    def referenced_blobs(self, db) -> set:
+        """Content-addressed keys referenced by any version of any dataset."""
+        referenced = set()
+        for (delta_path,) in db.query(DatasetVersion.delta_path).all():
+            data = storage_service.read_stream(delta_path)
+            if data is None:
+                continue
+            delta = DatasetManifest('')
+            delta.apply_delta(data)
+            for name, _ in delta.items():
+                referenced.update(key for key in delta.object_keys(name) if key.startswith(BLOB_PREFIX))
+        return referenced
+
+    def collect_garbage(self, db, min_age_hours: float = 1.0) -> Dict[str, int]:
+        """
+        Delete blobs no dataset version references any more.
+
+        Blobs younger than min_age_hours are kept, since uploads store the blob
+        before the version that references it.
+        """
+        referenced = self.referenced_blobs(db)
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=min_age_hours)
+        deleted = 0
+        freed = 0
+        objects = storage_service.list_objects(f"{BLOB_PREFIX}/")
+        for obj in objects:
+            if obj['Key'] in referenced or obj['LastModified'] > cutoff:
+                continue
+            if storage_service.delete_file(obj['Key']):
+                deleted += 1
+                freed += obj['Size']
+
+        logger.info(f"Blob GC: {len(objects)} blobs, {len(referenced)} referenced, deleted {deleted} ({freed} bytes)")
+        return {'blobs': len(objects), 'referenced': len(referenced), 'deleted': deleted, 'freed_bytes': freed}
+
+    def sync_stats(self, dataset, manifest: DatasetManifest, version: Optional[DatasetVersion] = None):
+        """Copy manifest aggregates onto the dataset row for O(1) listing."""
+        stats = manifest.stats()
+        metadata = dict(dataset.dataset_metadata or {})
+        # Per-image records live in the manifest now
+        metadata.pop('images', None)
+        metadata.pop('buckets', None)
+        metadata['stats'] = stats
+        if version is not None:
+            metadata['version'] = version.version
+
+        dataset.dataset_metadata = metadata
+        dataset.image_count = stats['image_count']
+        dataset.video_count = stats['video_count']
+        dataset.is_processed = stats['image_count'] > 0 and stats['processed_count'] == stats['image_count']
+        dataset.captions_generated = stats['image_count'] > 0 and stats['captioned_count'] == stats['image_count']
+
+    def preprocess_jobs(self, dataset, manifest: DatasetManifest) -> List[Dict[str, Any]]:
+        """
+        Build process-pool jobs for images that have not been preprocessed yet.
+
+        Args:
+            dataset: Dataset whose uploaded images should be processed
+            manifest: The dataset's manifest
+
+        Returns:
+            List of job dicts for app.utils.preprocessing.preprocess_image
+        """
+        fmt = settings.DATASET_PROCESSED_FORMAT
+        extension = processed_extension(fmt)
+        if extension is None:
+            raise ValueError(f"Unsupported processed image format: {fmt}")
+
+        jobs = []
+        for filename, info in manifest.images():
+            if info.get('processed_key'):
+                continue
+
+            jobs.append({
+                'filename': filename,
+                'source_key': info.get('key', f"{dataset.storage_path}/{filename}"),
+                'processed_name': f"{Path(filename).stem}.{extension}",
+                'resolutions': settings.dataset_bucket_resolutions_list,
+                'max_side': settings.DATASET_MAX_IMAGE_SIDE,
+                'format': fmt,
+                'quality': settings.DATASET_PROCESSED_QUALITY,
+                'needs_hash': not info.get('phash'),
+            })
+
+        return jobs
+
+    def duplicate_index(self, images: Dict[str, Dict[str, Any]]) -> HammingIndex:
+        """Index images by perceptual hash for near-duplicate lookups."""
+        index = HammingIndex(settings.DATASET_DUPLICATE_MAX_DISTANCE)
+        for filename, info in images.items():
+            if info.get('phash'):
+                index.add(filename, int(info['phash'], 16))
+        return index
+
+    def find_duplicate(self, filename: str, hashes: Dict[str, str], index: HammingIndex) -> Optional[Dict[str, Any]]:
+        """Closest near-duplicate of an image already in the index, if any."""
+        if not hashes:
+            return None
+        matches = index.query(int(hashes['phash'], 16), exclude=filename)
+        if not matches:
+            return None
+        return {
+            'filename': filename,
+            'duplicate_of': matches[0][0],
+            'distance': matches[0][1]
+        }
+
+    def store_blob(self, data: bytes, sha256: str, content_type: str) -> str:
+        """Upload content once under its hash, returning the storage key."""
+        key = content_key(sha256)
+        if storage_service.exists(key):
+            return key
+        if not storage_service.upload_fileobj(io.BytesIO(data), key, content_type=content_type):
+            raise Exception(f"Failed to upload {key}")
+        return key
+
+    def store_caption(self, text: str) -> Dict[str, Any]:
+        """Store a caption sidecar, returning its manifest fields."""
+        data = text.encode('utf-8')
+        sha256 = hashlib.sha256(data).hexdigest()
+        return {
+            'caption': text,
+            'caption_key': self.store_blob(data, sha256, 'text/plain'),
+            'caption_sha256': sha256,
+            'has_caption': True
+        }
+
+    def ingest_archive(self, stream, index: HammingIndex) -> Dict[str, Any]:
+        """
+        Validate, hash and upload each image (or video) of a ZIP or tar stream as it arrives.
+
+        Entries are held in memory only until their upload finishes, and at
+        most twice DATASET_UPLOAD_WORKERS are in flight, so a fast client
+        waits for storage instead of filling the API host. Caption .txt files
+        are stored and matched to images by file stem. Entries are named by
+        file name; a later entry reusing a name already taken in the archive
+        (001.jpg in two folders) is rejected rather than overwriting the first.
+
+        Args:
+            stream: File-like object yielding the archive bytes
+            index: Perceptual-hash index of the dataset (extended in place)
+
+        Returns:
+            Dict with images ({name: entry}), captions ({stem: fields}),
+            duplicates, rejected and skipped
+        """
+        workers = settings.DATASET_UPLOAD_WORKERS
+        max_entry_size = settings.DATASET_ARCHIVE_MAX_ENTRY_MB * 1024 * 1024
+        in_flight = threading.BoundedSemaphore(workers * 2)
+        images = {}
+        caption_futures = {}
+        upload_futures = []
+        duplicates = []
+        rejected = []
+        skipped = []
+        seen = {}  # File name -> archive path that took it
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            def submit(fn, *args):
+                in_flight.acquire()
+                future = pool.submit(fn, *args)
+                future.add_done_callback(lambda _: in_flight.release())
+                return future
+
+            for path, data in iter_archive(stream, max_entry_size):
+                name = PurePosixPath(path).name
+                extension = PurePosixPath(name).suffix.lower()
+                if not name or name.startswith('.') or '__MACOSX' in path:
+                    continue
+
+                if name in seen:
+                    rejected.append({'filename': path, 'error': f"Duplicate file name (already used by {seen[name]})"})
+                    continue
+                seen[name] = path
+
+                if extension == '.txt':
+                    stem = PurePosixPath(name).stem
+                    caption_futures[stem] = submit(self.store_caption, data.decode('utf-8', errors='replace').strip())
+                    continue
+
+                if extension in VIDEO_CONTENT_TYPES:
+                    sha256 = hashlib.sha256(data).hexdigest()
+                    images[name] = {
+                        'key': content_key(sha256),
+                        'sha256': sha256,
+                        'size': len(data),
+                        'content_type': VIDEO_CONTENT_TYPES[extension],
+                        'media': 'video',
+                        'has_caption': False
+                    }
+                    upload_futures.append(submit(self.store_blob, data, sha256, VIDEO_CONTENT_TYPES[extension]))
+                    continue
+
+                if extension not in IMAGE_CONTENT_TYPES:
+                    skipped.append(path)
+                    continue
+
+                try:
+                    hashes = hash_image_bytes(data)
+                except Exception as e:
+                    logger.warning(f"Rejected {path}: {e}")
+                    rejected.append({'filename': name, 'error': 'Not a valid image'})
+                    continue
+
+                duplicate = self.find_duplicate(name, hashes, index)
+                if duplicate and settings.DATASET_REJECT_DUPLICATES:
+                    rejected.append(duplicate)
+                    continue
+
+                sha256 = hashlib.sha256(data).hexdigest()
+                images[name] = {
+                    'key': content_key(sha256),
+                    'sha256': sha256,
+                    'size': len(data),
+                    'content_type': IMAGE_CONTENT_TYPES[extension],
+                    'has_caption': False,
+                    **hashes
+                }
+                if duplicate:
+                    images[name]['duplicate_of'] = duplicate['duplicate_of']
+                    duplicates.append(duplicate)
+                index.add(name, int(hashes['phash'], 16))
+
+                upload_futures.append(submit(self.store_blob, data, sha256, IMAGE_CONTENT_TYPES[extension]))
+
+            # Surface upload failures
+            for future in upload_futures:
+                future.result()
+            captions = {stem: future.result() for stem, future in caption_futures.items()}
+
+        return {
+            'images': images,
+            'captions': captions,
+            'duplicates': duplicates,
+            'rejected': rejected,
+            'skipped': skipped
+        }
+
+    def duplicate_clusters(self, images: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Group near-duplicate images.
+
+        Returns:
+            List of clusters with their images and largest pairwise distance
+        """
+        index = self.duplicate_index(images)
+        clusters = []
+        for group in index.clusters():
+            distances = [
+                distance
+                for filename in group
+                for _, distance in index.query(int(images[filename]['phash'], 16), exclude=filename)
+            ]
+            clusters.append({
+                'images': group,
+                'max_distance': max(distances) if distances else 0
+            })
+
+        return sorted(clusters, key=lambda c: -len(c['images']))
+
+# Global instance
+dataset_service = DatasetService()
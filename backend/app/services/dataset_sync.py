@@ -0,0 +1,210 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from app.config import settings
+from app.services.storage_service import storage_service
+from app.services.dataset_manifest import DatasetManifest
+from app.utils.buckets import output_stems
+
+logger = logging.getLogger(__name__)
+
+class DatasetSync:
+    """Materialize datasets from storage into local training directories."""
+
+    LOCAL_MANIFEST = ".sync_manifest.json"
+
+    def __init__(self):
+        self.root_dir = Path(settings.TEMP_PATH) / "datasets"
+        self.blob_dir = Path(settings.TEMP_PATH) / "blob_cache"
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, sha256: str) -> Path:
+        """Location of a content-addressed file in the shared local cache."""
+        return self.blob_dir / sha256[:2] / sha256
+
+    def _file_sha256(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _plan(self, manifest: DatasetManifest, resolution: int) -> Tuple[Dict[str, Tuple[str, Optional[str]]], bool]:
+        """
+        Decide which stored object backs each local file.
+
+        Returns:
+            ({local_name: (storage_key, sha256)}, prebucketed)
+        """
+        res = str(resolution)
+        images = dict(manifest.images())
+        prebucketed = len(images) > 0 and all(
+            res in entry.get('bucket_keys', {}) and res in entry.get('bucket_sha256', {})
+            for entry in images.values()
+        )
+
+        files = {}
+        stems = output_stems(images)
+        for name, entry in images.items():
+            stem = stems[name]
+            if prebucketed:
+                files[f"{stem}.png"] = (entry['bucket_keys'][res], entry['bucket_sha256'][res])
+            elif entry.get('processed_key') and entry.get('processed_sha256'):
+                processed_name = entry.get('processed_name') or Path(entry['processed_key']).name
+                files[f"{stem}{Path(processed_name).suffix}"] = (entry['processed_key'], entry['processed_sha256'])
+            else:
+                files[f"{stem}{Path(name).suffix}"] = (entry['key'], entry.get('sha256'))
+
+            if entry.get('caption_key'):
+                files[f"{stem}.txt"] = (entry['caption_key'], entry.get('caption_sha256'))
+
+        return files, prebucketed
+
+    def _fetch_blob(self, key: str, sha256: str) -> int:
+        """Download an object into the blob cache, returning bytes transferred."""
+        blob = self.blob_path(sha256)
+        if blob.exists():
+            return 0
+
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        part = blob.with_name(f"{sha256}.{os.getpid()}.{threading.get_ident()}.part")
+        if not storage_service.download_file(key, str(part)):
+            raise Exception(f"Failed to download {key}")
+
+        if self._file_sha256(part) != sha256:
+            part.unlink(missing_ok=True)
+            raise Exception(f"Content hash mismatch for {key}")
+
+        size = part.stat().st_size
+        os.replace(part, blob)
+        return size
+
+    def _link(self, source: Path, dest: Path):
+        """Hard-link a cached blob into place (copy across filesystems)."""
+        # Marks the blob as recently used for pruning (atime is often not kept)
+        os.utime(source)
+        dest.unlink(missing_ok=True)
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copy2(source, dest)
+
+    def prune(self, max_bytes: int) -> int:
+        """
+        Delete least recently used blobs until the cache fits max_bytes.
+
+        Training directories hold hard links, so pruning a blob does not
+        break a synced dataset; its space is freed once those go too.
+
+        Returns:
+            Bytes deleted
+        """
+        blobs = []
+        for path in self.blob_dir.glob('*/*'):
+            if path.suffix == '.part':
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in blobs)
+        freed = 0
+        for _, size, path in sorted(blobs):
+            if total - freed <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            freed += size
+
+        if freed:
+            logger.info(f"Pruned {freed / 2**20:.1f}MB from the blob cache")
+        return freed
+
+    def sync(self, dataset, manifest: DatasetManifest, resolution: int) -> Dict[str, Any]:
+        """
+        Bring a local training directory in line with the dataset manifest.
+
+        Files already present with the same content hash are left alone, files
+        in the shared blob cache are hard-linked, and only the rest are downloaded.
+
+        Args:
+            dataset: Dataset to materialize
+            manifest: The dataset's manifest
+            resolution: Training resolution (selects pre-bucketed copies when available)
+
+        Returns:
+            Dict with the local path and transfer stats
+        """
+        start = time.time()
+        files, prebucketed = self._plan(manifest, resolution)
+
+        dest_dir = self.root_dir / str(dataset.id) / (f"bucket_{resolution}" if prebucketed else "full")
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        local_manifest_path = dest_dir / self.LOCAL_MANIFEST
+        local_manifest = json.loads(local_manifest_path.read_text()) if local_manifest_path.exists() else {}
+
+        # Diff against what is already on disk
+        unchanged = []
+        changed = {}
+        for name, (key, sha256) in files.items():
+            if (dest_dir / name).exists() and (sha256 is None or local_manifest.get(name) == sha256):
+                unchanged.append(name)
+            else:
+                changed[name] = (key, sha256)
+
+        removed = [name for name in local_manifest if name not in files]
+        for name in removed:
+            (dest_dir / name).unlink(missing_ok=True)
+
+        # Fetch missing content once per hash, in parallel
+        missing_blobs = {
+            sha256: key
+            for key, sha256 in changed.values()
+            if sha256 and not self.blob_path(sha256).exists()
+        }
+        downloaded_bytes = 0
+        if missing_blobs:
+            with ThreadPoolExecutor(max_workers=settings.DATASET_SYNC_WORKERS) as pool:
+                futures = [pool.submit(self._fetch_blob, key, sha256) for sha256, key in missing_blobs.items()]
+                downloaded_bytes = sum(f.result() for f in futures)
+
+        for name, (key, sha256) in changed.items():
+            if sha256:
+                self._link(self.blob_path(sha256), dest_dir / name)
+            elif storage_service.download_file(key, str(dest_dir / name)):
+                # Legacy entry without a content hash
+                downloaded_bytes += (dest_dir / name).stat().st_size
+            else:
+                raise Exception(f"Failed to download {key}")
+
+        local_manifest_path.write_text(json.dumps({name: sha256 for name, (_, sha256) in files.items()}))
+
+        # After linking, so this sync's blobs are the most recently used
+        pruned_bytes = self.prune(int(settings.DATASET_BLOB_CACHE_MAX_GB * 2**30)) if missing_blobs else 0
+
+        result = {
+            'path': str(dest_dir),
+            'prebucketed': prebucketed,
+            'files': len(files),
+            'unchanged': len(unchanged),
+            'updated': len(changed),
+            'downloaded': len(missing_blobs),
+            'downloaded_bytes': downloaded_bytes,
+            'removed': len(removed),
+            'pruned_bytes': pruned_bytes,
+            'seconds': round(time.time() - start, 2),
+        }
+        logger.info(f"Synced dataset {dataset.id} to {dest_dir}: {result}")
+        return result
+
+# Global instance
+dataset_sync = DatasetSync()
@@ -0,0 +1,197 @@
+from typing import Optional, Dict, Any, List
+from datetime import datetime
+import hashlib
+import json
+import logging
+import redis
+from app.config import settings
+from app.services.storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pipeline changes in a way that changes outputs for the same inputs
+CACHE_VERSION = 1
+BASE_MODEL_ID = "black-forest-labs/FLUX.1-dev"
+
+class GenerationCache:
+    """
+    Reuse stored results of deterministic (seeded) generations.
+
+    A request is identified by a canonical hash of every output-affecting
+    parameter plus base model and LoRA identity. Results are shared, so each
+    entry tracks the assets that point at its images and storage is only
+    deleted when the last one goes.
+    """
+
+    def __init__(self):
+        self.redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    def _entry_key(self, cache_key: str) -> str:
+        return f"gencache:{cache_key}"
+
+    def _refs_key(self, cache_key: str) -> str:
+        return f"gencache:{cache_key}:refs"
+
+    def cache_key(
+        self,
+        config: Dict[str, Any],
+        lora_storage_path: Optional[str] = None,
+        fused: bool = True
+    ) -> Optional[str]:
+        """
+        Canonical hash of a generation request, or None if it is not deterministic.
+
+        Args:
+            config: Generation config (as sent to the task)
+            lora_storage_path: Stored LoRA file, when a model is used
+            fused: Whether the LoRA is fused into the base weights (single
+                jobs) or applied unfused (sweeps and bulk runs); the two
+                round differently, so their images are not interchangeable
+        """
+        if config.get('seed') is None:
+            return None
+
+        canonical = {
+            'version': CACHE_VERSION,
+            'base_model': BASE_MODEL_ID,
+            'prompt': config['prompt'],
+            # negative_prompt is ignored by Flux, so it does not split the cache
+            'num_images': config.get('num_images', 1),
+            'num_inference_steps': config.get('num_inference_steps', 30),
+            'guidance_scale': float(config.get('guidance_scale', 3.5)),
+            'width': config.get('width', 1024),
+            'height': config.get('height', 1024),
+            'seed': config['seed'],
+        }
+        if config.get('init_image'):
+            # Refinement of a draft
+            canonical['refine'] = {
+                'init_image': config['init_image'],
+                'strength': float(config.get('strength', 0.6)),
+            }
+        if config.get('model_id'):
+            canonical['lora'] = {
+                'model_id': str(config['model_id']),
+                'storage_path': lora_storage_path,
+                'weight': float(config.get('lora_weight', 0.8)),
+                'fused': fused,
+            }
+
+        encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def lookup(self, cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Stored result for a request, if its images still exist."""
+        if cache_key is None:
+            return None
+
+        data = self.redis_client.get(self._entry_key(cache_key))
+        if not data:
+            return None
+
+        entry = json.loads(data)
+        if not entry['output_paths'] or not storage_service.exists(entry['output_paths'][0]):
+            self.redis_client.delete(self._entry_key(cache_key), self._refs_key(cache_key))
+            return None
+        return entry
+
+    def store(
+        self,
+        cache_key: str,
+        job_id: str,
+        output_paths: List[str],
+        derivatives: Optional[List[Dict[str, str]]] = None
+    ) -> bool:
+        """
+        Record a finished generation (and its web variants) as the result for its key.
+
+        When identical jobs both missed, the first to finish becomes the
+        entry; the others keep their images to themselves (not referenced,
+        so deleting them deletes their images).
+
+        Returns:
+            Whether the job's images became the cached result
+        """
+        stored = self.redis_client.set(self._entry_key(cache_key), json.dumps({
+            'job_id': str(job_id),
+            'output_paths': output_paths,
+            'derivatives': derivatives or [],
+        }), nx=True)
+        if stored:
+            self.add_ref(cache_key, job_id)
+        return bool(stored)
+
+    def add_ref(self, cache_key: str, job_id: str):
+        self.redis_client.sadd(self._refs_key(cache_key), str(job_id))
+
+    def complete(
+        self,
+        asset,
+        cache_key: str,
+        cached: Dict[str, Any],
+        outcome: str = 'hits',
+        timing_metrics: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Point a job's asset at the stored result of an identical earlier job.
+
+        The caller commits the asset.
+
+        Args:
+            asset: GeneratedAsset of the job
+            cache_key: Key the result was found under
+            cached: Entry returned by lookup()
+            outcome: Counter to record ('hits' on submission, 'late_hits' in a worker)
+            timing_metrics: Timing to record (defaults to an instant hit)
+        """
+        self.record(outcome)
+        self.add_ref(cache_key, asset.id)
+        asset.storage_path = cached['output_paths'][0]
+        asset.parameters = {
+            **(asset.parameters or {}),
+            'status': 'completed',
+            'output_paths': cached['output_paths'],
+            'derivatives': cached.get('derivatives', []),
+            'cache_key': cache_key,
+            'cache_hit': True,
+            'cache_source': cached['job_id'],
+            'timing_metrics': timing_metrics or {'cache_hit': True, 'total_time': 0.0}
+        }
+        asset.completed_at = datetime.utcnow()
+
+    def release(self, cache_key: str, job_id: str) -> int:
+        """
+        Drop an asset's reference to a cached result.
+
+        Returns:
+            Number of assets still using the images (0 means they can be deleted)
+        """
+        if not self.redis_client.srem(self._refs_key(cache_key), str(job_id)):
+            # The job's images were never shared (another job's became the entry)
+            return 0
+        remaining = self.redis_client.scard(self._refs_key(cache_key))
+        if remaining == 0:
+            self.redis_client.delete(self._entry_key(cache_key), self._refs_key(cache_key))
+        return remaining
+
+    def record(self, outcome: str):
+        """Count a lookup outcome: 'hits', 'late_hits', 'misses' or 'uncacheable'."""
+        self.redis_client.hincrby("gencache:stats", outcome, 1)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {k: int(v) for k, v in self.redis_client.hgetall("gencache:stats").items()}
+        hits = counts.get('hits', 0)
+        late_hits = counts.get('late_hits', 0)
+        misses = counts.get('misses', 0)
+        lookups = hits + misses
+
+        return {
+            'hits': hits,
+            'late_hits': late_hits,  # Found by the worker after queueing (subset of misses)
+            'misses': misses,
+            'uncacheable': counts.get('uncacheable', 0),  # No seed
+            'hit_rate': round((hits + late_hits) / lookups, 4) if lookups else None,
+        }
+
+# Global instance
+generation_cache = GenerationCache()
@@ -0,0 +1,264 @@
+from typing import Optional, Dict, Any, Tuple, List, Set, Callable
+import json
+import logging
+import time
+import redis
+from app.config import settings
+from app.utils.scheduling import choose_next
+
+logger = logging.getLogger(__name__)
+
+class GenerationScheduler:
+    """
+    Pending generation jobs, handed to workers with LoRA affinity.
+
+    Jobs wait in Redis rather than in the Celery queue, which only carries
+    interchangeable "run the queue" tokens (one per job). A worker running a
+    token asks for the next job given the LoRA it has loaded, so jobs for the
+    same LoRA run back to back instead of swapping adapters on every job.
+    A job is only overtaken by jobs that arrived within the fairness window
+    after it, so none starves.
+
+    Jobs routed to a specific worker wait in that worker's lane; jobs without
+    a lane wait in the shared one, which every worker falls back to.
+
+    A dispatched job stays recorded as running (with the worker and process
+    running it) until it finishes, so the jobs of a process that was killed
+    can be put back in the queue, or failed once they have killed
+    MAX_ATTEMPTS processes.
+    """
+
+    PENDING_KEY = "gensched:pending"  # Shared lane, sorted set: job_id -> enqueued_at
+    LANES_KEY = "gensched:lanes"  # Worker lanes that may hold jobs
+    RUNNING_KEY = "gensched:running"  # Hash: job_id -> {worker, pid, started_at}
+    RECOVERY_KEY = "gensched:recovery"  # Set while a token to recover running jobs is queued
+    STATS_KEY = "gensched:stats"
+    MAX_ATTEMPTS = 2
+
+    def __init__(self):
+        self.redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"gensched:job:{job_id}"
+
+    def _pending_key(self, lane: Optional[str]) -> str:
+        return f"{self.PENDING_KEY}:{lane}" if lane else self.PENDING_KEY
+
+    def enqueue(self, job_id: str, config: Dict[str, Any], lane: Optional[str] = None, lora_key: Optional[str] = None):
+        """
+        Add a job; the caller queues a token task for it.
+
+        Args:
+            job_id: Generation job UUID
+            config: Generation config for the task
+            lane: Worker the job was routed to (None for the shared lane)
+            lora_key: LoRA storage path, used to route later jobs after this one
+        """
+        now = time.time()
+        pipe = self.redis_client.pipeline()
+        pipe.set(self._job_key(job_id), json.dumps({
+            'config': config,
+            'enqueued_at': now,
+            'lane': lane,
+            'lora_key': lora_key,
+        }))
+        pipe.zadd(self._pending_key(lane), {str(job_id): now})
+        if lane:
+            pipe.sadd(self.LANES_KEY, lane)
+        pipe.execute()
+
+    def remove(self, job_id: str) -> bool:
+        """Drop a job that has not started yet; returns False if it was not pending."""
+        data = self.redis_client.get(self._job_key(job_id))
+        if not data:
+            return False
+        lane = json.loads(data).get('lane')
+
+        # A running job keeps its record until it finishes
+        if not self.redis_client.zrem(self._pending_key(lane), str(job_id)):
+            return False
+        self.redis_client.delete(self._job_key(job_id))
+        return True
+
+    def pending_count(self, lane: Optional[str] = None) -> int:
+        return self.redis_client.zcard(self._pending_key(lane))
+
+    def _load_jobs(self, lane: Optional[str]) -> List[Dict[str, Any]]:
+        """Oldest pending jobs of a lane (the window only needs the head of the queue)."""
+        key = self._pending_key(lane)
+        job_ids = self.redis_client.zrange(key, 0, settings.GENERATION_SCHEDULER_SCAN - 1)
+        if not job_ids:
+            return []
+
+        jobs = []
+        for job_id, data in zip(job_ids, self.redis_client.mget([self._job_key(j) for j in job_ids])):
+            if data is None:
+                self.redis_client.zrem(key, job_id)
+                continue
+            job = json.loads(data)
+            jobs.append({
+                'job_id': job_id,
+                'model_id': job['config'].get('model_id'),
+                'enqueued_at': job['enqueued_at'],
+                'lora_key': job.get('lora_key'),
+                'config': job['config'],
+            })
+        return jobs
+
+    def pending_jobs(self, lane: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Oldest pending jobs of a lane (up to GENERATION_SCHEDULER_SCAN), with their configs."""
+        return self._load_jobs(lane)
+
+    def lane_loras(self, lane: str) -> Set[str]:
+        """LoRAs of the jobs waiting in a worker's lane."""
+        return {job['lora_key'] for job in self._load_jobs(lane) if job['lora_key']}
+
+    def next_job(
+        self,
+        resident_model_id: Optional[str],
+        lane: Optional[str] = None,
+        pid: Optional[int] = None
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Take the next job for a worker; it is recorded as running until finish().
+
+        Args:
+            resident_model_id: LoRA the worker has loaded (None for none)
+            lane: The worker's own lane; the shared lane is used once it is empty
+            pid: Process running the job
+
+        Returns:
+            (job_id, config), or None if nothing is pending
+        """
+        with self.redis_client.lock("gensched:lock", timeout=30, blocking_timeout=30):
+            pending = self._load_jobs(lane) if lane else []
+            source = lane
+            if not pending:
+                pending = self._load_jobs(None)
+                source = None
+            if not pending:
+                return None
+
+            index, reason = choose_next(pending, resident_model_id, settings.GENERATION_FAIRNESS_WINDOW_SECONDS)
+            chosen = pending[index]
+
+            pipe = self.redis_client.pipeline()
+            pipe.zrem(self._pending_key(source), chosen['job_id'])
+            pipe.hset(self.RUNNING_KEY, chosen['job_id'], json.dumps({
+                'worker': lane,
+                'pid': pid,
+                'started_at': time.time(),
+            }))
+            pipe.hincrby(self.STATS_KEY, 'dispatched', 1)
+            pipe.hincrby(self.STATS_KEY, reason, 1)
+            if chosen['model_id'] != resident_model_id:
+                pipe.hincrby(self.STATS_KEY, 'swaps', 1)
+            pipe.execute()
+
+        logger.info(
+            f"Dispatching generation job {chosen['job_id']} ({reason}, "
+            f"waited {time.time() - chosen['enqueued_at']:.1f}s)"
+        )
+        return chosen['job_id'], chosen['config']
+
+    def finish(self, job_id: str):
+        """Forget a job that ran to an end (completed, failed or cancelled)."""
+        pipe = self.redis_client.pipeline()
+        pipe.hdel(self.RUNNING_KEY, job_id)
+        pipe.delete(self._job_key(job_id))
+        pipe.execute()
+
+    def recover(self, is_dead: Callable[[Dict[str, Any]], bool]) -> Tuple[int, List[str]]:
+        """
+        Put the jobs of dead processes back in the shared lane.
+
+        Args:
+            is_dead: Whether the process of a running entry ({worker, pid,
+                started_at}) is gone
+
+        Returns:
+            (jobs re-queued (the caller queues a shared token for each),
+            job IDs that already used up MAX_ATTEMPTS (the caller fails them))
+        """
+        requeued, exhausted = 0, []
+        with self.redis_client.lock("gensched:lock", timeout=30, blocking_timeout=30):
+            for job_id, entry in self.redis_client.hgetall(self.RUNNING_KEY).items():
+                if not is_dead(json.loads(entry)):
+                    continue
+
+                data = self.redis_client.get(self._job_key(job_id))
+                job = json.loads(data) if data else None
+                attempts = (job or {}).get('attempts', 0) + 1
+                pipe = self.redis_client.pipeline()
+                pipe.hdel(self.RUNNING_KEY, job_id)
+                if job is None or attempts >= self.MAX_ATTEMPTS:
+                    pipe.delete(self._job_key(job_id))
+                    exhausted.append(job_id)
+                else:
+                    pipe.set(self._job_key(job_id), json.dumps({**job, 'lane': None, 'attempts': attempts}))
+                    pipe.zadd(self.PENDING_KEY, {job_id: job['enqueued_at']})
+                    requeued += 1
+                pipe.execute()
+
+        if requeued or exhausted:
+            logger.warning(f"Recovered generation jobs of dead processes: {requeued} re-queued, {len(exhausted)} failed")
+        return requeued, exhausted
+
+    def needs_recovery(self, is_dead: Callable[[Dict[str, Any]], bool]) -> bool:
+        """
+        Whether recover(is_dead) has jobs to recover, and nobody was asked to recently.
+
+        The first caller to see stranded jobs gets True and queues a token to
+        recover them; others get False until RECOVERY_KEY expires.
+        """
+        if not any(is_dead(json.loads(entry)) for entry in self.redis_client.hvals(self.RUNNING_KEY)):
+            return False
+        return bool(self.redis_client.set(self.RECOVERY_KEY, 1, nx=True, ex=settings.GENERATION_WORKER_TTL_SECONDS))
+
+    def reclaim_lanes(self, live_lanes: Set[str]) -> int:
+        """
+        Move jobs of workers that stopped advertising to the shared lane.
+
+        Returns:
+            Number of jobs moved (the caller queues a shared token for each)
+        """
+        moved = 0
+        for lane in self.redis_client.smembers(self.LANES_KEY):
+            if lane in live_lanes:
+                continue
+
+            with self.redis_client.lock("gensched:lock", timeout=30, blocking_timeout=30):
+                key = self._pending_key(lane)
+                for job_id, enqueued_at in self.redis_client.zrange(key, 0, -1, withscores=True):
+                    data = self.redis_client.get(self._job_key(job_id))
+                    if data is None:
+                        continue
+                    job = {**json.loads(data), 'lane': None}
+                    pipe = self.redis_client.pipeline()
+                    pipe.set(self._job_key(job_id), json.dumps(job))
+                    pipe.zadd(self.PENDING_KEY, {job_id: enqueued_at})
+                    pipe.execute()
+                    moved += 1
+                self.redis_client.delete(key)
+                self.redis_client.srem(self.LANES_KEY, lane)
+
+            logger.warning(f"Reclaimed generation jobs from departed worker {lane}")
+        return moved
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {k: int(v) for k, v in self.redis_client.hgetall(self.STATS_KEY).items()}
+        dispatched = counts.get('dispatched', 0)
+        return {
+            'pending': self.pending_count() + sum(
+                self.pending_count(lane) for lane in self.redis_client.smembers(self.LANES_KEY)
+            ),
+            'dispatched': dispatched,
+            'swaps': counts.get('swaps', 0),
+            # Each affinity pick ran a job on the loaded LoRA where FIFO would have swapped
+            'swaps_avoided': counts.get('affinity', 0),
+            'fairness_overrides': counts.get('fairness', 0),
+            'swap_rate': round(counts.get('swaps', 0) / dispatched, 4) if dispatched else None,
+        }
+
+# Global instance
+generation_scheduler = GenerationScheduler()
@@ -1,12 +1,17 @@
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import logging
 import fcntl
 import time
 import shutil
 import os
+import torch
+from safetensors.torch import load_file
+from app.config import settings
 from app.services.storage_service import storage_service
 from app.generators.flux_generator import FluxGenerator
+from app.utils.lora_compression import dequantize_state_dict
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +20,12 @@ class ModelService:
 
     def __init__(self):
         self.loaded_generators: Dict[str, FluxGenerator] = {}
+        self.resident_lora: Optional[Dict[str, Any]] = None  # {model_id, storage_path, weight, fused}
+        # Parsed LoRA state dicts in host memory (pinned on CUDA hosts), LRU within a RAM budget
+        self.lora_ram_cache: "OrderedDict[str, Dict[str, torch.Tensor]]" = OrderedDict()
+        self.lora_ram_bytes = 0
+        self.lora_ram_budget = settings.GENERATION_LORA_RAM_BUDGET_MB * 1024 * 1024
+        self.last_lora_metrics: Dict[str, Any] = {}
         self.cache_dir = Path("/tmp/masuka/model_cache")
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.min_free_space_gb = 15  # Minimum free space required
@@ -97,6 +108,14 @@ class ModelService:
             logger.warning(f"Cache too large: {cache_size:.2f}GB > {self.max_cache_size_gb}GB")
             self._evict_lru_models(self.min_free_space_gb)
 
+    def cached_models(self) -> List[str]:
+        """Storage paths of the models in the local disk cache."""
+        return sorted(
+            str(path.relative_to(self.cache_dir))
+            for path in self.cache_dir.rglob('*.safetensors')
+            if path.is_file()
+        )
+
     def get_generator(
         self,
         model_type: str = 'flux',
@@ -135,9 +154,11 @@ class ModelService:
         Returns:
             Local path to downloaded model
         """
+        # Mirror the storage layout: LoRAs from different sessions share a filename
         filename = Path(storage_path).name
-        local_path = self.cache_dir / filename
-        lock_path = self.cache_dir / f"{filename}.lock"
+        local_path = self.cache_dir / storage_path
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_path = local_path.with_name(f"{filename}.lock")
 
         # Create lock file
         lock_file = open(lock_path, 'w')
@@ -178,11 +199,42 @@ class ModelService:
             except Exception as e:
                 logger.warning(f"Failed to remove lock file: {e}")
 
+    def _lora_state_dict(self, storage_path: str) -> Tuple[Dict[str, torch.Tensor], str]:
+        """
+        Parsed LoRA weights from the RAM tier, or read from disk (downloading if needed).
+
+        Returns:
+            (state dict, tier: 'ram', 'disk' or 'download')
+        """
+        if storage_path in self.lora_ram_cache:
+            self.lora_ram_cache.move_to_end(storage_path)
+            return self.lora_ram_cache[storage_path], 'ram'
+
+        tier = 'disk' if (self.cache_dir / storage_path).exists() else 'download'
+        # Compact variants may hold int8 factors; diffusers needs floats
+        state_dict = dequantize_state_dict(load_file(self.download_model(storage_path)))
+
+        # The tier lives only as long as the worker process (one task), so
+        # LoRAs that cannot be kept are not pinned either
+        size = sum(tensor.numel() * tensor.element_size() for tensor in state_dict.values())
+        if size <= self.lora_ram_budget:
+            if torch.cuda.is_available():
+                # Pinned pages let the host-to-device copy run at full bandwidth
+                state_dict = {key: tensor.pin_memory() for key, tensor in state_dict.items()}
+            self.lora_ram_cache[storage_path] = state_dict
+            self.lora_ram_bytes += size
+            while self.lora_ram_bytes > self.lora_ram_budget:
+                _, evicted = self.lora_ram_cache.popitem(last=False)
+                self.lora_ram_bytes -= sum(t.numel() * t.element_size() for t in evicted.values())
+
+        return state_dict, tier
+
     def load_lora_for_generation(
         self,
         model_id: str,
         storage_path: str,
-        weight: float = 0.8
+        weight: float = 0.8,
+        fuse: bool = True
     ) -> FluxGenerator:
         """
         Load a LoRA model for generation.
@@ -191,25 +243,62 @@ class ModelService:
             model_id: Model ID for tracking
             storage_path: S3/R2 path to LoRA
             weight: LoRA weight
+            fuse: Fuse the LoRA (False keeps it as an adapter whose weight can change)
 
         Returns:
-            Generator with LoRA loaded
+            Generator with LoRA loaded (tier and timings in self.last_lora_metrics)
         """
-        # Download LoRA to cache
-        local_lora_path = self.download_model(storage_path)
-
         # Get generator
         generator = self.get_generator('flux')
 
+        # Consecutive jobs for the same LoRA keep it loaded
+        resident = self.resident_lora
+        if generator.lora_loaded and resident and resident['storage_path'] == storage_path and resident['fused'] == fuse:
+            start = time.time()
+            if resident['weight'] != weight:
+                if fuse:
+                    generator.refuse_lora(weight)
+                else:
+                    generator.set_lora_weight(weight)
+                self.resident_lora = {**resident, 'weight': weight}
+            logger.info(f"LoRA {model_id} already loaded")
+            self.last_lora_metrics = {'lora_tier': 'resident', 'lora_fetch_time': 0.0, 'lora_apply_time': time.time() - start}
+            return generator
+
+        # Parsed weights from RAM, else from the disk cache (downloading if needed)
+        fetch_start = time.time()
+        state_dict, tier = self._lora_state_dict(storage_path)
+        fetch_time = time.time() - fetch_start
+
         # Unload existing LoRA if any
         if generator.lora_loaded:
             generator.unload_lora()
-
-        # Load new LoRA
-        generator.load_lora(local_lora_path, weight)
+        self.resident_lora = None
+
+        # Load new LoRA (only the host-to-device copy and fuse remain)
+        apply_start = time.time()
+        generator.load_lora(
+            str(self.cache_dir / storage_path), weight, fuse=fuse,
+            # Shallow copy: diffusers may pop keys while converting formats
+            state_dict=dict(state_dict)
+        )
+        self.resident_lora = {'model_id': model_id, 'storage_path': storage_path, 'weight': weight, 'fused': fuse}
+        self.last_lora_metrics = {'lora_tier': tier, 'lora_fetch_time': fetch_time, 'lora_apply_time': time.time() - apply_start}
+        logger.info(f"LoRA {model_id} loaded from {tier} (fetch {fetch_time:.2f}s)")
 
         return generator
 
+    def unload_lora(self):
+        """Unload the resident LoRA, if any (e.g. before a base-model job)."""
+        generator = self.loaded_generators.get('flux')
+        if generator and generator.lora_loaded:
+            generator.unload_lora()
+        self.resident_lora = None
+
+    def resident_lora_id(self) -> Optional[str]:
+        """Model ID of the loaded LoRA, or None."""
+        return self.resident_lora['model_id'] if self.resident_lora else None
+
     def unload_all(self):
         """Unload all generators to free memory."""
         logger.info("Unloading all generators")
@@ -217,6 +306,9 @@ class ModelService:
             generator.unload_model()
 
         self.loaded_generators.clear()
+        self.resident_lora = None
+        self.lora_ram_cache.clear()
+        self.lora_ram_bytes = 0
         logger.info("All generators unloaded")
 
     def clear_cache(self):
@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Dict, Any, List, Callable
+import io
+import logging
+import threading
+import time
+from PIL import Image
+from app.config import settings
+from app.services.storage_service import storage_service
+from app.utils.derivatives import derivative_specs, derivative_key, encode_variant, FORMAT_CONTENT_TYPES
+
+logger = logging.getLogger(__name__)
+
+class OutputPipeline:
+    """
+    Encode and upload generated images off the generation thread.
+
+    Images are handed over as soon as the VAE decodes them; PNG encoding
+    (zlib releases the GIL) and uploads run on a thread pool straight from
+    memory, so they overlap with the rest of the batch and, for queued jobs,
+    with the next job's denoising. Each original also gets small web
+    variants (derivative_specs) uploaded next to it. Job completion callbacks
+    run on a separate single thread once all of a job's uploads have landed.
+    """
+
+    def __init__(self, workers: int):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='generation-upload')
+        # Separate from the pool: a finisher waiting on uploads must not hold an upload slot
+        self.finisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='generation-finish')
+        self.pending: List[Future] = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def encode_png(image: Image.Image) -> bytes:
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    @staticmethod
+    def _upload(data: bytes, key: str, content_type: str) -> float:
+        upload_start = time.time()
+        if not storage_service.upload_fileobj(io.BytesIO(data), key, content_type=content_type):
+            raise Exception(f"Failed to upload {key}")
+        return time.time() - upload_start
+
+    def _encode_and_upload(self, image: Image.Image, storage_path: str) -> Dict[str, Any]:
+        encode_start = time.time()
+        data = self.encode_png(image)
+        encode_time = time.time() - encode_start
+        upload_time = self._upload(data, storage_path, 'image/png')
+
+        derivatives = {}
+        derivative_bytes = {}
+        for name, (max_side, fmt, quality) in derivative_specs().items():
+            encode_start = time.time()
+            variant = encode_variant(image, max_side, fmt, quality)
+            encode_time += time.time() - encode_start
+
+            key = derivative_key(storage_path, name, fmt)
+            upload_time += self._upload(variant, key, FORMAT_CONTENT_TYPES[fmt])
+            derivatives[name] = key
+            derivative_bytes[name] = len(variant)
+
+        return {
+            'storage_path': storage_path,
+            'bytes': len(data),
+            'derivatives': derivatives,
+            'derivative_bytes': derivative_bytes,
+            'encode_time': encode_time,
+            'upload_time': upload_time
+        }
+
+    def submit(self, image: Image.Image, storage_path: str) -> Future:
+        """
+        Queue one image for PNG encoding and upload, with its web variants.
+
+        Returns:
+            Future resolving to {storage_path, bytes, derivatives ({name: key}),
+            derivative_bytes, encode_time, upload_time}; it raises if an
+            upload failed
+        """
+        return self.pool.submit(self._encode_and_upload, image, storage_path)
+
+    def when_done(self, uploads: List[Future], callback: Callable[[], Any]) -> Future:
+        """Run callback on the finisher thread once all uploads have finished (or failed)."""
+        def finish():
+            wait(uploads)
+            return callback()
+
+        future = self.finisher.submit(finish)
+        with self.lock:
+            self.pending = [f for f in self.pending if not f.done()] + [future]
+        return future
+
+    def discard(self, uploads: List[Future], prefix: str) -> int:
+        """
+        Delete what a failed job's uploads left in storage.
+
+        Waits for uploads still in flight first, so none land after the
+        cleanup; everything under the job's prefix goes, including the
+        originals and variants of images whose upload failed halfway.
+
+        Returns:
+            Number of objects deleted
+        """
+        wait(uploads)
+        deleted = 0
+        for key in storage_service.list_files(prefix):
+            deleted += bool(storage_service.delete_file(key))
+        return deleted
+
+    def drain(self):
+        """Wait for every queued completion callback (before the worker process exits)."""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Deferred generation output failed: {e}")
+
+    @staticmethod
+    def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Per-job totals of the encode/upload work done in the background."""
+        return {
+            'output_bytes': sum(r['bytes'] for r in results),
+            'derivative_bytes': sum(sum(r['derivative_bytes'].values()) for r in results),
+            'encode_time': sum(r['encode_time'] for r in results),
+            'upload_busy_time': sum(r['upload_time'] for r in results)
+        }
+
+# Global instance
+output_pipeline = OutputPipeline(workers=settings.GENERATION_UPLOAD_WORKERS)
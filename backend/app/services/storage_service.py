@@ -1,13 +1,19 @@
 import boto3
 from botocore.exceptions import ClientError
 from botocore.config import Config
-from typing import Optional, BinaryIO
+from typing import Optional, BinaryIO, Iterator, List, Dict, Any
 import logging
 from pathlib import Path
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+BLOB_PREFIX = "blobs/sha256"
+
+def content_key(sha256: str) -> str:
+    """Storage key of a content-addressed (immutable, shared) blob."""
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256}"
+
 class StorageService:
     """Handle file uploads/downloads to S3/Cloudflare R2."""
 
@@ -106,6 +112,112 @@ class StorageService:
             logger.error(f"Download failed: {e}")
             return False
 
+    def read_stream(self, object_name: str, chunk_size: int = 1024 * 1024) -> Optional[bytes]:
+        """Read an object into memory in chunks, without a temp file."""
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket,
+                Key=object_name
+            )
+            buffer = bytearray()
+            for chunk in response['Body'].iter_chunks(chunk_size=chunk_size):
+                buffer.extend(chunk)
+            return bytes(buffer)
+        except ClientError as e:
+            logger.error(f"Read failed for {object_name}: {e}")
+            return None
+
+    def iter_chunks(self, object_name: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Stream an object chunk by chunk (raises if it cannot be read)."""
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket,
+                Key=object_name
+            )
+            yield from response['Body'].iter_chunks(chunk_size=chunk_size)
+        except ClientError as e:
+            error_msg = f"Read failed for {object_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg) from e
+
+    def copy_file(self, source_name: str, object_name: str) -> bool:
+        """Server-side copy (multipart for large objects)."""
+        try:
+            self.s3_client.copy(
+                {'Bucket': self.bucket, 'Key': source_name},
+                self.bucket,
+                object_name
+            )
+            logger.info(f"Copied {source_name} to {object_name}")
+            return True
+        except ClientError as e:
+            error_msg = f"Copy failed for {source_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg) from e
+
+    def create_multipart_upload(self, object_name: str, content_type: Optional[str] = None) -> str:
+        """Start a multipart upload, returning its upload id."""
+        try:
+            extra_args = {}
+            if content_type:
+                extra_args['ContentType'] = content_type
+
+            response = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=object_name,
+                **extra_args
+            )
+            return response['UploadId']
+        except ClientError as e:
+            error_msg = f"Multipart upload failed to start for {object_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg) from e
+
+    def upload_part(self, object_name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        """Upload one part of a multipart upload, returning its ETag."""
+        try:
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket,
+                Key=object_name,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=data
+            )
+            return response['ETag']
+        except ClientError as e:
+            error_msg = f"Part {part_number} upload failed for {object_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg) from e
+
+    def complete_multipart_upload(self, object_name: str, upload_id: str, parts: List[Dict[str, Any]]) -> bool:
+        """Assemble uploaded parts ([{PartNumber, ETag}]) into the final object."""
+        try:
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=object_name,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            logger.info(f"Completed multipart upload of {object_name} ({len(parts)} parts)")
+            return True
+        except ClientError as e:
+            error_msg = f"Multipart upload failed to complete for {object_name}: {e}"
+            logger.error(error_msg)
+            raise Exception(error_msg) from e
+
+    def abort_multipart_upload(self, object_name: str, upload_id: str) -> bool:
+        """Abort a multipart upload and discard its parts."""
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket,
+                Key=object_name,
+                UploadId=upload_id
+            )
+            return True
+        except ClientError as e:
+            logger.error(f"Abort failed for {object_name}: {e}")
+            return False
+
     def get_presigned_url(
         self,
         object_name: str,
@@ -139,17 +251,35 @@ class StorageService:
             logger.error(f"Delete failed: {e}")
             return False
 
+    def list_objects(self, prefix: str = "") -> list:
+        """List objects (Key, Size, LastModified) with given prefix, across all pages."""
+        try:
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            objects = []
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                objects.extend(page.get('Contents', []))
+            return objects
+        except ClientError as e:
+            logger.error(f"List failed: {e}")
+            return []
+
     def list_files(self, prefix: str = "") -> list:
         """List files in S3/R2 with given prefix."""
+        return [obj['Key'] for obj in self.list_objects(prefix)]
+
+    def exists(self, object_name: str) -> bool:
+        """Check whether an object exists."""
         try:
-            response = self.s3_client.list_objects_v2(
+            self.s3_client.head_object(
                 Bucket=self.bucket,
-                Prefix=prefix
+                Key=object_name
             )
-            return [obj['Key'] for obj in response.get('Contents', [])]
+            return True
         except ClientError as e:
-            logger.error(f"List failed: {e}")
-            return []
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            logger.error(f"Failed to check {object_name}: {e}")
+            return False
 
     def get_file_size(self, object_name: str) -> Optional[int]:
         """Get file size in bytes."""
@@ -0,0 +1,186 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Dict, Any, List, Optional
+import hashlib
+import io
+import json
+import logging
+import shutil
+import threading
+import time
+from PIL import Image
+from app.config import settings
+from app.services.storage_service import storage_service
+from app.services.dataset_service import dataset_service
+from app.utils.phash import image_hashes
+from app.utils.video import probe, output_size, iter_frames, iter_segments
+
+logger = logging.getLogger(__name__)
+
+class VideoIngest:
+    """Derive training frames or clips from dataset videos, cached by source hash and parameters."""
+
+    CACHE_PREFIX = "derived/video"
+
+    def __init__(self):
+        self.work_dir = Path(settings.TEMP_PATH) / "video_segments"
+
+    def default_params(self) -> Dict[str, Any]:
+        return {
+            'mode': settings.DATASET_VIDEO_MODE,
+            'fps': settings.DATASET_VIDEO_FPS,
+            'max_side': settings.DATASET_VIDEO_MAX_SIDE,
+            'segment_seconds': settings.DATASET_VIDEO_SEGMENT_SECONDS,
+        }
+
+    def cache_id(self, sha256: str, params: Dict[str, Any]) -> str:
+        """Identity of a derivation: source content plus every output-affecting parameter."""
+        relevant = {k: v for k, v in params.items() if k != 'segment_seconds' or params['mode'] == 'segments'}
+        canonical = json.dumps({'source': sha256, **relevant}, sort_keys=True)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _cached(self, cache_id: str) -> Optional[Dict[str, Any]]:
+        """A previous derivation, if all of its outputs are still stored."""
+        data = storage_service.read_stream(f"{self.CACHE_PREFIX}/{cache_id}.json")
+        if data is None:
+            return None
+        record = json.loads(data)
+        if all(storage_service.exists(output['key']) for output in record['outputs']):
+            return record
+        return None
+
+    def _store_frame(self, frame: bytes, width: int, height: int) -> Dict[str, Any]:
+        image = Image.frombytes('RGB', (width, height), frame)
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', compress_level=3)
+        data = buffer.getvalue()
+        sha256 = hashlib.sha256(data).hexdigest()
+        return {
+            'key': dataset_service.store_blob(data, sha256, 'image/png'),
+            'sha256': sha256,
+            'size': len(data),
+            **image_hashes(image)
+        }
+
+    def _extract_frames(self, source: str, params: Dict[str, Any], width: int, height: int) -> List[Dict[str, Any]]:
+        """Decode frames in a stream and upload them while decoding continues."""
+        workers = settings.DATASET_UPLOAD_WORKERS
+        in_flight = threading.BoundedSemaphore(workers * 2)
+        futures = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for frame in iter_frames(source, params['fps'], width, height):
+                in_flight.acquire()
+                future = pool.submit(self._store_frame, frame, width, height)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+
+        return [
+            {**future.result(), 'time': round(index / params['fps'], 3), 'width': width, 'height': height}
+            for index, future in enumerate(futures)
+        ]
+
+    def _extract_segments(self, source: str, params: Dict[str, Any], width: int, height: int, cache_id: str) -> List[Dict[str, Any]]:
+        """Encode fixed-length clips, uploading and deleting each as soon as it is complete."""
+        out_dir = self.work_dir / cache_id
+        outputs = []
+        try:
+            for index, path in enumerate(iter_segments(source, out_dir, params['segment_seconds'], params['fps'], width, height)):
+                data = path.read_bytes()
+                path.unlink()
+                sha256 = hashlib.sha256(data).hexdigest()
+                outputs.append({
+                    'key': dataset_service.store_blob(data, sha256, 'video/mp4'),
+                    'sha256': sha256,
+                    'size': len(data),
+                    'time': round(index * params['segment_seconds'], 3),
+                    'width': width,
+                    'height': height
+                })
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        return outputs
+
+    def extract(self, name: str, entry: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Derive frames or segments from one video, reusing a cached derivation when possible.
+
+        ffmpeg reads the video straight from a presigned URL, so the source
+        is never downloaded in full.
+
+        Args:
+            name: Video filename in the manifest
+            entry: Its manifest entry
+            params: mode, fps, max_side and segment_seconds
+
+        Returns:
+            Dict with cache_id, cached, probe info, outputs and decode timings
+        """
+        start = time.perf_counter()
+        cache_id = self.cache_id(entry['sha256'], params)
+        record = self._cached(cache_id)
+        if record:
+            logger.info(f"Using cached {params['mode']} of {name} ({len(record['outputs'])} outputs)")
+            return {**record, 'cached': True, 'seconds': round(time.perf_counter() - start, 3)}
+
+        source = storage_service.get_presigned_url(entry['key'], expiration=6 * 3600)
+        if source is None:
+            raise ValueError(f"Could not access {entry['key']}")
+
+        info = probe(source)
+        width, height = output_size(info['width'], info['height'], params['max_side'])
+
+        if params['mode'] == 'segments':
+            outputs = self._extract_segments(source, params, width, height, cache_id)
+        else:
+            outputs = self._extract_frames(source, params, width, height)
+
+        elapsed = time.perf_counter() - start
+        record = {
+            'cache_id': cache_id,
+            'source': entry['sha256'],
+            'params': params,
+            'probe': info,
+            'outputs': outputs,
+        }
+        success = storage_service.upload_fileobj(
+            io.BytesIO(json.dumps(record).encode('utf-8')),
+            f"{self.CACHE_PREFIX}/{cache_id}.json",
+            content_type='application/json'
+        )
+        if not success:
+            logger.warning(f"Could not cache derivation {cache_id}")
+
+        decoded_frames = int(info['duration'] * info['fps'])
+        logger.info(f"Extracted {len(outputs)} {params['mode']} from {name} in {elapsed:.2f}s ({decoded_frames / elapsed:.1f} decoded fps)")
+        return {
+            **record,
+            'cached': False,
+            'seconds': round(elapsed, 3),
+            'decode_fps': round(decoded_frames / elapsed, 1) if elapsed > 0 else None,
+        }
+
+    def manifest_entries(self, name: str, result: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Manifest entries for a video's derived frames or segments."""
+        stem = PurePosixPath(name).stem
+        mode = result['params']['mode']
+        entries = {}
+        for index, output in enumerate(result['outputs']):
+            if mode == 'segments':
+                entries[f"{stem}_s{index:05d}.mp4"] = {
+                    **output,
+                    'media': 'video',
+                    'content_type': 'video/mp4',
+                    'has_caption': False,
+                    'derived_from': name,
+                }
+            else:
+                entries[f"{stem}_f{index:05d}.png"] = {
+                    **output,
+                    'content_type': 'image/png',
+                    'has_caption': False,
+                    'derived_from': name,
+                }
+        return entries
+
+# Global instance
+video_ingest = VideoIngest()
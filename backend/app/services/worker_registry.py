@@ -0,0 +1,144 @@
+from typing import Optional, Dict, Any, List, Tuple, Callable
+import json
+import logging
+import threading
+import time
+import redis
+from app.config import settings
+from app.services.generation_scheduler import generation_scheduler
+from app.utils.scheduling import route_job
+
+logger = logging.getLogger(__name__)
+
+class WorkerRegistry:
+    """
+    Generation workers and the models they hold, advertised in Redis.
+
+    Each worker consumes the shared generation queue plus its own queue. It
+    advertises its LoRA disk cache on a heartbeat and the LoRA in GPU memory
+    while it runs jobs. Submissions are routed to a worker that already holds
+    the job's LoRA, or to the least-loaded worker.
+    """
+
+    WORKERS_KEY = "genworker:all"
+
+    def __init__(self):
+        self.redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    def _key(self, worker_id: str) -> str:
+        return f"genworker:{worker_id}"
+
+    def _active_key(self, worker_id: str) -> str:
+        return f"genworker:{worker_id}:active"
+
+    def _stats_key(self, worker_id: str) -> str:
+        return f"genworker:{worker_id}:stats"
+
+    @staticmethod
+    def queue_name(worker_id: str) -> str:
+        return f"generation.{worker_id}"
+
+    def advertise(self, worker_id: str, base_model: str, cached_loras: List[str]):
+        """Publish (or refresh) a worker; it drops out if not refreshed within the TTL."""
+        pipe = self.redis_client.pipeline()
+        pipe.set(self._key(worker_id), json.dumps({
+            'id': worker_id,
+            'queue': self.queue_name(worker_id),
+            'base_model': base_model,
+            'cached_loras': cached_loras,
+            'updated_at': time.time(),
+        }), ex=settings.GENERATION_WORKER_TTL_SECONDS)
+        pipe.sadd(self.WORKERS_KEY, worker_id)
+        pipe.execute()
+
+    def set_active(self, worker_id: str, loaded_lora: Optional[str]):
+        """Record that a worker is running jobs, and which LoRA it has loaded."""
+        self.redis_client.set(
+            self._active_key(worker_id),
+            json.dumps({'loaded_lora': loaded_lora}),
+            ex=settings.GENERATION_WORKER_TTL_SECONDS
+        )
+
+    def clear_active(self, worker_id: str):
+        self.redis_client.delete(self._active_key(worker_id))
+
+    def start_heartbeat(
+        self,
+        worker_id: str,
+        base_model: str,
+        cached_loras: Callable[[], List[str]],
+        on_beat: Optional[Callable[[], None]] = None
+    ):
+        """Advertise from a daemon thread of the worker's main process, calling on_beat after each advert."""
+        def beat():
+            while True:
+                try:
+                    self.advertise(worker_id, base_model, cached_loras())
+                    if on_beat is not None:
+                        on_beat()
+                except Exception as e:
+                    logger.warning(f"Worker heartbeat failed: {e}")
+                time.sleep(settings.GENERATION_WORKER_TTL_SECONDS / 3)
+
+        threading.Thread(target=beat, name='generation-heartbeat', daemon=True).start()
+        logger.info(f"Advertising generation worker {worker_id} on queue {self.queue_name(worker_id)}")
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Live workers with their loaded LoRA, queued LoRAs and load."""
+        worker_ids = sorted(self.redis_client.smembers(self.WORKERS_KEY))
+        if not worker_ids:
+            return []
+
+        workers = []
+        adverts = self.redis_client.mget([self._key(w) for w in worker_ids])
+        actives = self.redis_client.mget([self._active_key(w) for w in worker_ids])
+        for worker_id, advert, active in zip(worker_ids, adverts, actives):
+            if advert is None:
+                # Heartbeat expired: the worker is gone
+                self.redis_client.srem(self.WORKERS_KEY, worker_id)
+                continue
+
+            worker = json.loads(advert)
+            worker['loaded_lora'] = json.loads(active)['loaded_lora'] if active else None
+            worker['queued_loras'] = sorted(generation_scheduler.lane_loras(worker_id))
+            worker['load'] = generation_scheduler.pending_count(worker_id) + (1 if active else 0)
+            workers.append(worker)
+        return workers
+
+    def route(self, lora_key: Optional[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Choose the worker for a job.
+
+        Args:
+            lora_key: LoRA storage path, None for base model jobs
+
+        Returns:
+            (worker, reason), or (None, None) if no worker advertises itself
+        """
+        workers = self.workers()
+        if not workers:
+            return None, None
+
+        worker, reason = route_job(workers, lora_key, settings.GENERATION_ROUTING_MAX_IMBALANCE)
+        self.redis_client.hincrby(self._stats_key(worker['id']), reason, 1)
+        return worker, reason
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-worker routing counts and LoRA hit rate."""
+        results = []
+        for worker in self.workers():
+            counts = {k: int(v) for k, v in self.redis_client.hgetall(self._stats_key(worker['id'])).items()}
+            lora_jobs = sum(counts.get(reason, 0) for reason in ('hot', 'warm', 'cold'))
+            results.append({
+                'id': worker['id'],
+                'loaded_lora': worker['loaded_lora'],
+                'cached_loras': len(worker['cached_loras']),
+                'load': worker['load'],
+                'routed': counts,
+                # Jobs that found their LoRA in GPU memory or on local disk
+                'hit_rate': round((counts.get('hot', 0) + counts.get('warm', 0)) / lora_jobs, 4) if lora_jobs else None,
+            })
+        return results
+
+# Global instance
+worker_registry = WorkerRegistry()
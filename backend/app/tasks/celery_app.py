@@ -13,7 +13,8 @@ celery_app = Celery(
     backend=settings.CELERY_RESULT_BACKEND,
     include=[
         'app.tasks.training_tasks',
-        'app.tasks.generation_tasks'
+        'app.tasks.generation_tasks',
+        'app.tasks.dataset_tasks'
     ]
 )
 
@@ -36,6 +37,7 @@ celery_app.conf.update(
 celery_app.conf.task_routes = {
     'app.tasks.training_tasks.*': {'queue': 'training'},
     'app.tasks.generation_tasks.*': {'queue': 'generation'},
+    'app.tasks.dataset_tasks.*': {'queue': 'datasets'},
 }
 
 logger.info("Celery app initialized")
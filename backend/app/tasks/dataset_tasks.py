@@ -0,0 +1,365 @@
+from celery import Task
+from app.tasks.celery_app import celery_app
+from app.models import SessionLocal
+from app.models.dataset import Dataset
+from app.services.dataset_service import dataset_service
+from app.services.dataset_manifest import DatasetManifest
+from app.utils.preprocessing import preprocess_image
+from app.utils.progress import progress_manager
+from app.services.caption_service import caption_service
+from app.services.video_ingest import video_ingest
+from app.captioners import create_captioner
+from app.config import settings
+from concurrent.futures import ThreadPoolExecutor
+import billiard
+import logging
+import traceback
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+class DatabaseTask(Task):
+    """Base task with database session management."""
+    _db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = SessionLocal()
+        return self._db
+
+    def after_return(self, *args, **kwargs):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+def _create_pool(workers: int):
+    """
+    Process pool across cores.
+
+    Celery's prefork workers are daemonic, and the standard library refuses
+    to start children from daemonic processes; billiard (Celery's fork of
+    multiprocessing) allows it. Threads are no substitute: hashing, EXIF
+    handling and the Python around PIL hold the GIL.
+    """
+    return billiard.Pool(processes=workers)
+
+# Left over from an earlier (failed) attempt; a new result replaces them
+ATTEMPT_FIELDS = ('error', 'timings')
+
+def _summarize_timings(results: list, wall_time: float, workers: int) -> dict:
+    """Aggregate per-image stage timings into a preprocessing report."""
+    succeeded = [r for r in results if 'error' not in r]
+    stages = {}
+    for result in succeeded:
+        for stage, seconds in result['timings'].items():
+            stages.setdefault(stage, []).append(seconds)
+
+    return {
+        'images': len(results),
+        'failed': len(results) - len(succeeded),
+        'workers': workers,
+        'wall_time': round(wall_time, 3),
+        'images_per_second': round(len(succeeded) / wall_time, 2) if wall_time > 0 else None,
+        'stage_mean': {k: round(sum(v) / len(v), 4) for k, v in stages.items()},
+        'stage_max': {k: round(max(v), 4) for k, v in stages.items()},
+    }
+
+@celery_app.task(bind=True, base=DatabaseTask, name='app.tasks.dataset_tasks.preprocess_dataset')
+def preprocess_dataset(self, dataset_id: str):
+    """
+    Preprocess all not-yet-processed images of a dataset on a pool of processes.
+
+    Args:
+        dataset_id: Dataset UUID
+    """
+    logger.info(f"Starting preprocessing for dataset {dataset_id}")
+
+    try:
+        dataset = self.db.query(Dataset).filter(Dataset.id == dataset_id).first()
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+
+        jobs = dataset_service.preprocess_jobs(dataset, DatasetManifest.load(dataset))
+        if not jobs:
+            logger.info(f"Dataset {dataset_id} has nothing to preprocess")
+            return {'dataset_id': dataset_id, 'status': 'completed', 'processed': 0}
+
+        workers = min(settings.DATASET_PREPROCESS_WORKERS or os.cpu_count() or 1, len(jobs))
+        progress_manager.set_progress(dataset_id, {
+            'status': 'processing',
+            'progress': 0,
+            'message': f'Preprocessing {len(jobs)} images on {workers} workers...'
+        })
+
+        # Each image is fetched, decoded and re-encoded independently
+        start = time.perf_counter()
+        results = []
+        with _create_pool(workers) as pool:
+            for result in pool.imap_unordered(preprocess_image, jobs):
+                results.append(result)
+                progress_manager.set_progress(dataset_id, {
+                    'status': 'processing',
+                    'progress': int(len(results) / len(jobs) * 100),
+                    'current_image': result['filename'],
+                    'image_time': result['timings'].get('total'),
+                })
+        wall_time = time.perf_counter() - start
+
+        report = _summarize_timings(results, wall_time, workers)
+        logger.info(f"Preprocessed {len(results)} images in {wall_time:.2f}s: {report}")
+
+        # Merge into the latest manifest (uploads or deletes may have landed meanwhile)
+        self.db.refresh(dataset)
+        succeeded = len(results) - report['failed']
+        with dataset_service.edit_manifest(dataset, f"Preprocessed {succeeded} images") as manifest:
+            for result in results:
+                entry = manifest.get(result['filename'])
+                if entry is not None:
+                    manifest.add(result['filename'], {
+                        **{k: v for k, v in entry.items() if k not in ATTEMPT_FIELDS},
+                        **{k: v for k, v in result.items() if k != 'filename'}
+                    })
+
+        metadata = dict(dataset.dataset_metadata or {})
+        metadata['preprocessing'] = report
+        dataset.dataset_metadata = metadata
+        self.db.commit()
+
+        progress_manager.set_progress(dataset_id, {
+            'status': 'completed',
+            'progress': 100,
+            'message': f"Preprocessed {len(results) - report['failed']}/{len(results)} images",
+            'report': report
+        })
+
+        return {
+            'dataset_id': dataset_id,
+            'status': 'completed',
+            'report': report,
+            'timings': {r['filename']: r['timings'] for r in results}
+        }
+
+    except Exception as e:
+        logger.error(f"Preprocessing failed: {str(e)}")
+        logger.error(traceback.format_exc())
+
+        progress_manager.set_progress(dataset_id, {
+            'status': 'failed',
+            'error': str(e)
+        })
+
+        raise
+
+@celery_app.task(bind=True, base=DatabaseTask, name='app.tasks.dataset_tasks.caption_dataset')
+def caption_dataset(self, dataset_id: str, trigger_word: str = None, overwrite: bool = False):
+    """
+    Caption a dataset's images and write .txt sidecars next to them.
+
+    Args:
+        dataset_id: Dataset UUID
+        trigger_word: Injected into every caption (defaults to the dataset's)
+        overwrite: Re-caption images that already have a caption
+    """
+    logger.info(f"Starting captioning for dataset {dataset_id}")
+
+    try:
+        dataset = self.db.query(Dataset).filter(Dataset.id == dataset_id).first()
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+
+        trigger_word = trigger_word or (dataset.dataset_metadata or {}).get('trigger_word')
+        manifest = DatasetManifest.load(dataset)
+        targets = {
+            name: entry
+            for name, entry in manifest.images()
+            if overwrite or not entry.get('has_caption')
+        }
+        if not targets:
+            logger.info(f"Dataset {dataset_id} has nothing to caption")
+            return {'dataset_id': dataset_id, 'status': 'completed', 'captioned': 0}
+
+        # Content hash identifies the image (legacy entries fall back to their key)
+        image_ids = {name: entry.get('sha256') or f"key:{entry['key']}" for name, entry in targets.items()}
+        images = {
+            image_ids[name]: entry.get('processed_key') or entry['key']
+            for name, entry in targets.items()
+        }
+
+        progress_manager.set_progress(dataset_id, {
+            'status': 'captioning',
+            'progress': 0,
+            'message': f'Captioning {len(targets)} images...'
+        })
+
+        def progress_callback(done: int, total: int):
+            progress_manager.set_progress(dataset_id, {
+                'status': 'captioning',
+                'progress': int(done / total * 100),
+                'message': f'Captioned {done}/{total} images'
+            })
+
+        captioner = create_captioner(settings.DATASET_CAPTIONER, {
+            'model_id': settings.DATASET_CAPTION_MODEL,
+            'batch_size': settings.DATASET_CAPTION_BATCH_SIZE,
+        })
+        start = time.perf_counter()
+        try:
+            result = caption_service.caption(captioner, images, progress_callback)
+        finally:
+            captioner.unload_model()
+        caption_time = time.perf_counter() - start
+
+        # Sidecars are tiny; upload them concurrently
+        captions = {**result['cached'], **result['captions']}
+        texts = {
+            name: caption_service.inject_trigger_word(captions[image_ids[name]], trigger_word)
+            for name in targets
+        }
+        with ThreadPoolExecutor(max_workers=settings.DATASET_SYNC_WORKERS) as pool:
+            fields = dict(zip(texts, pool.map(dataset_service.store_caption, texts.values())))
+
+        # Skip images deleted or replaced while captioning ran
+        self.db.refresh(dataset)
+        with dataset_service.edit_manifest(dataset, f"Captioned {len(fields)} images") as manifest:
+            for name, caption_fields in fields.items():
+                entry = manifest.get(name)
+                if entry is not None and entry.get('sha256') == targets[name].get('sha256'):
+                    manifest.update(name, {**caption_fields, 'caption_source': captioner.cache_id})
+
+        report = {
+            'images': len(targets),
+            'captioned': len(result['captions']),
+            'cached': len(result['cached']),
+            'captioner': captioner.cache_id,
+            'trigger_word': trigger_word,
+            'seconds': round(caption_time, 3),
+            'images_per_second': round(len(result['captions']) / caption_time, 2) if result['captions'] and caption_time > 0 else None,
+        }
+        metadata = dict(dataset.dataset_metadata or {})
+        metadata['captioning'] = report
+        dataset.dataset_metadata = metadata
+        self.db.commit()
+
+        progress_manager.set_progress(dataset_id, {
+            'status': 'completed',
+            'progress': 100,
+            'message': f"Captioned {len(targets)} images ({report['cached']} from cache)",
+            'report': report
+        })
+
+        return {'dataset_id': dataset_id, 'status': 'completed', 'report': report}
+
+    except Exception as e:
+        logger.error(f"Captioning failed: {str(e)}")
+        logger.error(traceback.format_exc())
+
+        progress_manager.set_progress(dataset_id, {
+            'status': 'failed',
+            'error': str(e)
+        })
+
+        raise
+
+@celery_app.task(bind=True, base=DatabaseTask, name='app.tasks.dataset_tasks.extract_videos')
+def extract_videos(self, dataset_id: str, params: dict = None, filenames: list = None):
+    """
+    Extract frames or segments from a dataset's videos.
+
+    Args:
+        dataset_id: Dataset UUID
+        params: mode, fps, max_side and segment_seconds (defaults from settings)
+        filenames: Videos to process (default: all source videos)
+    """
+    logger.info(f"Starting video extraction for dataset {dataset_id}")
+    params = {**video_ingest.default_params(), **(params or {})}
+
+    try:
+        dataset = self.db.query(Dataset).filter(Dataset.id == dataset_id).first()
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+
+        videos = {
+            name: entry
+            for name, entry in DatasetManifest.load(dataset).videos()
+            if not entry.get('derived_from') and (filenames is None or name in filenames)
+        }
+        if not videos:
+            logger.info(f"Dataset {dataset_id} has no videos to extract")
+            return {'dataset_id': dataset_id, 'status': 'completed', 'videos': 0}
+
+        results = {}
+        failed = {}
+        for i, (name, entry) in enumerate(videos.items()):
+            progress_manager.set_progress(dataset_id, {
+                'status': 'extracting',
+                'progress': int(i / len(videos) * 100),
+                'message': f'Extracting {params["mode"]} from {name} ({i + 1}/{len(videos)})'
+            })
+            try:
+                results[name] = video_ingest.extract(name, entry, params)
+            except Exception as e:
+                logger.error(f"Extraction failed for {name}: {e}")
+                failed[name] = str(e)
+
+        # Replace earlier derivations of the same videos
+        self.db.refresh(dataset)
+        added = 0
+        with dataset_service.edit_manifest(dataset, f"Extracted {params['mode']} from {len(results)} videos") as manifest:
+            for name, result in results.items():
+                if name not in manifest or manifest.get(name).get('sha256') != videos[name]['sha256']:
+                    continue
+                for derived in [n for n, e in manifest.items() if e.get('derived_from') == name]:
+                    manifest.remove(derived)
+                entries = video_ingest.manifest_entries(name, result)
+                for derived, derived_entry in entries.items():
+                    manifest.add(derived, derived_entry)
+                manifest.update(name, {
+                    'probe': result['probe'],
+                    'derived': {'cache_id': result['cache_id'], 'params': params, 'count': len(entries)}
+                })
+                added += len(entries)
+
+        report = {
+            'videos': len(videos),
+            'failed': failed,
+            'outputs': added,
+            'cached': sum(1 for r in results.values() if r['cached']),
+            'seconds': {name: r['seconds'] for name, r in results.items()},
+            'decode_fps': {name: r.get('decode_fps') for name, r in results.items() if not r['cached']},
+        }
+        metadata = dict(dataset.dataset_metadata or {})
+        metadata['video_extraction'] = report
+        dataset.dataset_metadata = metadata
+        self.db.commit()
+
+        progress_manager.set_progress(dataset_id, {
+            'status': 'completed',
+            'progress': 100,
+            'message': f"Extracted {added} {params['mode']} from {len(results)} videos",
+            'report': report
+        })
+
+        # New frames go through the usual image preprocessing
+        if params['mode'] == 'frames' and added:
+            preprocess_dataset.delay(dataset_id)
+
+        return {'dataset_id': dataset_id, 'status': 'completed', 'report': report}
+
+    except Exception as e:
+        logger.error(f"Video extraction failed: {str(e)}")
+        logger.error(traceback.format_exc())
+
+        progress_manager.set_progress(dataset_id, {
+            'status': 'failed',
+            'error': str(e)
+        })
+
+        raise
+
+@celery_app.task(bind=True, base=DatabaseTask, name='app.tasks.dataset_tasks.collect_blob_garbage')
+def collect_blob_garbage(self):
+    """Delete content-addressed blobs that no dataset version references."""
+    logger.info("Collecting unreferenced dataset blobs")
+    return dataset_service.collect_garbage(self.db)
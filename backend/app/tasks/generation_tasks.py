@@ -1,19 +1,50 @@
 from celery import Task
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import celeryd_after_setup
 from app.tasks.celery_app import celery_app
 from app.services.model_service import model_service
 from app.services.storage_service import storage_service
+from app.services.generation_cache import generation_cache, BASE_MODEL_ID
+from app.services.generation_scheduler import generation_scheduler
+from app.services.worker_registry import worker_registry
+from app.services.output_pipeline import output_pipeline
+from app.services.bulk_generation import bulk_generation
+from app.services.admission import admission_controller
+from app.generators.base_generator import GenerationCancelled
+from app.utils.progress import progress_manager
+from app.config import settings
 from app.models import SessionLocal
 from app.models.asset import GeneratedAsset
 from app.models.model import Model
+from contextlib import contextmanager
 from datetime import datetime
-from pathlib import Path
+from typing import Callable, Optional, Set
+from PIL import Image
+import base64
+import io
 import logging
+import os
+import signal
+import threading
 import traceback
 import uuid
 import time
 
 logger = logging.getLogger(__name__)
 
+@celeryd_after_setup.connect
+def register_generation_worker(sender, instance, **kwargs):
+    """Give each generation worker its own queue and advertise it for LoRA-aware routing."""
+    consumed = instance.app.amqp.queues.consume_from
+    if consumed and 'generation' not in consumed:
+        return
+
+    instance.app.amqp.queues.select_add(worker_registry.queue_name(sender))
+    worker_registry.start_heartbeat(
+        sender, BASE_MODEL_ID, model_service.cached_models,
+        on_beat=lambda: reclaim_stranded_jobs(sender)
+    )
+
 class DatabaseTask(Task):
     """Base task with database session management."""
     _db = None
@@ -29,24 +60,240 @@ class DatabaseTask(Task):
             self._db.close()
             self._db = None
 
-@celery_app.task(
-    bind=True,
-    base=DatabaseTask,
-    name='app.tasks.generation_tasks.generate_image',
-    time_limit=600,  # 10 minute hard limit
-    soft_time_limit=570  # 9.5 minute soft limit
-)
-def generate_image(self, job_id: str, config: dict):
+def _fail_job(db, job_id: str, error: Exception, uploads: list = ()):
+    """
+    Record a failed generation job on its progress stream and asset.
+
+    Args:
+        db: Database session
+        job_id: Generation job UUID
+        error: What went wrong
+        uploads: The job's output_pipeline futures; what they uploaded is deleted
+    """
+    logger.error(f"Generation failed: {str(error)}")
+    logger.error(traceback.format_exc())
+    progress_manager.set_progress(job_id, {'status': 'failed', 'error': str(error)})
+
+    # Update asset with error status
+    try:
+        db.rollback()
+        asset = db.query(GeneratedAsset).filter(
+            GeneratedAsset.id == job_id
+        ).first()
+
+        # A job that failed after completing (e.g. reporting progress) keeps its images
+        discard_outputs = bool(asset and uploads and (asset.parameters or {}).get('status') != 'completed')
+
+        if asset:
+            # Store error details in parameters
+            asset.parameters = {
+                **(asset.parameters or {}),
+                'status': 'failed',
+                'error': str(error),
+                'error_traceback': traceback.format_exc()
+            }
+            asset.completed_at = datetime.utcnow()
+
+            db.commit()
+            logger.info(f"Updated asset {job_id} with error status")
+        else:
+            logger.warning(f"Asset {job_id} not found for error update")
+
+    except Exception as update_error:
+        logger.error(f"Failed to update asset with error: {update_error}")
+        return
+
+    if discard_outputs:
+        # Nothing references a failed job's images (the cache only stores completed jobs)
+        try:
+            deleted = output_pipeline.discard(list(uploads), f"generated/{job_id}/")
+            logger.info(f"Deleted {deleted} uploaded objects of failed job {job_id}")
+        except Exception as cleanup_error:
+            logger.error(f"Failed to delete outputs of job {job_id}: {cleanup_error}")
+
+def _finish_generation(
+    db,
+    job_id: str,
+    uploads: list,
+    timing_metrics: dict,
+    cache_key: str,
+    generation_end: float,
+    start_time: float
+) -> dict:
+    """
+    Complete a job once all its images are uploaded, in one asset update.
+
+    Args:
+        db: Database session
+        job_id: Generation job UUID
+        uploads: output_pipeline futures, in image order
+        timing_metrics: Metrics so far (completed in place)
+        cache_key: Generation cache key, if any
+        generation_end: When the last image was handed to the pipeline
+        start_time: When the job started
+    """
+    results = [future.result() for future in uploads]  # Raises if an upload failed
+    storage_paths = [result['storage_path'] for result in results]
+    derivatives = [result['derivatives'] for result in results]
+
+    # Only the upload time left over after generation; the work done in the
+    # background is in encode_time / upload_busy_time
+    timing_metrics['upload_time'] = time.time() - generation_end
+    timing_metrics.update(output_pipeline.summarize(results))
+    timing_metrics['total_time'] = time.time() - start_time
+
+    logger.info(f"Upload completed {timing_metrics['upload_time']:.2f}s after generation")
+    logger.info(f"Total generation time: {timing_metrics['total_time']:.2f}s")
+
+    asset = db.query(GeneratedAsset).filter(GeneratedAsset.id == job_id).first()
+    if not asset:
+        raise ValueError(f"Generation job {job_id} not found")
+
+    # Update asset with success status
+    asset.storage_path = storage_paths[0] if storage_paths else ""
+    # Reassign (not mutate) so SQLAlchemy sees the JSON change
+    asset.parameters = {
+        **(asset.parameters or {}),
+        'status': 'completed',
+        'output_paths': storage_paths,
+        'derivatives': derivatives,
+        'timing_metrics': timing_metrics
+    }
+    asset.completed_at = datetime.utcnow()
+    db.commit()
+
+    if cache_key:
+        generation_cache.store(cache_key, job_id, storage_paths, derivatives)
+
+    # The job is done either way; a lost sample only delays the next refit
+    try:
+        admission_controller.record(asset.parameters, timing_metrics)
+    except Exception as e:
+        logger.warning(f"Failed to record cost model sample for job {job_id}: {e}")
+
+    progress_manager.set_progress(job_id, {
+        'status': 'completed',
+        'progress': 100,
+        'message': f"Generated {len(storage_paths)} images"
+    })
+    logger.info(f"Generation job {job_id} completed successfully")
+
+    return {
+        'job_id': job_id,
+        'status': 'completed',
+        'output_paths': storage_paths,
+        'timing_metrics': timing_metrics
+    }
+
+def _finish_generation_deferred(job_id: str, *args):
+    """_finish_generation on the output pipeline's thread, with its own session."""
+    db = SessionLocal()
+    try:
+        return _finish_generation(db, job_id, *args)
+    except Exception as e:
+        _fail_job(db, job_id, e, uploads=args[0])
+        raise
+    finally:
+        db.close()
+        generation_scheduler.finish(job_id)
+
+@contextmanager
+def _job_time_limit(seconds: float):
+    """
+    Raise SoftTimeLimitExceeded in the task if the block runs longer than seconds.
+
+    Queue tokens run many jobs under one task time limit, so each job gets
+    its own (a SIGALRM timer; celery's soft limit uses SIGUSR1). Only
+    available on the main thread, where prefork workers run tasks.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise SoftTimeLimitExceeded(f"Job exceeded the {seconds:.0f}s time limit")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _is_dead(live_workers: Set[str], worker_id: Optional[str] = None) -> Callable[[dict], bool]:
+    """Whether a running job's worker stopped advertising, or its process on this host (worker_id) is gone."""
+    def is_dead(entry: dict) -> bool:
+        if entry['worker'] not in live_workers:
+            return True
+        return entry['worker'] == worker_id and entry['pid'] != os.getpid() and not _pid_alive(entry['pid'])
+    return is_dead
+
+def reclaim_stranded_jobs(worker_id: Optional[str] = None):
+    """
+    Hand the jobs of departed workers and dead processes to the live workers.
+
+    Pending jobs in the lane of a worker that stopped advertising move to the
+    shared lane, with a shared token each. Jobs still recorded as running in
+    such a worker, or in a dead process of worker_id, get one shared token
+    that recovers them (failing them needs a database session, so it is not
+    done here). Runs on every worker heartbeat as well as on submission, so
+    stranded jobs do not wait for the next submission.
+    """
+    live_workers = {w['id'] for w in worker_registry.workers()}
+    if worker_id is not None:
+        live_workers.add(worker_id)
+
+    for _ in range(generation_scheduler.reclaim_lanes(live_workers)):
+        run_generation_queue.delay()
+    if generation_scheduler.needs_recovery(_is_dead(live_workers, worker_id)):
+        run_generation_queue.delay()
+
+def _recover_generation_jobs(db, worker_id: str):
+    """
+    Re-queue the jobs that departed workers or killed processes were running.
+
+    A job dispatched from the scheduler is only forgotten once it ends, so a
+    process killed by the task time limit or the OOM killer (or a worker
+    that went away) leaves it behind. Jobs already attempted
+    GenerationScheduler.MAX_ATTEMPTS times are failed instead.
+    """
+    live_workers = {w['id'] for w in worker_registry.workers()} | {worker_id}
+    requeued, exhausted = generation_scheduler.recover(_is_dead(live_workers, worker_id))
+    for _ in range(requeued):
+        run_generation_queue.delay()
+    for job_id in exhausted:
+        _fail_job(db, job_id, RuntimeError("Worker process died while running the job"))
+
+def _run_generation(self, job_id: str, config: dict, defer_output: bool = False) -> dict:
     """
     Generate images using Flux with optional LoRA.
 
+    Shared by generate_image and run_generation_queue; the model (and LoRA)
+    stay loaded between jobs run by the same task. Each image is PNG-encoded
+    and uploaded in the background as soon as it is decoded.
+
     Args:
+        self: Running DatabaseTask
         job_id: Generation job UUID
         config: Generation configuration dict
+        defer_output: Return once the images are generated and complete the
+            job when its uploads land, so they overlap with the next job
+            (the caller must output_pipeline.drain() before exiting)
     """
     logger.info(f"Starting image generation for job {job_id}")
     start_time = time.time()
     timing_metrics = {}
+    uploads = []
 
     try:
         # Get job from database
@@ -56,6 +303,8 @@ def generate_image(self, job_id: str, config: dict):
 
         if not asset:
             raise ValueError(f"Generation job {job_id} not found")
+        if progress_manager.is_cancel_requested(job_id):
+            raise GenerationCancelled("Cancelled before start")
 
         # Extract parameters
         prompt = config['prompt']
@@ -71,6 +320,23 @@ def generate_image(self, job_id: str, config: dict):
         logger.info(f"Prompt: {prompt}")
         logger.info(f"Parameters: images={num_images}, steps={num_inference_steps}, guidance={guidance_scale}")
 
+        # An identical job may have finished while this one was queued
+        cache_key = config.get('cache_key')
+        cached = generation_cache.lookup(cache_key)
+        if cached:
+            timing_metrics['cache_hit'] = True
+            timing_metrics['total_time'] = time.time() - start_time
+            generation_cache.complete(asset, cache_key, cached, 'late_hits', timing_metrics)
+            self.db.commit()
+
+            logger.info(f"Generation job {job_id} served from cache (source {cached['job_id']})")
+            return {
+                'job_id': job_id,
+                'status': 'completed',
+                'output_paths': cached['output_paths'],
+                'timing_metrics': timing_metrics
+            }
+
         # Get generator with error handling
         model_load_start = time.time()
         try:
@@ -91,14 +357,12 @@ def generate_image(self, job_id: str, config: dict):
                 raise ValueError(f"Model {model_id} not found")
 
             try:
-                # Unload any existing LoRA before loading new one
-                if generator.lora_loaded:
-                    logger.info("Unloading previous LoRA")
-                    generator.unload_lora()
-
+                # Reuses the LoRA if it is already loaded, otherwise swaps it in
+                # The file the job was cached and routed against, even if
+                # the model was compressed since (older jobs lack the key)
                 generator = model_service.load_lora_for_generation(
                     model_id=str(model.id),
-                    storage_path=model.storage_path,
+                    storage_path=config.get('lora_key') or model.generation_path,
                     weight=lora_weight
                 )
 
@@ -108,16 +372,49 @@ def generate_image(self, job_id: str, config: dict):
                 raise ValueError(f"Failed to load LoRA {model.name}: {str(e)}")
 
             timing_metrics['lora_load_time'] = time.time() - lora_load_start
+            timing_metrics.update(model_service.last_lora_metrics)
             logger.info(f"LoRA loaded in {timing_metrics['lora_load_time']:.2f}s")
-
-        # Create output directory
-        output_dir = Path(f"/tmp/masuka/generated/{job_id}")
-        output_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            model_service.unload_lora()
+
+        # Refinement of a draft: start from its (upscaled) image
+        init_image = None
+        if config.get('init_image'):
+            data = storage_service.read_stream(config['init_image'])
+            if data is None:
+                raise ValueError(f"Draft image {config['init_image']} not found")
+            init_image = Image.open(io.BytesIO(data))
+
+        latest_preview = {}
+
+        def on_image(index: int, image):
+            # Encoded and uploaded while the rest of the batch decodes
+            uploads.append(output_pipeline.submit(image, f"generated/{job_id}/image_{index+1}.png"))
+
+        def on_preview(step: int, jpeg: bytes):
+            # Sent with the following step updates until the next preview replaces it
+            latest_preview.update({
+                'preview': f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode('ascii')}",
+                'preview_step': step
+            })
+
+        def on_step(step: int, total_steps: int):
+            # Checked between denoising steps, so a cancel takes effect within one step
+            if progress_manager.is_cancel_requested(job_id):
+                raise GenerationCancelled(f"Cancelled at step {step}/{total_steps}")
+            progress_manager.set_progress(job_id, {
+                'status': 'generating',
+                'progress': int(step / total_steps * 100),
+                'current_step': step,
+                'total_steps': total_steps,
+                'message': f"Denoising step {step}/{total_steps}",
+                **latest_preview
+            })
 
         # Generate images
         generation_start = time.time()
         logger.info("Starting generation...")
-        output_paths = generator.generate(
+        generator.generate(
             prompt=prompt,
             negative_prompt=config.get('negative_prompt'),
             num_images=num_images,
@@ -126,78 +423,525 @@ def generate_image(self, job_id: str, config: dict):
             width=width,
             height=height,
             seed=seed,
-            output_dir=str(output_dir)
+            on_step=on_step,
+            on_preview=on_preview,
+            preview_interval=config.get('preview_interval') or 0,
+            on_image=on_image,
+            init_image=init_image,
+            strength=config.get('strength', 0.6)
         )
-        timing_metrics['generation_time'] = time.time() - generation_start
-        logger.info(f"Generated {len(output_paths)} images in {timing_metrics['generation_time']:.2f}s")
-
-        # Upload to storage
-        upload_start = time.time()
-        storage_paths = []
-        for i, local_path in enumerate(output_paths):
-            storage_path = f"generated/{job_id}/image_{i+1}.png"
-            success = storage_service.upload_file(
-                local_path,
-                storage_path,
-                content_type='image/png'
-            )
+        generation_end = time.time()
+        timing_metrics['generation_time'] = generation_end - generation_start
+        timing_metrics.update(generator.last_metrics)
+        logger.info(f"Generated {len(uploads)} images in {timing_metrics['generation_time']:.2f}s")
+
+        finish_args = (uploads, timing_metrics, cache_key, generation_end, start_time)
+        if defer_output:
+            progress_manager.set_progress(job_id, {
+                'status': 'uploading',
+                'progress': 100,
+                'message': f"Uploading {len(uploads)} images"
+            })
+            output_pipeline.when_done(uploads, lambda: _finish_generation_deferred(job_id, *finish_args))
+            return {'job_id': job_id, 'status': 'uploading', 'timing_metrics': timing_metrics}
+
+        return _finish_generation(self.db, job_id, *finish_args)
+
+    except GenerationCancelled as e:
+        logger.info(f"Generation job {job_id} cancelled: {e}")
+        self.db.rollback()
+        asset = self.db.query(GeneratedAsset).filter(GeneratedAsset.id == job_id).first()
+        if asset:
+            asset.parameters = {
+                **(asset.parameters or {}),
+                'status': 'cancelled',
+                'cancel_reason': str(e),
+                'timing_metrics': {**timing_metrics, 'total_time': time.time() - start_time}
+            }
+            asset.completed_at = datetime.utcnow()
+            self.db.commit()
+
+        progress_manager.clear_cancel(job_id)
+        progress_manager.set_progress(job_id, {'status': 'cancelled', 'message': str(e)})
+        return {'job_id': job_id, 'status': 'cancelled'}
+
+    except Exception as e:
+        _fail_job(self.db, job_id, e, uploads=uploads)
+        raise
+
+@celery_app.task(
+    bind=True,
+    base=DatabaseTask,
+    name='app.tasks.generation_tasks.generate_image',
+    time_limit=600,  # 10 minute hard limit
+    soft_time_limit=570  # 9.5 minute soft limit
+)
+def generate_image(self, job_id: str, config: dict):
+    """
+    Generate images for one job, bypassing the scheduler.
+
+    Args:
+        job_id: Generation job UUID
+        config: Generation configuration dict
+    """
+    return _run_generation(self, job_id, config)
 
-            if success:
-                storage_paths.append(storage_path)
-                logger.info(f"Uploaded to {storage_path}")
+@celery_app.task(
+    bind=True,
+    base=DatabaseTask,
+    name='app.tasks.generation_tasks.run_generation_queue',
+    time_limit=3600,  # Several jobs back to back
+    soft_time_limit=3540
+)
+def run_generation_queue(self):
+    """
+    Run pending generation jobs, preferring the LoRA already loaded.
+
+    Each submitted job queues one of these tokens (on the shared queue, or on
+    the queue of the worker it was routed to). A token runs jobs from this
+    worker's lane, then the shared lane, until both are empty or the batch
+    limits are hit, so a token whose job was already run by an earlier batch
+    exits immediately. A job's uploads finish while the next one denoises.
+    Each job is stopped (and failed) after GENERATION_JOB_TIME_LIMIT_SECONDS,
+    and jobs left running by a killed process are re-queued first.
+    """
+    start_time = time.time()
+    worker_id = self.request.hostname
+    jobs_run = 0
+    _recover_generation_jobs(self.db, worker_id)
 
-        timing_metrics['upload_time'] = time.time() - upload_start
-        timing_metrics['total_time'] = time.time() - start_time
+    try:
+        while (
+            jobs_run < settings.GENERATION_AFFINITY_MAX_JOBS
+            and time.time() - start_time < settings.GENERATION_AFFINITY_MAX_SECONDS
+        ):
+            job = generation_scheduler.next_job(model_service.resident_lora_id(), lane=worker_id, pid=os.getpid())
+            if job is None:
+                break
+
+            job_id, config = job
+            result = None
+            try:
+                with _job_time_limit(settings.GENERATION_JOB_TIME_LIMIT_SECONDS):
+                    result = _run_generation(self, job_id, config, defer_output=True)
+            except Exception:
+                # Already recorded on the job's asset; carry on with the next one
+                self.db.rollback()
+            if not result or result['status'] != 'uploading':
+                # Jobs still uploading are finished by their completion callback
+                generation_scheduler.finish(job_id)
+            jobs_run += 1
+
+            resident = model_service.resident_lora
+            worker_registry.set_active(worker_id, resident['storage_path'] if resident else None)
+    finally:
+        worker_registry.clear_active(worker_id)
+        # The process exits after this task; let the last jobs' uploads land
+        output_pipeline.drain()
+
+    logger.info(f"Generation queue token ran {jobs_run} jobs in {time.time() - start_time:.2f}s")
+    return {'jobs': jobs_run, 'total_time': time.time() - start_time}
 
-        logger.info(f"Upload completed in {timing_metrics['upload_time']:.2f}s")
-        logger.info(f"Total generation time: {timing_metrics['total_time']:.2f}s")
+@celery_app.task(
+    bind=True,
+    base=DatabaseTask,
+    name='app.tasks.generation_tasks.generate_sweep',
+    time_limit=3600,  # 1 hour hard limit (longer sweeps are split, see GENERATION_MAX_SWEEP_SECONDS)
+    soft_time_limit=3540
+)
+def generate_sweep(self, sweep_id: str, config: dict):
+    """
+    Generate a seed x LoRA-weight grid, one image per cell job.
+
+    The LoRA is loaded once, unfused, and only its scale changes between
+    rows; the prompt encoding is reused. Images are uploaded in the
+    background and each cell's asset is completed once its image lands.
+
+    Args:
+        sweep_id: Sweep UUID (progress key)
+        config: Shared generation config plus 'cells' to generate
+            ([{job_id, seed, lora_weight, cache_key}]); a sweep split to fit
+            the time limit runs as several tasks, 'part' of 'parts'
+    """
+    part, parts = config.get('part', 0), config.get('parts', 1)
+    logger.info(f"Starting generation sweep {sweep_id}" + (f" (part {part + 1}/{parts})" if parts > 1 else ""))
+    start_time = time.time()
+    cells = config['cells']
+    total = len(cells)
+    done_message = f"Sweep completed: {total} images" if part == parts - 1 else f"Sweep part {part + 1}/{parts} completed: {total} images"
+    completed = 0
+    shared_metrics = {}
+
+    def assets_for(job_ids):
+        return {
+            str(asset.id): asset
+            for asset in self.db.query(GeneratedAsset).filter(GeneratedAsset.id.in_(job_ids)).all()
+        }
+
+    def report(message):
+        progress_manager.set_progress(sweep_id, {
+            # Only the last part finishes the sweep
+            'status': 'completed' if completed == total and part == parts - 1 else 'generating',
+            'progress': int(completed / total * 100),
+            'completed': completed,
+            'total': total,
+            'part': part + 1,
+            'parts': parts,
+            'message': message
+        })
 
-        # Update asset with success status
-        asset.storage_path = storage_paths[0] if storage_paths else ""
-        if asset.parameters is None:
-            asset.parameters = {}
-        asset.parameters['status'] = 'completed'
-        asset.parameters['output_paths'] = storage_paths
-        asset.parameters['timing_metrics'] = timing_metrics
-        asset.completed_at = datetime.utcnow()
+    try:
+        assets = assets_for([cell['job_id'] for cell in cells])
+
+        # Identical jobs may have finished while this one was queued
+        pending = []
+        for cell in cells:
+            cached = generation_cache.lookup(cell['cache_key'])
+            asset = assets.get(cell['job_id'])
+            if cached and asset:
+                generation_cache.complete(
+                    asset, cell['cache_key'], cached, 'late_hits',
+                    {'cache_hit': True, 'total_time': time.time() - start_time}
+                )
+                completed += 1
+            elif asset:
+                pending.append(cell)
         self.db.commit()
 
-        logger.info(f"Generation job {job_id} completed successfully")
+        if pending and progress_manager.is_cancel_requested(sweep_id):
+            # An earlier part of the sweep was cancelled
+            raise GenerationCancelled(f"Sweep cancelled before part {part + 1}/{parts}")
+        if not pending:
+            report(done_message)
+            return {'sweep_id': sweep_id, 'status': 'completed', 'images': total, 'total_time': time.time() - start_time}
+        report('Loading model...')
+
+        model_load_start = time.time()
+        generator = model_service.get_generator('flux')
+        shared_metrics['model_load_time'] = time.time() - model_load_start
+
+        model_id = config.get('model_id')
+        if model_id:
+            model = self.db.query(Model).filter(Model.id == model_id).first()
+            if not model:
+                raise ValueError(f"Model {model_id} not found")
+
+            lora_load_start = time.time()
+            generator = model_service.load_lora_for_generation(
+                model_id=str(model.id),
+                storage_path=config.get('lora_key') or model.generation_path,
+                weight=pending[0]['lora_weight'] if pending else 0.8,
+                fuse=False
+            )
+            shared_metrics['lora_load_time'] = time.time() - lora_load_start
+            shared_metrics.update(model_service.last_lora_metrics)
+
+        by_cell = {(cell['lora_weight'], cell['seed']): cell for cell in pending}
+        in_flight = []  # (cell, upload future, seconds, handed over at)
+
+        def complete_cell(cell, result, seconds, handed_over):
+            nonlocal completed
+            job_id = cell['job_id']
+            storage_path = result['storage_path']
+
+            asset = assets[job_id]
+            asset.storage_path = storage_path
+            asset.parameters = {
+                **(asset.parameters or {}),
+                'status': 'completed',
+                'output_paths': [storage_path],
+                'derivatives': [result['derivatives']],
+                'timing_metrics': {
+                    **shared_metrics,
+                    **generator.last_metrics,
+                    **output_pipeline.summarize([result]),
+                    'generation_time': seconds,
+                    'upload_time': time.time() - handed_over,
+                    'total_time': time.time() - start_time
+                }
+            }
+            asset.completed_at = datetime.utcnow()
+            self.db.commit()
+
+            if cell['cache_key']:
+                generation_cache.store(cell['cache_key'], job_id, [storage_path], [result['derivatives']])
+
+            completed += 1
+            report(f"Generated {completed}/{total} images")
+
+        def complete_uploaded(wait_all: bool = False):
+            # Cells are completed from this thread only (one DB session)
+            for entry in list(in_flight):
+                cell, future, seconds, handed_over = entry
+                if wait_all or future.done():
+                    in_flight.remove(entry)
+                    complete_cell(cell, future.result(), seconds, handed_over)
+
+        def on_image(weight, seed, image, seconds):
+            cell = by_cell[(weight, seed)]
+            future = output_pipeline.submit(image, f"generated/{cell['job_id']}/image_1.png")
+            in_flight.append((cell, future, seconds, time.time()))
+            complete_uploaded()
+
+        def on_step(step: int, total_steps: int):
+            # Cancelling any cell (or the sweep) stops the rest of the sweep
+            if progress_manager.is_cancel_requested(sweep_id):
+                raise GenerationCancelled(f"Sweep cancelled after {completed}/{total} images")
+            # Cells of the previous batch land while this one denoises
+            complete_uploaded()
+
+        # One call per weight row, so only the seeds still missing are generated
+        weights = list(dict.fromkeys(cell['lora_weight'] for cell in pending))
+        for weight in weights:
+            generator.generate_sweep(
+                prompt=config['prompt'],
+                seeds=[cell['seed'] for cell in pending if cell['lora_weight'] == weight],
+                lora_weights=[weight] if weight is not None else None,
+                num_inference_steps=config.get('num_inference_steps', 30),
+                guidance_scale=config.get('guidance_scale', 3.5),
+                width=config.get('width', 1024),
+                height=config.get('height', 1024),
+                batch_size=settings.GENERATION_SWEEP_BATCH_SIZE,
+                on_image=on_image,
+                on_step=on_step
+            )
+        complete_uploaded(wait_all=True)
+
+        report(done_message)
+        logger.info(f"Generation sweep {sweep_id} completed in {time.time() - start_time:.2f}s")
 
         return {
-            'job_id': job_id,
+            'sweep_id': sweep_id,
             'status': 'completed',
-            'output_paths': storage_paths,
-            'timing_metrics': timing_metrics
+            'images': total,
+            'total_time': time.time() - start_time
         }
 
     except Exception as e:
-        logger.error(f"Generation failed: {str(e)}")
-        logger.error(traceback.format_exc())
-
-        # Update asset with error status
+        cancelled = isinstance(e, GenerationCancelled)
+        if cancelled:
+            logger.info(f"Generation sweep {sweep_id} cancelled: {e}")
+            if part == parts - 1:
+                # Later parts check the flag before they start
+                progress_manager.clear_cancel(sweep_id)
+        else:
+            logger.error(f"Generation sweep failed: {str(e)}")
+            logger.error(traceback.format_exc())
+
+        # Fail (or cancel) the cells that did not finish
         try:
-            asset = self.db.query(GeneratedAsset).filter(
-                GeneratedAsset.id == job_id
-            ).first()
-
-            if asset:
-                # Store error details in parameters
-                if asset.parameters is None:
-                    asset.parameters = {}
-
-                asset.parameters['status'] = 'failed'
-                asset.parameters['error'] = str(e)
-                asset.parameters['error_traceback'] = traceback.format_exc()
+            self.db.rollback()
+            for asset in assets_for([cell['job_id'] for cell in cells]).values():
+                if (asset.parameters or {}).get('status') != 'completed':
+                    outcome = {'status': 'cancelled', 'cancel_reason': str(e)} if cancelled else {
+                        'status': 'failed',
+                        'error': str(e),
+                        'error_traceback': traceback.format_exc()
+                    }
+                    asset.parameters = {**(asset.parameters or {}), **outcome}
+                    asset.completed_at = datetime.utcnow()
+            self.db.commit()
+        except Exception as update_error:
+            logger.error(f"Failed to update sweep assets with error: {update_error}")
+
+        progress_manager.set_progress(sweep_id, {
+            'status': 'cancelled' if cancelled else 'failed',
+            'progress': int(completed / total * 100),
+            'completed': completed,
+            'total': total,
+            'error': str(e)
+        })
+        if cancelled:
+            return {'sweep_id': sweep_id, 'status': 'cancelled', 'images': completed}
+        raise
+
+@celery_app.task(
+    bind=True,
+    base=DatabaseTask,
+    name='app.tasks.generation_tasks.run_bulk_generation',
+    time_limit=3600,  # Runs are sliced well below this (GENERATION_BULK_SLICE_SECONDS)
+    soft_time_limit=3540
+)
+def run_bulk_generation(self, bulk_id: str):
+    """
+    Work through a bulk generation plan, one pipeline call per batch.
+
+    Groups of the same LoRA run back to back with the LoRA loaded once,
+    unfused (weights switch without reloading). Finished jobs are written
+    in one commit per batch. After GENERATION_BULK_SLICE_SECONDS the task
+    re-queues itself so other jobs on the worker get a turn, and a pause
+    request stops it between batches; either way jobs that are already
+    finished are skipped when the run continues.
+
+    Args:
+        bulk_id: Bulk run UUID (see bulk_generation)
+    """
+    if not bulk_generation.claim(bulk_id):
+        logger.info(f"Bulk generation {bulk_id} is already running")
+        return {'bulk_id': bulk_id, 'status': 'running'}
+
+    start_time = time.time()
+    # Released before the run re-queues itself, so the next slice can claim it
+    try:
+        status = bulk_generation.status(bulk_id)
+        if status not in ('queued', 'running'):
+            # Paused (or finished) while this task was queued
+            if status == 'pausing':
+                bulk_generation.set_status(bulk_id, 'paused')
+            return {'bulk_id': bulk_id, 'status': status}
+        bulk_generation.set_status(bulk_id, 'running')
+
+        plan = bulk_generation.plan(bulk_id)
+        assets = {
+            str(asset.id): asset
+            for asset in self.db.query(GeneratedAsset).filter(
+                GeneratedAsset.id.in_([item['job_id'] for group in plan for batch in group['batches'] for item in batch])
+            ).all()
+        }
+        finished = {
+            job_id for job_id, asset in assets.items()
+            if (asset.parameters or {}).get('status') in ('completed', 'failed', 'cancelled')
+        }
+        in_flight = []  # (item, upload future, generation seconds)
+        generated = 0
+        stopped = None
+        resume_lora_key = None
+
+        def fail(items, error):
+            for item in items:
+                asset = assets.get(item['job_id'])
+                if asset:
+                    asset.parameters = {**(asset.parameters or {}), 'status': 'failed', 'error': str(error)}
+                    asset.completed_at = datetime.utcnow()
+            self.db.commit()
+            bulk_generation.record(bulk_id, failed=len(items))
+
+        def flush(wait_all: bool = False):
+            # Complete the jobs whose image has landed, in one commit
+            nonlocal generated
+            ready = [entry for entry in in_flight if wait_all or entry[1].done()]
+            if not ready:
+                return
+
+            completed = []
+            failed = []
+            for entry in ready:
+                in_flight.remove(entry)
+                item, future, seconds = entry
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed.append((item, e))
+                    continue
+
+                asset = assets[item['job_id']]
+                asset.storage_path = result['storage_path']
+                asset.parameters = {
+                    **(asset.parameters or {}),
+                    'status': 'completed',
+                    'output_paths': [result['storage_path']],
+                    'derivatives': [result['derivatives']],
+                    'timing_metrics': {**output_pipeline.summarize([result]), 'generation_time': seconds}
+                }
                 asset.completed_at = datetime.utcnow()
+                completed.append((item, result))
 
-                self.db.commit()
-                logger.info(f"Updated asset {job_id} with error status")
-            else:
-                logger.warning(f"Asset {job_id} not found for error update")
+            self.db.commit()
+            for item, result in completed:
+                if item.get('cache_key'):
+                    generation_cache.store(item['cache_key'], item['job_id'], [result['storage_path']], [result['derivatives']])
+            for item, error in failed:
+                fail([item], error)
+            generated += len(completed)
+            bulk_generation.record(bulk_id, completed=len(completed))
 
-        except Exception as update_error:
-            logger.error(f"Failed to update asset with error: {update_error}")
+        try:
+            generator = model_service.get_generator('flux')
 
-        # Re-raise original exception
-        raise
+            for group in plan:
+                pending = [[item for item in batch if item['job_id'] not in finished] for batch in group['batches']]
+                pending = [batch for batch in pending if batch]
+                if not pending:
+                    continue
+
+                try:
+                    if group['model_id']:
+                        generator = model_service.load_lora_for_generation(
+                            model_id=group['model_id'],
+                            storage_path=pending[0][0]['lora_key'],
+                            weight=group['lora_weight'],
+                            fuse=False
+                        )
+                    else:
+                        model_service.unload_lora()
+                except Exception as e:
+                    logger.error(f"Bulk generation {bulk_id}: failed to load LoRA {group['model_id']}: {e}")
+                    fail([item for batch in pending for item in batch], f"Failed to load LoRA: {e}")
+                    continue
+
+                for batch in pending:
+                    if bulk_generation.status(bulk_id) == 'pausing':
+                        stopped = 'paused'
+                    elif time.time() - start_time > settings.GENERATION_BULK_SLICE_SECONDS:
+                        stopped = 'queued'
+                        resume_lora_key = batch[0]['lora_key']
+                    if stopped:
+                        break
+
+                    batch_start = time.time()
+                    handed_over = set()
+
+                    def on_image(index: int, image):
+                        item = batch[index]
+                        handed_over.add(item['job_id'])
+                        future = output_pipeline.submit(image, f"generated/{item['job_id']}/image_1.png")
+                        in_flight.append((item, future, (time.time() - batch_start) / len(batch)))
+
+                    try:
+                        generator.generate_batch(
+                            prompts=[item['prompt'] for item in batch],
+                            seeds=[item['seed'] for item in batch],
+                            num_inference_steps=group['num_inference_steps'],
+                            guidance_scale=group['guidance_scale'],
+                            width=group['width'],
+                            height=group['height'],
+                            on_image=on_image,
+                            # The previous batch's jobs complete while this one denoises
+                            on_step=lambda step, total_steps: flush()
+                        )
+                    except Exception as e:
+                        logger.error(f"Bulk generation {bulk_id}: batch failed: {e}")
+                        fail([item for item in batch if item['job_id'] not in handed_over], e)
+                    flush()
+
+                if stopped:
+                    break
+
+            flush(wait_all=True)
+
+        except Exception as e:
+            logger.error(f"Bulk generation {bulk_id} failed: {str(e)}")
+            logger.error(traceback.format_exc())
+            self.db.rollback()
+            bulk_generation.set_status(bulk_id, 'failed')
+            bulk_generation.add_active_time(bulk_id, time.time() - start_time)
+            raise
+
+        elapsed = time.time() - start_time
+        bulk_generation.add_active_time(bulk_id, elapsed)
+    finally:
+        bulk_generation.release(bulk_id)
+
+    if stopped == 'queued':
+        # Continue later, behind whatever queued up on the workers meanwhile
+        bulk_generation.set_status(bulk_id, 'queued')
+        worker, _ = worker_registry.route(resume_lora_key)
+        run_bulk_generation.apply_async((bulk_id,), **({'queue': worker['queue']} if worker else {}))
+    elif stopped == 'paused':
+        bulk_generation.set_status(bulk_id, 'paused')
+    else:
+        bulk_generation.finish(bulk_id)
+        stopped = 'completed'
+
+    logger.info(f"Bulk generation {bulk_id}: {generated} images in {elapsed:.2f}s ({stopped})")
+    return {'bulk_id': bulk_id, 'status': stopped, 'images': generated, 'total_time': elapsed}
@@ -4,11 +4,19 @@ from app.trainers.flux_trainer import FluxTrainer
 from app.models import SessionLocal
 from app.models.training import TrainingSession
 from app.models.model import Model
+from app.models.dataset import Dataset
 from app.services.storage_service import storage_service
+from app.services.dataset_manifest import DatasetManifest
+from app.services.dataset_sync import dataset_sync
+from app.services.dataset_service import dataset_service
 from app.utils.progress import progress_manager
+from app.utils.lora_compression import compress_lora_file, compact_path, measure_load_time
+from app.config import settings
 from datetime import datetime
 from pathlib import Path
 import logging
+import shutil
+import time
 import traceback
 
 logger = logging.getLogger(__name__)
@@ -61,6 +69,37 @@ def train_flux_lora(self, session_id: str, config: dict):
             'message': 'Initializing training...'
         })
 
+        # Materialize the dataset locally; unchanged files cost no transfer
+        if not config.get('dataset_path'):
+            dataset = self.db.query(Dataset).filter(Dataset.id == config['dataset_id']).first()
+            if not dataset:
+                raise ValueError(f"Dataset {config['dataset_id']} not found")
+
+            progress_manager.set_progress(session_id, {
+                'status': 'training',
+                'progress': 0,
+                'message': 'Syncing dataset...'
+            })
+
+            # Train on the pinned version even if the dataset changed since
+            if config.get('dataset_version') is not None:
+                manifest = dataset_service.manifest_at(self.db, dataset, config['dataset_version'])
+            else:
+                manifest = DatasetManifest.load(dataset)
+
+            sync_result = dataset_sync.sync(
+                dataset,
+                manifest,
+                config.get('resolution') or settings.DEFAULT_RESOLUTION
+            )
+            config = {
+                **config,
+                'dataset_path': sync_result['path'],
+                'prebucketed': sync_result['prebucketed']
+            }
+            session.config = {**session.config, 'dataset_sync': sync_result}
+            self.db.commit()
+
         # Progress callback
         def progress_callback(step: int, total_steps: int, loss: float = None):
             # Update database
@@ -112,7 +151,7 @@ def train_flux_lora(self, session_id: str, config: dict):
                 storage_path=storage_path,
                 file_size_mb=int(file_size_mb),
                 trigger_word=config.get('trigger_word'),
-                metadata={
+                model_metadata={
                     'training_params': {
                         'learning_rate': config.get('learning_rate'),
                         'steps': result['final_step'],
@@ -129,6 +168,9 @@ def train_flux_lora(self, session_id: str, config: dict):
         session.completed_at = datetime.utcnow()
         self.db.commit()
 
+        if result['checkpoints'] and settings.LORA_COMPACT_ENABLED:
+            compress_lora.delay(str(model.id))
+
         # Update progress
         progress_manager.set_progress(session_id, {
             'status': 'completed',
@@ -200,3 +242,84 @@ def cancel_training(self, session_id: str):
     except Exception as e:
         logger.error(f"Failed to cancel training: {str(e)}")
         raise
+
+@celery_app.task(bind=True, base=DatabaseTask, name='app.tasks.training_tasks.compress_lora')
+def compress_lora(self, model_id: str):
+    """
+    Make a compact copy of a trained LoRA for distribution and loading.
+
+    Each layer is cut to the lowest rank within LORA_COMPACT_MAX_ERROR and
+    stored as LORA_COMPACT_DTYPE. The copy is uploaded next to the original
+    and recorded in the model's metadata with its size and load-time
+    savings; generation loads it instead of the original
+    (Model.generation_path) unless it saves less than LORA_COMPACT_MIN_SAVING.
+
+    Args:
+        model_id: Model UUID
+    """
+    model = self.db.query(Model).filter(Model.id == model_id).first()
+    if not model:
+        raise ValueError(f"Model {model_id} not found")
+
+    work_dir = Path(settings.TEMP_PATH) / 'lora_compact' / model_id
+    work_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        original = work_dir / 'original.safetensors'
+        if not storage_service.download_file(model.storage_path, str(original)):
+            raise Exception(f"Failed to download model from {model.storage_path}")
+
+        compact = work_dir / 'compact.safetensors'
+        start_time = time.time()
+        report = compress_lora_file(
+            str(original), str(compact),
+            max_error=settings.LORA_COMPACT_MAX_ERROR,
+            dtype=settings.LORA_COMPACT_DTYPE
+        )
+        original_size = original.stat().st_size
+        compact_size = compact.stat().st_size
+        report.update({
+            'compress_time': round(time.time() - start_time, 2),
+            'original_file_bytes': original_size,
+            'compact_file_bytes': compact_size,
+            'size_saving': round(1 - compact_size / original_size, 4),
+            # Parse time from local disk (download time shrinks with the file size)
+            'original_load_time': round(measure_load_time(str(original)), 4),
+            'compact_load_time': round(measure_load_time(str(compact)), 4),
+        })
+
+        previous = (model.model_metadata or {}).get('compact') or {}
+        storage_path = None
+        if report['size_saving'] >= settings.LORA_COMPACT_MIN_SAVING:
+            storage_path = compact_path(model.storage_path)
+            if not storage_service.upload_file(str(compact), storage_path, content_type='application/octet-stream'):
+                raise Exception("Failed to upload compact model to storage")
+        else:
+            logger.info(f"Compact LoRA {model_id} saves only {report['size_saving']:.1%}; keeping the original")
+            if previous.get('storage_path'):
+                storage_service.delete_file(previous['storage_path'])
+
+        model.model_metadata = {
+            **(model.model_metadata or {}),
+            'compact': {
+                'storage_path': storage_path,
+                'file_size_mb': round(compact_size / (1024 * 1024), 2),
+                **report
+            }
+        }
+        self.db.commit()
+
+        logger.info(
+            f"Compacted LoRA {model_id}: {original_size / (1024 * 1024):.1f}MB -> {compact_size / (1024 * 1024):.1f}MB, "
+            f"rank {report['original_rank']} -> {report['ranks']['min']}-{report['ranks']['max']}, "
+            f"load {report['original_load_time']:.2f}s -> {report['compact_load_time']:.2f}s"
+        )
+        return {'model_id': model_id, 'storage_path': storage_path, **report}
+
+    except Exception as e:
+        # The original stays in use
+        logger.error(f"LoRA compaction failed for model {model_id}: {e}")
+        logger.error(traceback.format_exc())
+        raise
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,139 @@
+import math
+import os
+import logging
+from collections import Counter
+from typing import List, Tuple, Optional, Dict, Any
+from app.config import settings
+from app.utils.buckets import assign_bucket, bucket_key
+
+logger = logging.getLogger(__name__)
+
+# Rough memory model for Flux LoRA training (fp8 base, gradient checkpointing)
+BASE_VRAM_GB = 14.0  # Quantized transformer, LoRA params, optimizer states
+VRAM_PER_MEGAPIXEL_GB = 6.0  # Activations per sample at 1024x1024
+VRAM_HEADROOM = 0.9  # Keep 10% free for allocator fragmentation
+
+MAX_BATCH_SIZE = 8
+TARGET_EFFECTIVE_BATCH = 4
+TARGET_SAMPLES_PER_IMAGE = 100  # How many times each image is seen during training
+MIN_STEPS = 300
+MAX_STEPS = 4000
+TARGET_CHECKPOINTS = 5
+MAX_NUM_WORKERS = 8
+# Share of images that may sit in aspect buckets too small to fill a batch
+# before the batch size is lowered for them
+MAX_UNDERFILLED_SHARE = 0.1
+
+# Fixed costs before the first step (model load, latent caching)
+STARTUP_SECONDS = 240
+LATENT_CACHE_SECONDS_PER_IMAGE = 1.5
+
+def _round_to(value: float, multiple: int) -> int:
+    """Round to the nearest multiple (at least one multiple)."""
+    return max(multiple, int(round(value / multiple)) * multiple)
+
+def _aspect_buckets(image_sizes: List[Tuple[int, int]], resolution: int) -> Dict[str, int]:
+    """Count images per resolution bucket."""
+    counts = Counter()
+    for width, height in image_sizes:
+        if width and height:
+            counts[bucket_key(assign_bucket(width, height, resolution))] += 1
+    return dict(counts)
+
+def plan_training(
+    image_count: int,
+    resolution: int,
+    image_sizes: Optional[List[Tuple[int, int]]] = None,
+    vram_gb: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Pick batch size, accumulation, dataloader workers, steps and save cadence.
+
+    Args:
+        image_count: Number of training images
+        resolution: Target training resolution (square side in pixels)
+        image_sizes: Optional (width, height) per image for aspect bucketing
+        vram_gb: GPU memory budget (default: settings.TRAINING_VRAM_GB)
+
+    Returns:
+        Training plan dict including an estimated wall time
+    """
+    if image_count <= 0:
+        raise ValueError("Dataset has no images")
+
+    vram_gb = vram_gb or settings.TRAINING_VRAM_GB
+    megapixels = (resolution * resolution) / (1024 * 1024)
+    notes = []
+
+    # Largest batch that fits the VRAM budget
+    per_sample_gb = VRAM_PER_MEGAPIXEL_GB * megapixels
+    available_gb = vram_gb * VRAM_HEADROOM - BASE_VRAM_GB
+    fits = int(available_gb // per_sample_gb) if available_gb > 0 else 0
+    if fits < 1:
+        notes.append(f"VRAM budget of {vram_gb}GB is tight for {resolution}px, using batch size 1")
+        fits = 1
+    batch_size = 2 ** int(math.log2(min(fits, MAX_BATCH_SIZE)))
+
+    # Batches are formed per aspect bucket, so the batch is sized against the
+    # buckets: a few odd-aspect images in buckets smaller than the batch do not
+    # cut it for everyone else, only a sizeable share of them does
+    buckets = _aspect_buckets(image_sizes or [], resolution)
+    bucketed = sum(buckets.values())
+    while batch_size > 1 and bucketed:
+        underfilled = sum(count for count in buckets.values() if count < batch_size)
+        if underfilled <= bucketed * MAX_UNDERFILLED_SHARE:
+            break
+        batch_size //= 2
+    batch_size = max(1, min(batch_size, image_count))
+    small_buckets = sorted(key for key, count in buckets.items() if count < batch_size)
+    if small_buckets:
+        underfilled = sum(buckets[key] for key in small_buckets)
+        notes.append(
+            f"{underfilled} image(s) in aspect buckets smaller than the batch of {batch_size} "
+            f"({', '.join(small_buckets)}) may be skipped by the trainer; crop them to a common aspect to keep them"
+        )
+
+    # Reach the target effective batch through accumulation
+    target_effective = min(TARGET_EFFECTIVE_BATCH, image_count)
+    gradient_accumulation_steps = max(1, math.ceil(target_effective / batch_size))
+    effective_batch_size = batch_size * gradient_accumulation_steps
+
+    # Scale steps with dataset size
+    steps = math.ceil(image_count * TARGET_SAMPLES_PER_IMAGE / effective_batch_size)
+    steps = min(MAX_STEPS, max(MIN_STEPS, _round_to(steps, 50)))
+
+    save_every_n_steps = _round_to(steps / TARGET_CHECKPOINTS, 50)
+
+    # Latents are cached, so workers mostly feed tensors; more than two per sample is wasted
+    num_workers = max(1, min(os.cpu_count() or 1, batch_size * 2, MAX_NUM_WORKERS))
+
+    # Wall time estimate
+    seconds_per_step = effective_batch_size * megapixels * settings.TRAINING_SECONDS_PER_MEGAPIXEL
+    startup_seconds = STARTUP_SECONDS + image_count * LATENT_CACHE_SECONDS_PER_IMAGE
+    training_seconds = steps * seconds_per_step
+
+    plan = {
+        'image_count': image_count,
+        'resolution': resolution,
+        'aspect_buckets': buckets,
+        'batch_size': batch_size,
+        'gradient_accumulation_steps': gradient_accumulation_steps,
+        'effective_batch_size': effective_batch_size,
+        'num_workers': num_workers,
+        'steps': steps,
+        'save_every_n_steps': save_every_n_steps,
+        'vram_budget_gb': vram_gb,
+        'estimated_vram_gb': round(BASE_VRAM_GB + batch_size * per_sample_gb, 1),
+        'estimated_seconds': {
+            'startup': round(startup_seconds),
+            'training': round(training_seconds),
+            'total': round(startup_seconds + training_seconds),
+        },
+        'notes': notes,
+    }
+
+    logger.info(
+        f"Training plan: {image_count} images @ {resolution}px -> batch={batch_size}, "
+        f"accum={gradient_accumulation_steps}, steps={steps}, ~{plan['estimated_seconds']['total']}s"
+    )
+    return plan
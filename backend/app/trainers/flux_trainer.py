@@ -24,6 +24,10 @@ class FluxTrainer(BaseTrainer):
         self.resolution = config.get('resolution', settings.DEFAULT_RESOLUTION)
         self.trigger_word = config.get('trigger_word', '')
         self.save_every_n_steps = config.get('save_every_n_steps', 250)
+        self.batch_size = config.get('batch_size', 1)
+        self.gradient_accumulation_steps = config.get('gradient_accumulation_steps', 1)
+        self.num_workers = config.get('num_workers', 2)
+        self.prebucketed = config.get('prebucketed', False)
 
         # Paths
         self.simpletuner_path = Path(settings.SIMPLETUNER_PATH)
@@ -72,7 +76,7 @@ class FluxTrainer(BaseTrainer):
                 'num_train_epochs': 1,
                 'max_train_steps': self.steps,
                 'save_steps': self.save_every_n_steps,
-                'gradient_accumulation_steps': 1,
+                'gradient_accumulation_steps': self.gradient_accumulation_steps,
                 'mixed_precision': 'bf16',
                 'gradient_checkpointing': True,
             },
@@ -88,8 +92,8 @@ class FluxTrainer(BaseTrainer):
                 'resolution': self.resolution,
                 'caption_ext': 'txt',
                 'cache_latents': True,
-                'batch_size': 1,
-                'num_workers': 2,
+                'batch_size': self.batch_size,
+                'num_workers': self.num_workers,
             },
             'output': {
                 'output_dir': str(self.output_path),
@@ -98,6 +102,10 @@ class FluxTrainer(BaseTrainer):
             },
         }
 
+        # Images were resized and cropped to their buckets at ingest
+        if self.prebucketed:
+            config_dict['data']['crop'] = False
+
         # Create output directory
         Path(self.output_path).mkdir(parents=True, exist_ok=True)
 
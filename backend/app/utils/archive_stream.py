@@ -0,0 +1,203 @@
+import gzip
+import lzma
+import queue
+import struct
+import tarfile
+import threading
+import zlib
+from typing import Iterator, Tuple, Optional
+
+# What a truncated or corrupt archive raises while being read
+ARCHIVE_ERRORS = (ValueError, tarfile.TarError, zlib.error, EOFError, struct.error, gzip.BadGzipFile, lzma.LZMAError)
+
+ZIP_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+ZIP_LOCAL_SIGNATURE = 0x04034b50
+ZIP_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+ZIP64_EXTRA_ID = 0x0001
+READ_CHUNK = 64 * 1024
+
+class QueueReader:
+    """
+    Blocking file-like reader fed chunk by chunk from another thread.
+
+    The queue is bounded, so a fast producer waits for the consumer instead of
+    buffering the whole stream.
+    """
+
+    def __init__(self, max_chunks: int = 32):
+        self._queue = queue.Queue(max_chunks)
+        self._buffer = bytearray()
+        self._eof = False
+        self._aborted = threading.Event()
+        self.bytes_read = 0
+
+    def feed(self, chunk: Optional[bytes]) -> bool:
+        """Queue a chunk (None marks the end); returns False once the consumer gave up."""
+        while not self._aborted.is_set():
+            try:
+                self._queue.put(chunk, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def try_feed(self, chunk: Optional[bytes]) -> bool:
+        """Queue a chunk without blocking; returns False if the queue is full."""
+        try:
+            self._queue.put_nowait(chunk)
+            return True
+        except queue.Full:
+            return False
+
+    def abort(self):
+        """Stop accepting chunks (called by the consumer on error)."""
+        self._aborted.set()
+
+    @property
+    def aborted(self) -> bool:
+        return self._aborted.is_set()
+
+    def drain(self):
+        """Discard the rest of the stream (e.g. a ZIP central directory)."""
+        while self.read(READ_CHUNK):
+            pass
+
+    def read(self, n: int = -1) -> bytes:
+        while (n < 0 or len(self._buffer) < n) and not self._eof:
+            chunk = self._queue.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer.extend(chunk)
+
+        n = len(self._buffer) if n < 0 else min(n, len(self._buffer))
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        self.bytes_read += n
+        return data
+
+class _PushbackStream:
+    """Reader that can return over-read bytes to the front of the stream."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._pending = b''
+
+    def read(self, n: int = -1) -> bytes:
+        if self._pending:
+            if n < 0:
+                data, self._pending = self._pending + self._stream.read(), b''
+                return data
+            data, self._pending = self._pending[:n], self._pending[n:]
+            if len(data) < n:
+                data += self._stream.read(n - len(data))
+            return data
+        return self._stream.read(n)
+
+    def unread(self, data: bytes):
+        self._pending = data + self._pending
+
+def _read_exact(stream, n: int) -> bytes:
+    data = stream.read(n)
+    if len(data) != n:
+        raise ValueError("Unexpected end of archive")
+    return data
+
+def _zip64_sizes(extra: bytes, usize: int, csize: int) -> Tuple[int, int, bool]:
+    """Real sizes from a ZIP64 extra field (for entries over 4 GiB), and whether it is present."""
+    offset = 0
+    while offset + 4 <= len(extra):
+        field_id, length = struct.unpack_from('<HH', extra, offset)
+        if field_id == ZIP64_EXTRA_ID:
+            values = list(struct.unpack_from(f'<{length // 8}Q', extra, offset + 4))
+            if usize == 0xFFFFFFFF and values:
+                usize = values.pop(0)
+            if csize == 0xFFFFFFFF and values:
+                csize = values.pop(0)
+            return usize, csize, True
+        offset += 4 + length
+    return usize, csize, False
+
+def _inflate_until_end(stream: _PushbackStream, max_size: int) -> bytes:
+    """Inflate a deflate stream of unknown length, returning what was read past its end."""
+    decompressor = zlib.decompressobj(-15)
+    output = bytearray()
+    while not decompressor.eof:
+        chunk = stream.read(READ_CHUNK)
+        if not chunk:
+            raise ValueError("Unexpected end of archive")
+        output.extend(decompressor.decompress(chunk))
+        if len(output) > max_size:
+            raise ValueError("Archive entry too large")
+    stream.unread(decompressor.unused_data)
+    return bytes(output)
+
+def iter_zip(stream, max_entry_size: int) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yield (name, data) for each file of a ZIP read front to back.
+
+    Only local headers are used, so the central directory at the end of the
+    archive is never needed.
+    """
+    stream = _PushbackStream(stream)
+    while True:
+        signature = stream.read(4)
+        if len(signature) < 4 or struct.unpack('<I', signature)[0] != ZIP_LOCAL_SIGNATURE:
+            # Central directory (or end of stream): no more entries
+            return
+
+        header = ZIP_LOCAL_HEADER.unpack(signature + _read_exact(stream, ZIP_LOCAL_HEADER.size - 4))
+        _, _, flags, method, _, _, crc, csize, usize, name_length, extra_length = header
+        name = _read_exact(stream, name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = _read_exact(stream, extra_length)
+        usize, csize, zip64 = _zip64_sizes(extra, usize, csize)
+
+        if flags & 0x1:
+            raise ValueError(f"Encrypted entry {name} is not supported")
+        if method not in (0, 8):
+            raise ValueError(f"Unsupported compression for {name}")
+
+        if flags & 0x8:
+            # Sizes follow the data; only deflate marks its own end
+            if method != 8:
+                raise ValueError(f"Cannot stream stored entry {name} with a data descriptor")
+            data = _inflate_until_end(stream, max_entry_size)
+            descriptor = _read_exact(stream, 4)
+            if descriptor == ZIP_DESCRIPTOR_SIGNATURE:
+                descriptor = _read_exact(stream, 4)
+            crc = struct.unpack('<I', descriptor)[0]
+            # Compressed and uncompressed sizes, 8 bytes each for ZIP64
+            _read_exact(stream, 16 if zip64 else 8)
+        else:
+            if usize > max_entry_size:
+                raise ValueError(f"Archive entry {name} too large")
+            raw = _read_exact(stream, csize)
+            # Bound the output even if the header lies about the size
+            data = raw if method == 0 else zlib.decompressobj(-15).decompress(raw, max_entry_size + 1)
+            if len(data) > max_entry_size:
+                raise ValueError(f"Archive entry {name} too large")
+
+        if zlib.crc32(data) != crc:
+            raise ValueError(f"CRC mismatch for {name}")
+
+        if not name.endswith('/'):
+            yield name, data
+
+def iter_tar(stream, max_entry_size: int) -> Iterator[Tuple[str, bytes]]:
+    """Yield (name, data) for each regular file of a (possibly compressed) tar stream."""
+    with tarfile.open(fileobj=stream, mode='r|*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            if member.size > max_entry_size:
+                raise ValueError(f"Archive entry {member.name} too large")
+            yield member.name, tar.extractfile(member).read()
+
+def iter_archive(stream, max_entry_size: int) -> Iterator[Tuple[str, bytes]]:
+    """Yield (name, data) for each file of a ZIP or tar stream, detected from its first bytes."""
+    stream = _PushbackStream(stream)
+    magic = stream.read(4)
+    stream.unread(magic)
+    if magic == b'PK\x03\x04':
+        return iter_zip(stream, max_entry_size)
+    return iter_tar(stream, max_entry_size)
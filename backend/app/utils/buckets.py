@@ -0,0 +1,76 @@
+from collections import Counter
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, List, Tuple
+import hashlib
+import math
+from PIL import Image
+
+BUCKET_STEP = 64  # Latent-friendly side multiple
+MAX_ASPECT_RATIO = 2.0
+
+def bucket_sizes(resolution: int, step: int = BUCKET_STEP, max_ratio: float = MAX_ASPECT_RATIO) -> List[Tuple[int, int]]:
+    """
+    List (width, height) buckets with roughly resolution² pixels.
+
+    Sides are multiples of `step` and aspect ratios stay within [1/max_ratio, max_ratio].
+    """
+    target_area = resolution * resolution
+    sizes = set()
+
+    # Landscape buckets, mirrored so portrait images get the same choices
+    width = resolution
+    while width <= resolution * max_ratio:
+        height = int(round(target_area / width / step)) * step
+        if height >= step and width / height <= max_ratio:
+            sizes.add((width, height))
+            sizes.add((height, width))
+        width += step
+
+    return sorted(sizes, key=lambda s: s[0] / s[1])
+
+def assign_bucket(width: int, height: int, resolution: int) -> Tuple[int, int]:
+    """Pick the bucket whose aspect ratio is closest to the image's (in log space)."""
+    log_ratio = math.log(width / height)
+    return min(
+        bucket_sizes(resolution),
+        key=lambda s: abs(math.log(s[0] / s[1]) - log_ratio)
+    )
+
+def bucket_key(bucket: Tuple[int, int]) -> str:
+    """String form of a bucket, e.g. '832x1216'."""
+    return f"{bucket[0]}x{bucket[1]}"
+
+def resize_to_bucket(image: Image.Image, bucket: Tuple[int, int]) -> Image.Image:
+    """Scale an image to cover the bucket, then center-crop to it."""
+    target_w, target_h = bucket
+    scale = max(target_w / image.width, target_h / image.height)
+    resized_w = max(target_w, round(image.width * scale))
+    resized_h = max(target_h, round(image.height * scale))
+    resized = image.resize((resized_w, resized_h), Image.LANCZOS)
+
+    left = (resized_w - target_w) // 2
+    top = (resized_h - target_h) // 2
+    return resized.crop((left, top, left + target_w, top + target_h))
+
+def output_stems(names: Iterable[str]) -> Dict[str, str]:
+    """
+    File stem of each image in a training directory (image and caption share it).
+
+    An image keeps its own stem unless another image has the same one
+    (img.jpg and img.png, or 001.jpg in two folders); those get their folder
+    and extension folded in (a_001_jpg), so no output overwrites another.
+    """
+    names = list(names)
+    stems = {name: PurePosixPath(name).stem for name in names}
+    counts = Counter(stems.values())
+    for name in names:
+        if counts[stems[name]] > 1:
+            stems[name] = name.replace('/', '_').replace('.', '_')
+
+    # Folding can still clash (a_b.jpg vs a/b.jpg); a name hash settles it
+    seen = set()
+    for name in sorted(names):
+        if stems[name] in seen:
+            stems[name] = f"{stems[name]}_{hashlib.sha1(name.encode()).hexdigest()[:8]}"
+        seen.add(stems[name])
+    return stems
@@ -0,0 +1,58 @@
+from itertools import groupby
+from typing import Dict, Any, List, Optional, Tuple
+
+# Images in a group can be denoised in one pipeline call and share a LoRA state
+GROUP_FIELDS = ('model_id', 'lora_weight', 'width', 'height', 'num_inference_steps', 'guidance_scale')
+
+def group_key(item: Dict[str, Any]) -> Tuple:
+    return tuple(item.get(field) for field in GROUP_FIELDS)
+
+def _order(key: Tuple) -> Tuple:
+    # Base model first, then each LoRA's weights together, so a LoRA is loaded once
+    model_id, lora_weight = key[0], key[1]
+    return (model_id is not None, model_id or '', lora_weight if lora_weight is not None else 0.0, key[2:])
+
+def batch_size_for(width: int, height: int, batch_megapixels: float, max_batch: int) -> int:
+    """Images per pipeline call: as many as fit the pixel budget (at least one)."""
+    return max(1, min(max_batch, int(batch_megapixels * 1_000_000 // (width * height))))
+
+def plan_bulk(items: List[Dict[str, Any]], batch_megapixels: float, max_batch: int) -> List[Dict[str, Any]]:
+    """
+    Group bulk generation images into batches that can run together.
+
+    Images with the same LoRA, weight, resolution, steps and guidance form a
+    group; groups of one LoRA are adjacent so it is loaded once (weights
+    switch without reloading), and each group is cut into batches sized to
+    the pixel budget. Submission order is kept within a group.
+
+    Args:
+        items: One dict per image, with job_id, prompt, seed and GROUP_FIELDS
+        batch_megapixels: Pixels denoised per pipeline call
+        max_batch: Upper bound on images per call
+
+    Returns:
+        Groups: {GROUP_FIELDS..., 'batches': [[item, ...], ...]}
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(group_key(item), []).append(item)
+
+    plan = []
+    for key in sorted(groups, key=_order):
+        members = groups[key]
+        size = batch_size_for(key[2], key[3], batch_megapixels, max_batch)
+        plan.append({
+            **dict(zip(GROUP_FIELDS, key)),
+            'batches': [members[i:i + size] for i in range(0, len(members), size)]
+        })
+    return plan
+
+def plan_summary(plan: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Counts describing a plan: images, groups, pipeline calls and LoRA loads."""
+    loras: List[Optional[str]] = [model_id for model_id, _ in groupby(group['model_id'] for group in plan)]
+    return {
+        'images': sum(len(batch) for group in plan for batch in group['batches']),
+        'groups': len(plan),
+        'batches': sum(len(group['batches']) for group in plan),
+        'lora_loads': sum(1 for model_id in loras if model_id is not None),
+    }
@@ -0,0 +1,155 @@
+from statistics import median
+from typing import Dict, Any, List, Optional, Iterable, Set
+import math
+import numpy as np
+
+# LoRA load tiers, as recorded in timing_metrics['lora_tier'], and what they
+# cost until measured
+DEFAULT_LORA_SECONDS = {'resident': 0.0, 'ram': 2.0, 'disk': 5.0, 'download': 20.0}
+DEFAULT_OVERHEAD_SECONDS = 5.0  # Prompt encoding, VAE decode, bookkeeping
+MIN_SAMPLES = 10  # Below this the prior is used as is
+PRIOR_WEIGHT = 1.0  # Ridge pull towards the prior; only matters where samples don't constrain the fit
+
+# Routing reasons (route_job) -> LoRA tier the job will load from
+ROUTE_TIERS = {'hot': 'resident', 'warm': 'disk', 'cold': 'download', 'base': None}
+
+def job_features(width: int, height: int, steps: float, images: int) -> List[float]:
+    """
+    Regression features of a job: [1, work, work * megapixels].
+
+    Work is denoising steps x images x megapixels. Attention cost grows with
+    the square of the token count, so per-step time grows faster than the
+    pixel count at large resolutions; the second term captures that.
+    """
+    megapixels = width * height / 1_000_000
+    work = steps * images * megapixels
+    return [1.0, work, work * megapixels]
+
+def prior_model(seconds_per_step_megapixel: float, model_load_seconds: float) -> Dict[str, Any]:
+    return {
+        'coefficients': [DEFAULT_OVERHEAD_SECONDS, seconds_per_step_megapixel, 0.0],
+        'lora_seconds': dict(DEFAULT_LORA_SECONDS),
+        'model_load_seconds': model_load_seconds,
+        'samples': 0,
+        'mean_abs_error': None,
+    }
+
+def fit_cost_model(samples: List[Dict[str, Any]], prior: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fit job runtime to resolution, steps and batch size, plus LoRA load costs.
+
+    Runtime is least squares over job_features, pulled towards the prior
+    (ridge) so that directions the samples don't cover (e.g. every job at
+    1024x1024) keep the prior's slope instead of going wild. LoRA and model
+    load times are the median per tier.
+
+    Args:
+        samples: Measured jobs: width, height, steps, images, seconds (time
+            on the GPU excluding LoRA and model loads), lora_tier,
+            lora_seconds, model_load_seconds
+        prior: Model used where samples are missing (see prior_model)
+
+    Returns:
+        Model: coefficients, lora_seconds {tier: seconds}, model_load_seconds,
+        samples and mean_abs_error (seconds, on the samples)
+    """
+    model = {**prior, 'lora_seconds': dict(prior['lora_seconds'])}
+
+    by_tier: Dict[str, List[float]] = {}
+    for sample in samples:
+        if sample.get('lora_tier'):
+            by_tier.setdefault(sample['lora_tier'], []).append(sample['lora_seconds'])
+    for tier, values in by_tier.items():
+        model['lora_seconds'][tier] = median(values)
+
+    # Only the first job of a worker task loads the model; the rest find it resident
+    loads = [s['model_load_seconds'] for s in samples if s.get('model_load_seconds', 0) > 1.0]
+    if loads:
+        model['model_load_seconds'] = median(loads)
+
+    model['samples'] = len(samples)
+    if len(samples) < MIN_SAMPLES:
+        return model
+
+    x = np.array([job_features(s['width'], s['height'], s['steps'], s['images']) for s in samples])
+    y = np.array([s['seconds'] for s in samples])
+    beta_prior = np.array(prior['coefficients'])
+    regularizer = PRIOR_WEIGHT * np.eye(x.shape[1])
+    beta = np.linalg.solve(x.T @ x + regularizer, x.T @ y + regularizer @ beta_prior)
+
+    # Time never falls with more work
+    model['coefficients'] = [float(c) for c in np.maximum(beta, 0.0)]
+    model['mean_abs_error'] = float(np.mean(np.abs(x @ np.array(model['coefficients']) - y)))
+    return model
+
+def predict_seconds(
+    model: Dict[str, Any],
+    width: int,
+    height: int,
+    steps: float,
+    images: int,
+    lora_tier: Optional[str] = None
+) -> float:
+    """Predicted runtime of a job once started, including its LoRA load."""
+    runtime = sum(c * f for c, f in zip(model['coefficients'], job_features(width, height, steps, images)))
+    if lora_tier:
+        runtime += model['lora_seconds'].get(lora_tier, DEFAULT_LORA_SECONDS['download'])
+    return runtime
+
+def max_images_within(
+    model: Dict[str, Any],
+    width: int,
+    height: int,
+    steps: float,
+    lora_tier: Optional[str],
+    limit: float
+) -> int:
+    """Most images one job can render within limit seconds (0 if not even one)."""
+    fixed = predict_seconds(model, width, height, steps, 0, lora_tier)
+    per_image = predict_seconds(model, width, height, steps, 1) - predict_seconds(model, width, height, steps, 0)
+    if fixed + per_image > limit:
+        return 0
+    return int((limit - fixed) // per_image) if per_image > 0 else 1_000_000
+
+def split_counts(images: int, per_job: int) -> List[int]:
+    """Split images into as few jobs of at most per_job as possible, evenly sized."""
+    jobs = math.ceil(images / per_job)
+    return [images // jobs + (1 if i < images % jobs else 0) for i in range(jobs)]
+
+def queue_seconds(
+    model: Dict[str, Any],
+    jobs: Iterable[Dict[str, Any]],
+    loaded_lora: Optional[str],
+    cached_loras: Set[str]
+) -> float:
+    """
+    Predicted time to run queued jobs in order on one worker.
+
+    Each job pays its LoRA load given what the job before it left loaded and
+    what is on the worker's disk (a downloaded LoRA stays there).
+
+    Args:
+        model: Fitted cost model
+        jobs: Pending jobs oldest first, each with 'config' and 'lora_key'
+        loaded_lora: LoRA the worker holds now
+        cached_loras: LoRAs on the worker's local disk
+    """
+    cached = set(cached_loras)
+    total = 0.0
+    for job in jobs:
+        config = job['config']
+        lora_key = job.get('lora_key')
+        tier = None
+        if lora_key:
+            tier = 'resident' if lora_key == loaded_lora else 'disk' if lora_key in cached else 'download'
+            cached.add(lora_key)
+        loaded_lora = lora_key
+        total += predict_seconds(
+            model,
+            config.get('width', 1024),
+            config.get('height', 1024),
+            config.get('num_inference_steps', 30),
+            config.get('num_images', 1),
+            tier
+        )
+    return total
@@ -0,0 +1,62 @@
+import io
+import logging
+from functools import lru_cache
+from pathlib import PurePosixPath
+from typing import Dict, Tuple
+from PIL import Image
+from app.config import settings
+
+try:
+    import pillow_avif  # noqa: F401 - registers AVIF with Pillow < 11.2
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {'webp': 'webp', 'avif': 'avif', 'jpeg': 'jpg'}
+FORMAT_CONTENT_TYPES = {'webp': 'image/webp', 'avif': 'image/avif', 'jpeg': 'image/jpeg'}
+FORMAT_ALIASES = {'jpg': 'jpeg'}
+
+def can_save(fmt: str) -> bool:
+    """Whether this Pillow build can write the format (AVIF needs Pillow 11.2+ or pillow-avif-plugin)."""
+    Image.init()
+    return fmt.upper() in Image.SAVE
+
+@lru_cache(maxsize=1)
+def derivative_specs() -> Dict[str, Tuple[int, str, int]]:
+    """Variants made for each generated image: {name: (max side, format, quality)}."""
+    display_format = settings.GENERATION_DISPLAY_FORMAT.lower()
+    display_format = FORMAT_ALIASES.get(display_format, display_format)
+    if display_format not in FORMAT_EXTENSIONS or not can_save(display_format):
+        fallback = 'webp' if can_save('webp') else 'jpeg'
+        reason = "is not a supported display format" if display_format not in FORMAT_EXTENSIONS else "cannot be written by this Pillow build"
+        logger.warning(f"{settings.GENERATION_DISPLAY_FORMAT!r} {reason}; display variants fall back to {fallback}")
+        display_format = fallback
+
+    return {
+        'thumb': (settings.GENERATION_THUMBNAIL_SIZE, 'webp' if can_save('webp') else 'jpeg', settings.GENERATION_DERIVATIVE_QUALITY),
+        'display': (settings.GENERATION_DISPLAY_SIZE, display_format, settings.GENERATION_DERIVATIVE_QUALITY),
+    }
+
+def derivative_key(storage_path: str, name: str, fmt: str) -> str:
+    """generated/{job}/image_1.png -> generated/{job}/image_1.thumb.webp"""
+    path = PurePosixPath(storage_path)
+    return str(path.with_name(f"{path.stem}.{name}.{FORMAT_EXTENSIONS[fmt]}"))
+
+def encode_variant(image: Image.Image, max_side: int, fmt: str, quality: int) -> bytes:
+    """Downscale (never upscale) so the long side is at most max_side, then encode."""
+    if max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.LANCZOS
+        )
+
+    buffer = io.BytesIO()
+    if fmt == 'avif':
+        image.save(buffer, format='AVIF', quality=quality, speed=8)
+    elif fmt == 'jpeg':
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    else:
+        image.save(buffer, format='WEBP', quality=quality, method=4)
+    return buffer.getvalue()
@@ -0,0 +1,88 @@
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Tuple
+from app.utils.phash import hamming
+
+class HammingIndex:
+    """
+    Multi-index hash table for finding 64-bit hashes within a Hamming radius.
+
+    Each hash is split into max_distance + 1 bands. Two hashes within max_distance
+    bits must agree exactly on at least one band (pigeonhole), so a query only
+    compares against hashes that share a band instead of scanning every entry.
+    """
+
+    def __init__(self, max_distance: int, bits: int = 64):
+        self.max_distance = max_distance
+        band_count = min(max_distance + 1, bits)
+
+        # Split bits into nearly equal bands: (shift, mask)
+        self._bands = []
+        shift = 0
+        for i in range(band_count):
+            width = bits // band_count + (1 if i < bits % band_count else 0)
+            self._bands.append((shift, (1 << width) - 1))
+            shift += width
+
+        self._tables: List[Dict[int, List[Hashable]]] = [defaultdict(list) for _ in self._bands]
+        self._hashes: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, key: Hashable, value: int):
+        """Index a hash under a key (re-adding a key replaces its hash)."""
+        if key in self._hashes:
+            self.remove(key)
+        self._hashes[key] = value
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table[(value >> shift) & mask].append(key)
+
+    def remove(self, key: Hashable):
+        """Drop a key from the index."""
+        value = self._hashes.pop(key, None)
+        if value is None:
+            return
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table[(value >> shift) & mask].remove(key)
+
+    def query(self, value: int, exclude: Optional[Hashable] = None) -> List[Tuple[Hashable, int]]:
+        """
+        Find indexed hashes within max_distance of value.
+
+        Returns:
+            List of (key, distance), closest first
+        """
+        candidates = set()
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        candidates.discard(exclude)
+
+        matches = []
+        for key in candidates:
+            distance = hamming(value, self._hashes[key])
+            if distance <= self.max_distance:
+                matches.append((key, distance))
+
+        return sorted(matches, key=lambda m: m[1])
+
+    def clusters(self) -> List[List[Hashable]]:
+        """Groups of keys connected by near-duplicate links (singletons omitted)."""
+        parent = {key: key for key in self._hashes}
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for key, value in self._hashes.items():
+            for other, _ in self.query(value, exclude=key):
+                root_a, root_b = find(key), find(other)
+                if root_a != root_b:
+                    parent[root_b] = root_a
+
+        groups = defaultdict(list)
+        for key in self._hashes:
+            groups[find(key)].append(key)
+
+        return [sorted(group, key=str) for group in groups.values() if len(group) > 1]
@@ -0,0 +1,218 @@
+from typing import Dict, Any, Optional, Tuple
+import json
+import time
+import numpy as np
+import torch
+from safetensors import safe_open
+from safetensors.torch import load_file, save_file
+
+# (down, up) key suffixes of a LoRA pair: PEFT/diffusers and kohya naming
+PAIR_SUFFIXES = (('.lora_A.weight', '.lora_B.weight'), ('.lora_down.weight', '.lora_up.weight'))
+# Per-row scales stored next to int8 factors
+QUANT_SCALE_SUFFIX = '.int8_scale'
+COMPRESSION_DTYPES = {'bf16': torch.bfloat16, 'fp16': torch.float16, 'int8': torch.int8}
+
+def compact_path(storage_path: str) -> str:
+    """Storage path of a LoRA's compact variant: x.safetensors -> x.compact.safetensors."""
+    stem = storage_path[:-len('.safetensors')] if storage_path.endswith('.safetensors') else storage_path
+    return f"{stem}.compact.safetensors"
+
+def relative_error(down: np.ndarray, up: np.ndarray, new_down: np.ndarray, new_up: np.ndarray) -> float:
+    """
+    ||up @ down - new_up @ new_down|| / ||up @ down|| (Frobenius).
+
+    Computed from rank x rank products, never forming the full matrices.
+    """
+    original = np.trace((up.T @ up) @ (down @ down.T))
+    reduced = np.trace((new_up.T @ new_up) @ (new_down @ new_down.T))
+    cross = np.trace((up.T @ new_up) @ (new_down @ down.T))
+    if original <= 0:
+        return 0.0
+    return float(np.sqrt(max(original + reduced - 2 * cross, 0.0) / original))
+
+def reduce_pair(
+    down: np.ndarray,
+    up: np.ndarray,
+    max_error: float,
+    rank: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lowest-rank factors of up @ down within a relative reconstruction error.
+
+    The update is never formed: with QR of both factors, up @ down =
+    Q_up (R_up R_down^T) Q_down^T, so only the small rank x rank core needs
+    an SVD. Singular values are split evenly between the new factors.
+
+    Args:
+        down: (rank, in) factor (lora_A / lora_down)
+        up: (out, rank) factor (lora_B / lora_up)
+        max_error: Largest allowed relative Frobenius error
+        rank: Exact rank to return instead (truncated, or padded with zeros)
+
+    Returns:
+        (down, up) of the reduced rank (at least 1)
+    """
+    q_up, r_up = np.linalg.qr(up)
+    q_down, r_down = np.linalg.qr(down.T)
+    u, s, vt = np.linalg.svd(r_up @ r_down.T)
+
+    target = rank
+    if target is None:
+        # tail[k]: relative error when keeping the first k + 1 singular values
+        energy = s ** 2
+        total = energy.sum()
+        if total == 0:
+            target = 1
+        else:
+            tail = np.sqrt(np.maximum(total - np.cumsum(energy), 0.0) / total)
+            tail[-1] = 0.0  # Full rank is exact (the cumsum can leave rounding noise)
+            target = int(np.argmax(tail <= max_error)) + 1
+
+    kept = min(target, len(s))
+    root = np.sqrt(s[:kept])
+    new_up = np.zeros((up.shape[0], target), dtype=np.float32)
+    new_down = np.zeros((target, down.shape[1]), dtype=np.float32)
+    new_up[:, :kept] = (q_up @ u[:, :kept]) * root
+    new_down[:kept] = (root[:, None] * vt[:kept]) @ q_down.T
+    return new_down, new_up
+
+def quantize_int8(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 with one scale per row; returns (values, scales of shape (rows, 1))."""
+    scale = np.abs(x).max(axis=1, keepdims=True) / 127.0
+    scale[scale == 0] = 1.0
+    return np.clip(np.round(x / scale), -127, 127).astype(np.int8), scale.astype(np.float32)
+
+def dequantize_state_dict(state_dict: Dict[str, torch.Tensor], dtype: torch.dtype = torch.bfloat16) -> Dict[str, torch.Tensor]:
+    """Expand the int8 factors of a compact LoRA back to floats (other files are returned as is)."""
+    if not any(key.endswith(QUANT_SCALE_SUFFIX) for key in state_dict):
+        return state_dict
+
+    result = {}
+    for key, tensor in state_dict.items():
+        if key.endswith(QUANT_SCALE_SUFFIX):
+            continue
+        scale = state_dict.get(key + QUANT_SCALE_SUFFIX)
+        result[key] = (tensor.float() * scale.float()).to(dtype) if scale is not None else tensor
+    return result
+
+def _store(tensors: Dict[str, torch.Tensor], key: str, factor: np.ndarray, dtype: str) -> np.ndarray:
+    """Add a factor in the target dtype; returns what a loader will get back."""
+    if dtype == 'int8':
+        values, scale = quantize_int8(factor)
+        tensors[key] = torch.from_numpy(values).contiguous()
+        tensors[key + QUANT_SCALE_SUFFIX] = torch.from_numpy(scale).contiguous()
+        return values.astype(np.float32) * scale
+    tensor = torch.from_numpy(np.ascontiguousarray(factor)).to(COMPRESSION_DTYPES[dtype])
+    tensors[key] = tensor
+    return tensor.float().numpy()
+
+def compress_lora_file(source: str, destination: str, max_error: float, dtype: str = 'fp16') -> Dict[str, Any]:
+    """
+    Write a compact copy of a LoRA: each layer at the lowest rank within max_error.
+
+    The source is memory-mapped, so only the pair being reduced is in memory
+    (as float32) at a time. Alphas are folded into the factors.
+
+    diffusers/PEFT-named layers keep their own rank, and each gets an alpha
+    equal to it: diffusers reads ranks per module from the factor shapes,
+    but without per-module alphas it scales every layer by the first
+    module's rank over its own. kohya-named files lose their alphas when
+    diffusers converts them, so all their layers get one rank (the largest
+    any layer needs) and alpha. Either way every layer loads at scale 1.
+    Tensors that are not 2-D LoRA pairs are copied unchanged.
+
+    Args:
+        source: Original .safetensors file
+        destination: Where to write the compact file
+        max_error: Largest relative Frobenius error of any layer's update
+        dtype: Stored factors: 'bf16', 'fp16' or 'int8' (per-row scales)
+
+    Returns:
+        Report: layers, original_rank, ranks {min, max, mean}, errors {max,
+        mean} (measured after the dtype conversion), dtype, original_bytes,
+        compressed_bytes
+    """
+    if dtype not in COMPRESSION_DTYPES:
+        raise ValueError(f"dtype must be one of: {', '.join(COMPRESSION_DTYPES)}")
+
+    tensors: Dict[str, torch.Tensor] = {}
+    ranks, original_ranks, errors = [], [], []
+    original_bytes = 0
+
+    with safe_open(source, framework='pt') as f:
+        keys = set(f.keys())
+        metadata = f.metadata() or {}
+        handled = set()
+
+        def pairs():
+            """(down key, up key, alpha key, kohya, down, up with its alpha folded in) of each 2-D pair."""
+            for down_key in sorted(keys):
+                for (down_suffix, up_suffix), kohya in zip(PAIR_SUFFIXES, (False, True)):
+                    if not down_key.endswith(down_suffix):
+                        continue
+                    prefix = down_key[:-len(down_suffix)]
+                    up_key, alpha_key = prefix + up_suffix, prefix + '.alpha'
+                    if up_key not in keys:
+                        continue
+
+                    down_tensor, up_tensor = f.get_tensor(down_key), f.get_tensor(up_key)
+                    if down_tensor.dim() != 2 or up_tensor.dim() != 2:
+                        continue
+                    down = down_tensor.float().numpy()
+                    up = up_tensor.float().numpy()
+                    if alpha_key in keys:
+                        up = up * (f.get_tensor(alpha_key).item() / down.shape[0])
+                    yield down_key, up_key, alpha_key, kohya, down, up, down_tensor, up_tensor
+
+        # kohya layers share one rank: a first pass finds the largest needed
+        kohya_rank = max(
+            (reduce_pair(down, up, max_error)[0].shape[0] for _, _, _, kohya, down, up, _, _ in pairs() if kohya),
+            default=None
+        )
+
+        for down_key, up_key, alpha_key, kohya, down, up, down_tensor, up_tensor in pairs():
+            original_bytes += sum(t.numel() * t.element_size() for t in (down_tensor, up_tensor))
+            new_down, new_up = reduce_pair(down, up, max_error, rank=kohya_rank if kohya else None)
+            stored_down = _store(tensors, down_key, new_down, dtype)
+            stored_up = _store(tensors, up_key, new_up, dtype)
+            # alpha == rank: scale 1, as folded in above
+            tensors[alpha_key] = torch.tensor(float(new_down.shape[0]))
+
+            original_ranks.append(down.shape[0])
+            ranks.append(new_down.shape[0])
+            errors.append(relative_error(down, up, stored_down, stored_up))
+            handled.update((down_key, up_key, alpha_key))
+
+        for key in keys - handled:
+            tensor = f.get_tensor(key)
+            original_bytes += tensor.numel() * tensor.element_size()
+            tensors[key] = tensor
+
+    report = {
+        'layers': len(ranks),
+        'original_rank': max(original_ranks, default=0),
+        'ranks': {
+            'min': min(ranks, default=0),
+            'max': max(ranks, default=0),
+            'mean': round(sum(ranks) / len(ranks), 2) if ranks else 0,
+        },
+        'errors': {
+            'max': round(max(errors, default=0.0), 6),
+            'mean': round(sum(errors) / len(errors), 6) if errors else 0.0,
+        },
+        'max_error': max_error,
+        'dtype': dtype,
+        'original_bytes': original_bytes,
+        'compressed_bytes': sum(t.numel() * t.element_size() for t in tensors.values()),
+    }
+    save_file(tensors, destination, metadata={**metadata, 'masuka_compression': json.dumps(report)})
+    return report
+
+def measure_load_time(path: str, repeats: int = 3) -> float:
+    """Best time to read a LoRA file into tensors ready for load_lora_weights (seconds)."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.time()
+        dequantize_state_dict(load_file(path))
+        best = min(best, time.time() - start)
+    return best
@@ -0,0 +1,71 @@
+import io
+from typing import Dict
+import numpy as np
+from PIL import Image, ImageOps
+
+PHASH_SIZE = 32  # Grayscale side fed to the DCT
+HASH_SIZE = 8  # 8x8 = 64-bit hashes
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2D DCT is D @ X @ D.T."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+def _pack_bits(bits: np.ndarray) -> np.ndarray:
+    """Pack (n, 64) booleans into n uint64 values."""
+    return np.packbits(bits.astype(np.uint8), axis=1).view('>u8').ravel()
+
+def phash_pixels(pixels: np.ndarray) -> np.ndarray:
+    """
+    Perceptual hashes for a batch of grayscale images.
+
+    Args:
+        pixels: Array of shape (n, 32, 32)
+
+    Returns:
+        Array of n uint64 hashes
+    """
+    coeffs = _DCT @ pixels @ _DCT.T
+    low = coeffs[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels), -1)
+    # The DC term only encodes mean brightness, keep it out of the threshold
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack_bits(low > median)
+
+def dhash_pixels(pixels: np.ndarray) -> np.ndarray:
+    """
+    Difference hashes for a batch of grayscale images.
+
+    Args:
+        pixels: Array of shape (n, 8, 9)
+
+    Returns:
+        Array of n uint64 hashes
+    """
+    bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+    return _pack_bits(bits.reshape(len(pixels), -1))
+
+def image_hashes(image: Image.Image) -> Dict[str, str]:
+    """pHash and dHash of an image as 16-digit hex strings."""
+    gray = image.convert('L')
+    p_pixels = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float32)
+    d_pixels = np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.float32)
+
+    return {
+        'phash': f"{int(phash_pixels(p_pixels[None])[0]):016x}",
+        'dhash': f"{int(dhash_pixels(d_pixels[None])[0]):016x}",
+    }
+
+def hash_image_bytes(data: bytes) -> Dict[str, str]:
+    """Hash encoded image bytes, decoding JPEGs at reduced size."""
+    image = Image.open(io.BytesIO(data))
+    image.draft('L', (PHASH_SIZE * 2, PHASH_SIZE * 2))
+    return image_hashes(ImageOps.exif_transpose(image))
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
@@ -0,0 +1,172 @@
+import io
+import os
+import hashlib
+import time
+import logging
+from typing import Dict, Any, Optional
+from PIL import Image, ImageOps, ImageCms
+from app.utils.buckets import assign_bucket, bucket_key, resize_to_bucket
+from app.utils.phash import image_hashes
+from app.services.storage_service import content_key
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'webp': 'webp'}
+FORMAT_CONTENT_TYPES = {'png': 'image/png', 'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+
+# Functions below run inside a process pool, so each process lazily creates its own client
+_storage = None
+_storage_pid = None
+
+def _get_storage():
+    """Storage client owned by the current process (boto3 clients are not fork-safe)."""
+    global _storage, _storage_pid
+    if _storage is None or _storage_pid != os.getpid():
+        from app.services.storage_service import StorageService
+        _storage = StorageService()
+        _storage_pid = os.getpid()
+    return _storage
+
+def _to_srgb(image: Image.Image) -> Image.Image:
+    """Convert to 8-bit sRGB, honouring an embedded ICC profile and flattening alpha."""
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile:
+        try:
+            source = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+            target = ImageCms.createProfile('sRGB')
+            mode = 'RGBA' if 'A' in image.getbands() else 'RGB'
+            image = ImageCms.profileToProfile(image, source, target, outputMode=mode)
+        except Exception as e:
+            logger.warning(f"Ignoring unusable ICC profile: {e}")
+
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+
+    return image.convert('RGB')
+
+def _encode(image: Image.Image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == 'png':
+        image.save(buffer, format='PNG', compress_level=3)
+    elif fmt == 'jpeg':
+        image.save(buffer, format='JPEG', quality=quality, subsampling=0, optimize=True)
+    else:
+        image.save(buffer, format='WEBP', quality=quality, method=4)
+    return buffer.getvalue()
+
+def preprocess_image(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decode one image once and derive everything training needs from it.
+
+    Args:
+        job: Dict with filename, source_key, processed_name, resolutions,
+            max_side, format, quality and needs_hash
+
+    Returns:
+        Dict with processed_key, width, height, buckets and per-stage timings
+        (or filename and error on failure). Derived copies are stored as
+        content-addressed blobs, so identical outputs are uploaded once.
+    """
+    timings = {}
+    start = time.perf_counter()
+    filename = job['filename']
+    storage = _get_storage()
+
+    try:
+        # Fetch (streamed into memory)
+        stage = time.perf_counter()
+        data = storage.read_stream(job['source_key'])
+        if data is None:
+            raise ValueError(f"Could not read {job['source_key']}")
+        timings['fetch'] = time.perf_counter() - stage
+
+        # Decode (JPEG decoders can scale down by 2/4/8 for free during decode)
+        stage = time.perf_counter()
+        image = Image.open(io.BytesIO(data))
+        max_side = job['max_side']
+        if image.format == 'JPEG' and max(image.size) > max_side * 2:
+            image.draft('RGB', (max_side, max_side))
+        image.load()
+        timings['decode'] = time.perf_counter() - stage
+
+        # Orientation, colour space, downscale
+        stage = time.perf_counter()
+        image = ImageOps.exif_transpose(image)
+        image = _to_srgb(image)
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=3.0)
+        width, height = image.size
+        timings['transform'] = time.perf_counter() - stage
+
+        # Images uploaded before hashing existed get their hashes here
+        hashes = {}
+        if job.get('needs_hash'):
+            stage = time.perf_counter()
+            hashes = image_hashes(image)
+            timings['hash'] = time.perf_counter() - stage
+
+        # Re-encode
+        stage = time.perf_counter()
+        processed = _encode(image, job['format'], job['quality'])
+        timings['encode'] = time.perf_counter() - stage
+
+        # Resolution buckets from the same decoded image
+        stage = time.perf_counter()
+        buckets = {}
+        bucket_keys = {}
+        bucket_sha256 = {}
+        bucket_files = []
+        for resolution in job['resolutions']:
+            bucket = assign_bucket(width, height, resolution)
+            encoded = _encode(resize_to_bucket(image, bucket), 'png', job['quality'])
+            sha256 = hashlib.sha256(encoded).hexdigest()
+            bucket_files.append((encoded, content_key(sha256)))
+            buckets[str(resolution)] = bucket_key(bucket)
+            bucket_keys[str(resolution)] = content_key(sha256)
+            bucket_sha256[str(resolution)] = sha256
+        timings['bucket'] = time.perf_counter() - stage
+
+        # Upload straight from memory, skipping blobs that are already stored
+        stage = time.perf_counter()
+        processed_sha256 = hashlib.sha256(processed).hexdigest()
+        processed_key = content_key(processed_sha256)
+        uploads = [(processed, processed_key, FORMAT_CONTENT_TYPES[job['format']])]
+        uploads.extend((encoded, key, 'image/png') for encoded, key in bucket_files)
+        for encoded, key, content_type in uploads:
+            if storage.exists(key):
+                continue
+            if not storage.upload_fileobj(io.BytesIO(encoded), key, content_type=content_type):
+                raise ValueError(f"Could not upload {key}")
+        timings['upload'] = time.perf_counter() - stage
+
+        timings['total'] = time.perf_counter() - start
+
+        return {
+            'filename': filename,
+            'processed_key': processed_key,
+            'processed_name': job['processed_name'],
+            'processed_size': len(processed),
+            'processed_sha256': processed_sha256,
+            'width': width,
+            'height': height,
+            'buckets': buckets,
+            'bucket_keys': bucket_keys,
+            'bucket_sha256': bucket_sha256,
+            **hashes,
+            'timings': {k: round(v, 4) for k, v in timings.items()},
+        }
+
+    except Exception as e:
+        logger.error(f"Preprocessing failed for {filename}: {e}")
+        return {
+            'filename': filename,
+            'error': str(e),
+            'timings': {'total': round(time.perf_counter() - start, 4)},
+        }
+
+def processed_extension(fmt: str) -> Optional[str]:
+    """File extension for a processed image format."""
+    return FORMAT_EXTENSIONS.get(fmt)
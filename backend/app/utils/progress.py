@@ -49,6 +49,20 @@ class ProgressManager:
         except Exception as e:
             logger.error(f"Failed to delete progress: {e}")
 
+    def request_cancel(self, job_id: str, expire_seconds: int = 86400):
+        """Ask a running job to stop at its next checkpoint."""
+        self.redis_client.set(f"cancel:{job_id}", 1, ex=expire_seconds)
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        try:
+            return bool(self.redis_client.exists(f"cancel:{job_id}"))
+        except Exception as e:
+            logger.error(f"Failed to check cancellation: {e}")
+            return False
+
+    def clear_cancel(self, job_id: str):
+        self.redis_client.delete(f"cancel:{job_id}")
+
     def update_step(self, session_id: str, step: int, total_steps: int, loss: float = None):
         """Quick update for training step progress."""
         progress_pct = int((step / total_steps) * 100) if total_steps > 0 else 0
@@ -0,0 +1,79 @@
+from typing import Dict, Any, List, Optional, Tuple
+
+def choose_next(
+    pending: List[Dict[str, Any]],
+    resident_model_id: Optional[str],
+    fairness_window: float
+) -> Tuple[int, str]:
+    """
+    Pick the next generation job, preferring the LoRA that is already loaded.
+
+    A job may only be overtaken by jobs that arrived at most `fairness_window`
+    seconds after it, so reordering (and the extra wait it causes) stays
+    bounded however long the queue gets.
+
+    Args:
+        pending: Jobs oldest first, each with 'model_id' (None for the base
+            model) and 'enqueued_at' (seconds)
+        resident_model_id: LoRA currently loaded on the worker (None for none)
+        fairness_window: How much later a job may have arrived and still run
+            ahead of the oldest one
+
+    Returns:
+        (index into pending, reason): reason is 'fifo' (oldest job),
+        'affinity' (a newer job reusing the resident LoRA) or 'fairness'
+        (oldest job, although a later one could have reused the LoRA)
+    """
+    if not pending:
+        raise ValueError("No pending jobs")
+
+    head = pending[0]
+    if head['model_id'] == resident_model_id:
+        return 0, 'fifo'
+
+    for index, job in enumerate(pending):
+        if job['model_id'] == resident_model_id:
+            if job['enqueued_at'] - head['enqueued_at'] > fairness_window:
+                return 0, 'fairness'
+            return index, 'affinity'
+
+    return 0, 'fifo'
+
+def route_job(
+    workers: List[Dict[str, Any]],
+    lora_key: Optional[str],
+    max_imbalance: int
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Pick the worker for a job, preferring one that already holds its LoRA.
+
+    Args:
+        workers: Live workers, each with 'loaded_lora' (LoRA in GPU memory
+            or None), 'queued_loras' (LoRAs of jobs already routed to it),
+            'cached_loras' (LoRAs on local disk) and 'load' (queued plus
+            running jobs)
+        lora_key: LoRA the job needs (its storage path), None for base model jobs
+        max_imbalance: How many more jobs a LoRA-holding worker may have
+            queued than the least-loaded one before the job goes elsewhere
+
+    Returns:
+        (worker, reason): reason is 'hot' (LoRA loaded, or will be for
+        a job queued ahead; the scheduler runs them together), 'warm' (LoRA on
+        disk), 'cold' (least loaded; LoRA must be downloaded) or 'base'
+    """
+    if not workers:
+        raise ValueError("No workers")
+
+    least_loaded = min(workers, key=lambda w: w['load'])
+    if lora_key is None:
+        return least_loaded, 'base'
+
+    hot = [w for w in workers if w.get('loaded_lora') == lora_key or lora_key in w.get('queued_loras', ())]
+    warm = [w for w in workers if lora_key in w.get('cached_loras', ())]
+    for candidates, reason in ((hot, 'hot'), (warm, 'warm')):
+        if candidates:
+            best = min(candidates, key=lambda w: w['load'])
+            if best['load'] - least_loaded['load'] <= max_imbalance:
+                return best, reason
+
+    return least_loaded, 'cold'
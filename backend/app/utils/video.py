@@ -0,0 +1,133 @@
+import json
+import logging
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, Any, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+def probe(source: str) -> Dict[str, Any]:
+    """
+    Read a clip's stream info with ffprobe (reads headers only, not the whole file).
+
+    Args:
+        source: Local path or URL (e.g. a presigned storage URL)
+
+    Returns:
+        Dict with duration, fps, width, height, codec and frame_count (estimated)
+    """
+    result = subprocess.run(
+        [
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=codec_name,width,height,avg_frame_rate,r_frame_rate,nb_frames,duration:format=duration',
+            '-of', 'json', source
+        ],
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    if result.returncode != 0:
+        raise ValueError(f"ffprobe failed: {result.stderr.strip()}")
+
+    info = json.loads(result.stdout)
+    if not info.get('streams'):
+        raise ValueError("No video stream found")
+    stream = info['streams'][0]
+
+    def rate(value: str) -> float:
+        num, _, den = (value or '0/1').partition('/')
+        return float(num) / float(den or 1) if float(den or 1) else 0.0
+
+    fps = rate(stream.get('avg_frame_rate')) or rate(stream.get('r_frame_rate'))
+    duration = float(stream.get('duration') or info.get('format', {}).get('duration') or 0)
+    frame_count = int(stream['nb_frames']) if stream.get('nb_frames', '').isdigit() else int(duration * fps)
+
+    return {
+        'duration': round(duration, 3),
+        'fps': round(fps, 3),
+        'width': int(stream['width']),
+        'height': int(stream['height']),
+        'codec': stream.get('codec_name'),
+        'frame_count': frame_count,
+    }
+
+def output_size(width: int, height: int, max_side: int) -> Tuple[int, int]:
+    """Scale to fit max_side, keeping aspect ratio and even dimensions."""
+    scale = min(1.0, max_side / max(width, height))
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+def _read_stderr(stderr) -> str:
+    stderr.seek(0)
+    return stderr.read().decode(errors='replace').strip()
+
+def iter_frames(source: str, fps: float, width: int, height: int) -> Iterator[bytes]:
+    """
+    Decode frames at `fps`, scaled to width x height, as raw RGB24 buffers.
+
+    ffmpeg decodes, drops frames and scales in a streaming pipe, so memory
+    holds one frame at a time regardless of clip length.
+    """
+    frame_size = width * height * 3
+    # stderr goes to a file: a pipe only read at the end could fill up and stall ffmpeg
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            [
+                'ffmpeg', '-v', 'error', '-nostdin', '-i', source,
+                '-vf', f'fps={fps},scale={width}:{height}:flags=lanczos',
+                '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1'
+            ],
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            bufsize=frame_size
+        )
+        try:
+            while True:
+                frame = process.stdout.read(frame_size)
+                if len(frame) < frame_size:
+                    break
+                yield frame
+            if process.wait() != 0:
+                raise ValueError(f"ffmpeg failed: {_read_stderr(stderr)}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+def iter_segments(source: str, out_dir: Path, segment_seconds: float, fps: float, width: int, height: int) -> Iterator[Path]:
+    """
+    Re-encode a clip into fixed-length segments, yielding each as soon as it is finished.
+
+    The segment muxer reports completed files on stdout, so callers can
+    upload and delete each one while the next is being encoded; disk holds
+    at most a couple of segments.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            [
+                'ffmpeg', '-v', 'error', '-nostdin', '-i', source,
+                '-vf', f'fps={fps},scale={width}:{height}:flags=lanczos',
+                '-an', '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18',
+                # A keyframe at every segment boundary so segments cut exactly
+                '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',
+                '-f', 'segment', '-segment_time', str(segment_seconds), '-reset_timestamps', '1',
+                '-segment_list', 'pipe:1', '-segment_list_type', 'flat',
+                str(out_dir / 'segment_%05d.mp4')
+            ],
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            text=True
+        )
+        try:
+            for line in process.stdout:
+                name = line.strip()
+                if name:
+                    yield out_dir / Path(name).name
+            process.wait()
+            if process.returncode != 0:
+                raise ValueError(f"ffmpeg failed: {_read_stderr(stderr)}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
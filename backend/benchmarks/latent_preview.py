@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of live latent previews during Flux generation.
+
+By default times the preview path alone (latent projection, copy to host,
+JPEG encode) on random latents and estimates the overhead against a given
+denoising step time. With --full, loads Flux and runs the same seeded
+generation with and without previews (needs a GPU).
+
+Usage:
+    python benchmarks/latent_preview.py --size 1024 --batch 1 4 --interval 5
+    python benchmarks/latent_preview.py --full --steps 30 --interval 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import torch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.generators.latent_preview import preview_jpeg
+
+def bench_preview(size: int, batch: int, device: str, repeats: int) -> dict:
+    latents = torch.randn(batch, (size // 16) ** 2, 64, dtype=torch.bfloat16, device=device)
+    preview_jpeg(latents, size, size)  # Warm up
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        jpeg = preview_jpeg(latents, size, size)
+    elapsed = (time.perf_counter() - start) / repeats
+    return {'seconds': elapsed, 'bytes': len(jpeg)}
+
+def bench_full(steps: int, interval: int, size: int, batch: int, seed: int):
+    from app.generators.flux_generator import FluxGenerator
+
+    generator = FluxGenerator({})
+    generator.load_model()
+    previews = []
+
+    def run(preview_interval: int) -> float:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            generator.generate(
+                prompt="a lighthouse on a cliff at dusk, dramatic sky",
+                num_images=batch,
+                num_inference_steps=steps,
+                width=size,
+                height=size,
+                seed=seed,
+                output_dir=tmp,
+                on_preview=lambda step, jpeg: previews.append(len(jpeg)),
+                preview_interval=preview_interval
+            )
+            return time.perf_counter() - start
+
+    run(0)  # Warm up (prompt cache, kernels)
+    baseline = run(0)
+    with_previews = run(interval)
+    overhead = (with_previews - baseline) / baseline * 100
+    print(f"without previews: {baseline:.2f}s")
+    print(f"with previews every {interval} steps: {with_previews:.2f}s ({overhead:+.2f}%), "
+          f"{len(previews)} previews, {sum(previews) / max(len(previews), 1) / 1024:.1f} KB avg")
+    print(f"preview time measured in generator: {generator.last_metrics.get('preview_time', 0.0):.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, nargs='+', default=[1024], help='Image sizes (square)')
+    parser.add_argument('--batch', type=int, nargs='+', default=[1], help='Images per generation')
+    parser.add_argument('--interval', type=int, default=5, help='Steps between previews')
+    parser.add_argument('--step-seconds', type=float, default=0.5, help='Denoising step time to compare against')
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--full', action='store_true', help='Run real generations (needs a GPU)')
+    parser.add_argument('--steps', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.full:
+        bench_full(args.steps, args.interval, args.size[0], args.batch[0], args.seed)
+        return
+
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    print(f"Preview cost on {device}; overhead assumes {args.step_seconds}s per step, preview every {args.interval} steps\n")
+    print(f"{'size':>6} {'batch':>6} {'ms/preview':>11} {'KB':>6} {'overhead':>9}")
+    for size in args.size:
+        for batch in args.batch:
+            result = bench_preview(size, batch, device, args.repeats)
+            # Denoising time grows with the batch; one preview covers the whole batch
+            overhead = result['seconds'] / (args.interval * args.step_seconds * batch) * 100
+            print(f"{size:>6} {batch:>6} {result['seconds'] * 1000:>11.2f} {result['bytes'] / 1024:>6.1f} {overhead:>8.2f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Simulate LoRA-aware routing of generation jobs across workers.
+
+Replays a random arrival trace through fake workers (no GPU, no Redis), each
+with a LoRA in memory and a bounded LoRA disk cache. Compares a shared queue
+(any free worker takes the next job) against routing with the same policy
+the API uses, and reports downloads, swaps, per-worker hit rates and waits.
+
+Usage:
+    python benchmarks/lora_routing.py --workers 4 --loras 24 --rate 8
+    python benchmarks/lora_routing.py --workers 2 8 --disk-slots 4
+"""
+
+import argparse
+import os
+import sys
+from collections import OrderedDict
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.scheduling import choose_next, route_job
+from lora_scheduling import make_trace
+
+class FakeWorker:
+    def __init__(self, worker_id: str, disk_slots: int):
+        self.id = worker_id
+        self.disk = OrderedDict()  # LRU LoRA disk cache
+        self.disk_slots = disk_slots
+        self.loaded = None
+        self.free_at = 0.0
+        self.queue = []
+        self.counts = {'hot': 0, 'warm': 0, 'cold': 0, 'base': 0}
+
+    def advert(self, now: float) -> dict:
+        return {
+            'id': self.id,
+            'loaded_lora': self.loaded,
+            'queued_loras': {job['model_id'] for job in self.queue if job['model_id']},
+            'cached_loras': set(self.disk),
+            'load': len(self.queue) + (1 if self.free_at > now else 0),
+        }
+
+    def run(self, job: dict, start: float, costs: dict) -> float:
+        """Run a job starting at `start`; returns the wait it had."""
+        lora = job['model_id']
+        service = costs['gen']
+        if lora is None:
+            kind = 'base'
+        elif lora == self.loaded:
+            kind = 'hot'
+        elif lora in self.disk:
+            kind = 'warm'
+        else:
+            kind = 'cold'
+            service += costs['download']
+        if lora != self.loaded:
+            service += costs['swap']
+        if lora is not None:
+            self.disk[lora] = True
+            self.disk.move_to_end(lora)
+            while len(self.disk) > self.disk_slots:
+                self.disk.popitem(last=False)
+
+        self.counts[kind] += 1
+        self.loaded = lora
+        self.free_at = start + service
+        return start - job['enqueued_at']
+
+def simulate(trace: list, workers: int, policy: str, args) -> dict:
+    pool = [FakeWorker(f"worker-{i}", args.disk_slots) for i in range(workers)]
+    costs = {'gen': args.gen_seconds, 'swap': args.swap_seconds, 'download': args.download_seconds}
+    shared = []
+    waits = []
+
+    def advance(until: float):
+        if policy == 'shared':
+            while shared:
+                worker = min(pool, key=lambda w: w.free_at)
+                if worker.free_at > until:
+                    break
+                job = shared.pop(0)
+                waits.append(worker.run(job, max(worker.free_at, job['enqueued_at']), costs))
+            return
+        for worker in pool:
+            while worker.queue and worker.free_at <= until:
+                index, _ = choose_next(worker.queue, worker.loaded, args.window)
+                job = worker.queue.pop(index)
+                waits.append(worker.run(job, max(worker.free_at, job['enqueued_at']), costs))
+
+    for job in trace:
+        advance(job['enqueued_at'])
+        if policy == 'shared':
+            shared.append(job)
+        else:
+            adverts = [w.advert(job['enqueued_at']) for w in pool]
+            advert, _ = route_job(adverts, job['model_id'], args.max_imbalance)
+            pool[adverts.index(advert)].queue.append(job)
+    advance(float('inf'))
+
+    waits.sort()
+    return {
+        'workers': pool,
+        'downloads': sum(w.counts['cold'] for w in pool),
+        'swaps': sum(w.counts['warm'] + w.counts['cold'] for w in pool),
+        'mean_wait': sum(waits) / len(waits),
+        'p95_wait': waits[int(len(waits) * 0.95)],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[4])
+    parser.add_argument('--loras', type=int, default=24, help='Distinct LoRAs in the trace')
+    parser.add_argument('--zipf', type=float, default=1.0, help='LoRA popularity skew')
+    parser.add_argument('--base-fraction', type=float, default=0.1, help='Share of jobs without a LoRA')
+    parser.add_argument('--rate', type=float, default=8.0, help='Arrivals per minute')
+    parser.add_argument('--gen-seconds', type=float, default=20.0, help='Denoising time per job')
+    parser.add_argument('--swap-seconds', type=float, default=10.0, help='Unfuse + load + fuse time per LoRA change')
+    parser.add_argument('--download-seconds', type=float, default=15.0, help='LoRA download time on a disk-cache miss')
+    parser.add_argument('--disk-slots', type=int, default=6, help='LoRAs each worker keeps on disk')
+    parser.add_argument('--window', type=float, default=300.0, help='Fairness window (seconds)')
+    parser.add_argument('--max-imbalance', type=int, default=4, help='Extra queued jobs tolerated to reach a LoRA holder')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    trace = make_trace(args.jobs, args.loras, args.zipf, args.base_fraction, args.rate, args.seed)
+
+    for workers in args.workers:
+        print(f"\n{workers} workers, {args.jobs} jobs, {args.loras} LoRAs, {args.rate:g} jobs/min")
+        print(f"{'policy':<8} {'downloads':>9} {'swaps':>6} {'mean wait':>10} {'p95 wait':>9}   per-worker hot/warm/cold (hit rate)")
+        for policy in ('shared', 'routed'):
+            result = simulate(trace, workers, policy, args)
+            per_worker = []
+            for worker in result['workers']:
+                c = worker.counts
+                lora_jobs = c['hot'] + c['warm'] + c['cold']
+                hit_rate = (c['hot'] + c['warm']) / lora_jobs if lora_jobs else 0
+                per_worker.append(f"{c['hot']}/{c['warm']}/{c['cold']} ({hit_rate:.0%})")
+            print(
+                f"{policy:<8} {result['downloads']:>9} {result['swaps']:>6} {result['mean_wait']:>9.1f}s "
+                f"{result['p95_wait']:>8.1f}s   {'  '.join(per_worker)}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark serial vs pipelined PNG encoding (and upload) of generated images.
+
+Replays a batch: images become ready one every --decode-seconds (standing in
+for per-image VAE decoding on the GPU). Serial mode saves each PNG and then
+uploads them one by one after the batch, like the old generate_image. Pipelined
+mode hands each image to the output pipeline as it is ready. Reports the time
+left after the last image is ready, i.e. what timing_metrics['upload_time']
+now measures.
+
+Encoding only by default; --upload-prefix also uploads to the configured
+bucket (objects are deleted afterwards).
+
+Usage:
+    python benchmarks/output_pipeline.py --images 4 --size 1024
+    python benchmarks/output_pipeline.py --images 4 --upload-prefix benchmarks/output
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_images(count: int, size: int, seed: int) -> list:
+    """Smooth gradients plus noise: compresses about like a real render."""
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(0, 255, size, dtype=np.float32)
+    images = []
+    for _ in range(count):
+        base = np.stack([np.add.outer(ramp, ramp) / 2, np.tile(ramp, (size, 1)), np.tile(ramp[:, None], (1, size))], axis=-1)
+        noisy = base + rng.normal(0, 12, base.shape)
+        images.append(Image.fromarray(noisy.clip(0, 255).astype(np.uint8)))
+    return images
+
+def run_serial(images: list, decode_seconds: float, upload) -> dict:
+    encoded = []
+    start = time.perf_counter()
+    for image in images:
+        time.sleep(decode_seconds)
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        encoded.append(buffer.getvalue())
+    for i, data in enumerate(encoded):
+        upload(data, i)
+    done = time.perf_counter()
+    # Saving happened inside the GPU stage before; count it as exposed too
+    return {'total': done - start, 'exposed': done - start - decode_seconds * len(images)}
+
+def run_pipelined(images: list, decode_seconds: float, pipeline, upload_prefix) -> dict:
+    futures = []
+    start = time.perf_counter()
+    for i, image in enumerate(images):
+        time.sleep(decode_seconds)
+        if upload_prefix:
+            futures.append(pipeline.submit(image, f"{upload_prefix}/image_{i+1}.png"))
+        else:
+            futures.append(pipeline.pool.submit(pipeline.encode_png, image))
+    ready = time.perf_counter()
+    for future in futures:
+        future.result()
+    done = time.perf_counter()
+    return {'total': done - start, 'exposed': done - ready}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--size', type=int, default=1024)
+    parser.add_argument('--decode-seconds', type=float, default=0.3, help='Time between images becoming ready')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--upload-prefix', default=None, help='Also upload under this storage prefix')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from app.services.output_pipeline import OutputPipeline
+    pipeline = OutputPipeline(workers=args.workers)
+
+    storage = None
+    if args.upload_prefix:
+        from app.services.storage_service import storage_service as storage
+
+    def upload(data: bytes, index: int):
+        if storage:
+            storage.upload_fileobj(io.BytesIO(data), f"{args.upload_prefix}/image_{index+1}.png", content_type='image/png')
+
+    print(f"{args.size}x{args.size}, image ready every {args.decode_seconds}s, {args.workers} workers, "
+          f"{'encode + upload' if storage else 'encode only'}\n")
+    print(f"{'images':>6} {'mode':<10} {'total':>8} {'after GPU':>10}")
+    for count in args.images:
+        images = make_images(count, args.size, args.seed)
+        for mode in ('serial', 'pipelined'):
+            if mode == 'serial':
+                result = run_serial(images, args.decode_seconds, upload)
+            else:
+                result = run_pipelined(images, args.decode_seconds, pipeline, args.upload_prefix)
+            print(f"{count:>6} {mode:<10} {result['total']:>7.2f}s {result['exposed']:>9.2f}s")
+
+    if storage:
+        for count in args.images:
+            for i in range(count):
+                storage.delete_file(f"{args.upload_prefix}/image_{i+1}.png")
+
+if __name__ == "__main__":
+    main()
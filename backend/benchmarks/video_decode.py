@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark streaming video decode for dataset ingestion.
+
+Runs the same frame/segment extraction the ingest pipeline uses against local
+sample files and reports decode throughput.
+
+Usage:
+    python benchmarks/video_decode.py clip1.mp4 clip2.mov --fps 1 2 --max-side 512 1024
+    python benchmarks/video_decode.py clip.mp4 --segments 4
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.video import probe, output_size, iter_frames, iter_segments
+
+def bench_frames(path: str, info: dict, fps: float, max_side: int) -> dict:
+    width, height = output_size(info['width'], info['height'], max_side)
+    start = time.perf_counter()
+    frames = sum(1 for _ in iter_frames(path, fps, width, height))
+    elapsed = time.perf_counter() - start
+    return {'outputs': frames, 'size': f"{width}x{height}", 'seconds': elapsed}
+
+def bench_segments(path: str, info: dict, seconds: float, fps: float, max_side: int) -> dict:
+    width, height = output_size(info['width'], info['height'], max_side)
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        segments = 0
+        for segment in iter_segments(path, Path(tmp), seconds, fps, width, height):
+            segment.unlink()
+            segments += 1
+    elapsed = time.perf_counter() - start
+    return {'outputs': segments, 'size': f"{width}x{height}", 'seconds': elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='Local video files')
+    parser.add_argument('--fps', type=float, nargs='+', default=[1.0], help='Target frame rates')
+    parser.add_argument('--max-side', type=int, nargs='+', default=[1024], help='Target resolutions')
+    parser.add_argument('--segments', type=float, default=None, help='Benchmark segments of this length instead of frames')
+    args = parser.parse_args()
+
+    print(f"{'file':<28} {'mode':<10} {'fps':>5} {'size':>10} {'outputs':>8} {'sec':>8} {'src fps':>9} {'x realtime':>10} {'MB/s':>8}")
+    for path in args.files:
+        info = probe(path)
+        size_mb = os.path.getsize(path) / 1e6
+        for fps in args.fps:
+            for max_side in args.max_side:
+                if args.segments:
+                    result = bench_segments(path, info, args.segments, fps, max_side)
+                    mode = f"seg {args.segments:g}s"
+                else:
+                    result = bench_frames(path, info, fps, max_side)
+                    mode = 'frames'
+
+                seconds = result['seconds']
+                decoded = info['duration'] * info['fps']
+                print(
+                    f"{Path(path).name[:28]:<28} {mode:<10} {fps:>5g} {result['size']:>10} {result['outputs']:>8} "
+                    f"{seconds:>8.2f} {decoded / seconds:>9.1f} {info['duration'] / seconds:>10.1f} {size_mb / seconds:>8.1f}"
+                )
+
+    # ffmpeg runs as a child process, so its peak memory shows up here
+    peak_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"\nPeak decoder RSS: {peak_mb:.0f} MB")
+
+if __name__ == "__main__":
+    main()
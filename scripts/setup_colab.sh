@@ -89,6 +89,6 @@ echo "SimpleTuner: /content/SimpleTuner"
 echo ""
 echo "Next steps:"
 echo "1. Set your AWS/S3 credentials in environment variables"
-echo "2. Start Celery worker: celery -A app.tasks.celery_app worker --loglevel=info -Q training,generation"
+echo "2. Start Celery worker: celery -A app.tasks.celery_app worker --loglevel=info -Q training,generation,datasets"
 echo "3. Start FastAPI: uvicorn app.main:app --host 0.0.0.0 --port 8000"
 echo "========================================="